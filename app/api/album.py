@@ -11,14 +11,13 @@ from flask_openapi3 import Tag
 from flask_openapi3 import APIBlueprint
 from app.api.apischemas import AlbumHashSchema, AlbumLimitSchema, ArtistHashSchema
 
-from app.config import UserConfig
+from app.config import get_config
 from app.db.userdata import SimilarArtistTable
 from app.models.album import Album
 from app.settings import Defaults
 from app.store.albums import AlbumStore
 from app.store.artists import ArtistStore
 from app.store.tracks import TrackStore
-from app.utils.hashing import create_hash
 from app.lib.albumslib import sort_by_track_no
 from app.serializers.album import serialize_for_card_many
 from app.serializers.track import serialize_tracks
@@ -76,7 +75,7 @@ def get_album_tracks_and_info(body: GetAlbumInfoBody):
     album.trackcount = len(tracks)
     album.duration = sum(t.duration for t in tracks)
     album.check_type(
-        tracks=tracks, singleTrackAsSingle=UserConfig().showAlbumsAsSingles
+        tracks=tracks, singleTrackAsSingle=get_config().showAlbumsAsSingles
     )
 
     track_total = sum({int(t.extra.get("track_total", 1) or 1) for t in tracks})
@@ -144,28 +143,19 @@ def get_more_from_artist(body: GetMoreFromArtistsBody):
 
     all_albums: dict[str, list[Album]] = {}
 
+    # INFO: filter out albums with the same base title
+    seen_hashes: set[str] = set()
+
+    if base_title:
+        seen_hashes.update(AlbumStore.get_albumhashes_by_base_title(base_title))
+
     for artisthash in albumartists:
-        all_albums[artisthash] = AlbumStore.get_albums_by_artisthash(artisthash)
-
-    seen_hashes = set()
-
-    for artisthash, albums in all_albums.items():
-        albums = [
-            a
-            for a in albums
-            # INFO: filter out albums added to other artists
-            if a.albumhash not in seen_hashes and artisthash in a.artisthashes
-            # INFO: filter out albums with the same base title
-            and create_hash(a.base_title) != create_hash(base_title)
-        ]
-
-        all_albums[artisthash] = serialize_for_card_many(
-            [a for a in albums if create_hash(a.base_title) != create_hash(base_title)][
-                :limit
-            ]
-        )
+        albumhashes = AlbumStore.get_albumhashes_by_albumartist(artisthash)
+        albums = AlbumStore.get_albums_by_hashes(albumhashes - seen_hashes)[:limit]
+
+        all_albums[artisthash] = serialize_for_card_many(albums)
         # INFO: record albums added to other artists
-        seen_hashes.update([a.albumhash for a in albums][:limit])
+        seen_hashes.update(a.albumhash for a in albums)
 
     return all_albums
 
@@ -183,15 +173,15 @@ def get_album_versions(body: GetAlbumVersionsBody):
     if not album:
         return []
     artisthash = album.album.artisthashes[0]
-    albums = AlbumStore.get_albums_by_artisthash(artisthash)
-
     basetitle = album.basetitle
+
+    albumhashes = AlbumStore.get_albumhashes_by_albumartist(
+        artisthash
+    ) & AlbumStore.get_albumhashes_by_base_title(basetitle)
     albums = [
         a
-        for a in albums
-        if a.og_title != album.album.og_title
-        if a.base_title == basetitle
-        and artisthash in {a["artisthash"] for a in a.albumartists}
+        for a in AlbumStore.get_albums_by_hashes(albumhashes)
+        if a.og_title != album.album.og_title and a.base_title == basetitle
     ]
 
     return serialize_for_card_many(albums)
@@ -18,7 +18,7 @@ from app.api.apischemas import (
     TrackLimitSchema,
 )
 
-from app.config import UserConfig
+from app.config import get_config
 from app.db.userdata import SimilarArtistTable
 from app.lib.sortlib import sort_tracks
 
@@ -141,7 +141,7 @@ def get_artist_albums(path: ArtistHashSchema, query: GetArtistAlbumsQuery):
     albums.extend(AlbumStore.get_albums_by_hashes(missing_albumhashes))
     albumdict = {a.albumhash: a for a in albums}
 
-    config = UserConfig()
+    config = get_config()
     albumgroups = groupby(tracks, key=lambda t: t.albumhash)
     for albumhash, tracks in albumgroups:
         album = albumdict.get(albumhash)
@@ -12,6 +12,7 @@ from app.api.auth import admin_required
 from app.db.userdata import FavoritesTable, PlaylistTable, ScrobbleTable
 from app.lib.index import index_everything
 from app.settings import Paths
+from app.utils.auth import get_current_userid
 from datetime import datetime
 from app.utils.dates import timestamp_to_time_passed
 
@@ -110,12 +111,11 @@ class RestoreBackup:
         pass
 
     def restore_favorites(self, favorites: list[dict]):
-        existing_favorites = FavoritesTable.get_all()
-        existing_hashes = set(fav.hash for fav in existing_favorites)
-        new_favorites = [fav for fav in favorites if fav["hash"] not in existing_hashes]
-
-        if new_favorites:
-            FavoritesTable.insert_many(new_favorites)
+        # INFO: Favorites that already exist are skipped
+        FavoritesTable.upsert_many(
+            FavoritesTable.to_rows(favorites, userid=get_current_userid()),
+            index_elements=["hash"],
+        )
 
     def restore_playlists(self, playlists: list[dict]):
         existing_playlists = PlaylistTable.get_all()
@@ -128,19 +128,17 @@ class RestoreBackup:
             PlaylistTable.insert_many(new_playlists)
 
     def restore_scrobbles(self, scrobbles: list[dict]):
-        existing_scrobbles = ScrobbleTable.get_all(0)
-        existing_hashes = set(
-            f"{scrobble.trackhash}.{scrobble.timestamp}"
-            for scrobble in existing_scrobbles
-        )
+        existing_keys = ScrobbleTable.get_all_keys()
         new_scrobbles = [
             scrobble
             for scrobble in scrobbles
-            if f"{scrobble['trackhash']}.{scrobble['timestamp']}" not in existing_hashes
+            if (scrobble["trackhash"], scrobble["timestamp"]) not in existing_keys
         ]
 
         if new_scrobbles:
-            ScrobbleTable.insert_many(new_scrobbles)
+            ScrobbleTable.upsert_many(
+                ScrobbleTable.to_rows(new_scrobbles, userid=get_current_userid())
+            )
 
 
 class RestoreBackupBody(BaseModel):
@@ -12,7 +12,7 @@ from flask_openapi3 import APIBlueprint
 from showinfm import show_in_file_manager
 
 from app import settings
-from app.config import UserConfig
+from app.config import get_config
 from app.db.libdata import TrackTable
 from app.lib.folderslib import get_files_and_dirs, get_folders
 from app.serializers.track import serialize_track
@@ -76,7 +76,7 @@ def get_folder_tree(body: FolderTree):
     req_dir = body.folder
     tracks_only = body.tracks_only
 
-    config = UserConfig()
+    config = get_config()
     root_dirs = config.rootDirs
 
     try:
@@ -1,13 +1,19 @@
-from fileinput import filename
+import mimetypes
+import os
+import stat
 from pathlib import Path
 from flask_openapi3 import Tag
 from flask_openapi3 import APIBlueprint
 from pydantic import BaseModel, Field
-from flask import send_from_directory
+from flask import Response, request, send_file
+from werkzeug.http import http_date
+from werkzeug.security import safe_join
 
+from app.lib.thumbcache import MissCache, ThumbnailCache
 from app.settings import Defaults, Paths
 from app.store.albums import AlbumStore
 from app.store.tracks import TrackStore
+from app.utils.ranges import is_not_modified
 from app.utils.threading import background
 from PIL import Image
 
@@ -33,6 +39,8 @@ def cache_thumbnails(filepath: Path, trackhash: str):
         "large": 512,
     }
 
+    resized_paths: list[str] = []
+
     for size, width in sizes.items():
         width = min(width, image.width)
         height = int(width / aspect_ratio)
@@ -40,6 +48,9 @@ def cache_thumbnails(filepath: Path, trackhash: str):
         resized_path = path / size / (trackhash + ".webp")
         resized_path.parent.mkdir(parents=True, exist_ok=True)
         image.resize((width, height)).save(resized_path, format="webp")
+        resized_paths.append(str(resized_path))
+
+    ThumbnailCache.invalidate(*resized_paths)
 
 
 def find_thumbnail(albumhash: str, pathhash: str):
@@ -85,49 +96,138 @@ def find_thumbnail(albumhash: str, pathhash: str):
     return first_image.parent, first_image.name, track_file.albumhash
 
 
+THUMBNAIL = "public, max-age=600"
+"""
+For thumbnails and other images named by hash. They can be rewritten under
+the same URL (eg. when a file is retagged), so browsers only reuse them for
+a short while before revalidating them with the ETag.
+"""
+
+REVALIDATE = "no-cache"
+"""
+For images that can change under the same URL (eg. playlist images and
+fallbacks). Browsers revalidate them with the ETag and get a 304.
+"""
+
+
+def send_image(folder: str | Path, filename: str, cache_control: str = THUMBNAIL):
+    """
+    Sends an image with a strong ETag made from its name and mtime,
+    and answers matching If-None-Match requests with a 304.
+
+    Returns None if the image doesn't exist.
+    """
+    filepath = safe_join(str(folder), filename)
+
+    if filepath is None:
+        return None
+
+    # INFO: Only thumbnails are cached in memory. The other images
+    # can change without going through `ThumbnailCache.invalidate`.
+    cacheable = cache_control == THUMBNAIL
+    entry = ThumbnailCache.get(filepath) if cacheable else None
+
+    if entry is not None:
+        mtime, mtime_ns = entry.mtime, entry.mtime_ns
+    else:
+        try:
+            info = os.stat(filepath)
+        except OSError:
+            return None
+
+        if not stat.S_ISREG(info.st_mode):
+            return None
+
+        mtime, mtime_ns = info.st_mtime, info.st_mtime_ns
+
+        if cacheable:
+            entry = ThumbnailCache.load(filepath, info)
+
+    etag = f"{Path(filename).stem}-{mtime_ns:x}"
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(mtime),
+        "Cache-Control": cache_control,
+    }
+
+    if is_not_modified(request, etag, mtime):
+        return Response(status=304, headers=headers)
+
+    if entry is not None:
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        return Response(entry.data, mimetype=mimetype, headers=headers)
+
+    response = send_file(filepath, conditional=False, etag=False)
+    response.headers.update(headers)
+    return response
+
+
 def send_fallback_img(filename: str = "default.webp"):
     """
     Returns the fallback image from the assets folder.
     """
-    folder = Paths.get_assets_path()
-    img = Path(folder) / filename
+    response = send_image(Paths.get_assets_path(), filename, REVALIDATE)
 
-    if not img.exists():
+    if response is None:
         return "", 404
 
-    return send_from_directory(folder, filename)
+    return response
 
 
 def send_file_or_fallback(
-    folder: str, filename: str, fallback: str = "default.webp", pathhash: str = ""
+    folder: str,
+    filename: str,
+    fallback: str = "default.webp",
+    pathhash: str = "",
+    cache_control: str = THUMBNAIL,
 ):
     """
     Returns the file from the folder or the fallback image.
     """
-    fpath = Path(folder) / filename
+    miss_key = (folder, filename, pathhash)
+
+    if MissCache.has(miss_key):
+        return send_fallback_img(fallback)
 
-    if fpath.exists():
-        return send_from_directory(folder, filename)
+    response = send_image(folder, filename, cache_control)
+
+    if response is not None:
+        return response
 
     if pathhash != "":
         # INFO: Check if the image is in the cache
-        cache_path = Path(Paths.get_image_cache_path()) / fpath.parent.name / filename
-        if cache_path.exists():
-            return send_from_directory(cache_path.parent, cache_path.name)
+        fpath = Path(folder) / filename
+        cache_path = Path(Paths.get_image_cache_path()) / fpath.parent.name
+        response = send_image(cache_path, filename, cache_control)
+
+        if response is not None:
+            return response
 
         # INFO: Find the thumbnail
         parent, file, albumhash = find_thumbnail(
             filename.replace(".webp", ""), pathhash
         )
 
-        # INFO: Cache  and send the thumbnail
+        # INFO: Cache  and send the thumbnail. The cached thumbnail
+        # will be sent under the same URL, so this one is revalidated.
         if file is not None and parent is not None:
             cache_thumbnails(parent / file, albumhash)
-            return send_from_directory(parent, file)
+            return send_image(parent, file, REVALIDATE)
 
+    MissCache.add(miss_key)
     return send_fallback_img(fallback)
 
 
+@api.get("/cache")
+def get_thumbnail_cache_stats():
+    """
+    Get thumbnail cache stats
+
+    Returns the size, budget and hit/miss counts of the in-memory thumbnail cache.
+    """
+    return ThumbnailCache.get_stats()
+
+
 class ImagePath(BaseModel):
     imgpath: str = Field(
         description="The image filename",
@@ -237,7 +337,9 @@ def send_playlist_image(path: PlaylistImagePath):
     Images are constructed as '{playlist_id}.webp'
     """
     folder = Paths.get_playlist_img_path()
-    return send_file_or_fallback(folder, path.imgpath, "playlist.svg")
+    return send_file_or_fallback(
+        folder, path.imgpath, "playlist.svg", cache_control=REVALIDATE
+    )
 
 
 # MIXES
@@ -247,7 +349,9 @@ def send_md_mix_image(path: ImagePath):
     Get medium mix image
     """
     folder = Paths.get_md_mixes_img_path()
-    return send_file_or_fallback(folder, path.imgpath, "playlist.svg")
+    return send_file_or_fallback(
+        folder, path.imgpath, "playlist.svg", cache_control=REVALIDATE
+    )
 
 
 @api.get("/mix/small/<imgpath>")
@@ -256,4 +360,6 @@ def send_sm_mix_image(path: ImagePath):
     Get small mix image
     """
     folder = Paths.get_sm_mixes_img_path()
-    return send_file_or_fallback(folder, path.imgpath, "playlist.svg")
+    return send_file_or_fallback(
+        folder, path.imgpath, "playlist.svg", cache_control=REVALIDATE
+    )
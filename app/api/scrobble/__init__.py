@@ -1,3 +1,4 @@
+from concurrent.futures import Future, ThreadPoolExecutor
 from gettext import ngettext
 from flask_openapi3 import Tag
 from flask_openapi3 import APIBlueprint
@@ -53,6 +54,24 @@ class LogTrackBody(TrackHashSchema):
     )
 
 
+recents_updater = ThreadPoolExecutor(max_workers=1)
+"""
+Rebuilds the recently played homepage entries on a single reused thread.
+"""
+
+
+def update_recently_played(write: Future, userid: int):
+    """
+    Rebuilds the recently played homepage entry once the scrobble is saved.
+    """
+
+    def on_saved(write: Future):
+        if write.exception() is None:
+            recents_updater.submit(RecentlyPlayed, userid=userid)
+
+    write.add_done_callback(on_saved)
+
+
 def format_date(start: float, end: float):
     return f"{pendulum.from_timestamp(start).format('MMM D, YYYY')} - {pendulum.from_timestamp(end).format('MMM D, YYYY')}"
 
@@ -76,10 +95,10 @@ def log_track(body: LogTrackBody):
     # REVIEW: Do we need to store the extra info in the database?
     # OR .... can we just write it to the backup file on demand?
     scrobble_data["extra"] = get_extra_info(body.trackhash, "track")
-    ScrobbleTable.add(scrobble_data)
+    write = ScrobbleTable.add(scrobble_data)
 
     # NOTE: Update the recently played homepage for this userid
-    RecentlyPlayed(userid=scrobble_data["userid"])
+    update_recently_played(write, scrobble_data["userid"])
 
     # Update play data on the in-memory stores
     track = trackentry.tracks[0]
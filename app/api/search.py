@@ -2,16 +2,20 @@
 Contains all the search routes.
 """
 
+import threading
+from collections import OrderedDict
 from typing import Any, Literal
 from unidecode import unidecode
 from pydantic import Field
 from flask_openapi3 import Tag
 from flask_openapi3 import APIBlueprint
 
-from app import models
 from app.api.apischemas import GenericLimitSchema
 from app.lib import searchlib
+from app.lib.searchindex import Candidates, normalize
 from app.settings import Defaults
+from app.store.albums import AlbumStore
+from app.store.artists import ArtistStore
 from app.store.tracks import TrackStore
 
 
@@ -44,37 +48,167 @@ class SearchLoadMoreQuery(SearchQuery):
     )
 
 
+class SearchCache:
+    """
+    An LRU cache of search results.
+
+    Entries are keyed by the normalized query, the item type and the library
+    generation, so they go stale as soon as a track, album or artist is added
+    or removed. Each entry also keeps the prefiltered candidates of its query
+    so that a longer query typed on top of it can reuse them.
+    """
+
+    maxsize = 256
+    generation: tuple[int, int, int] = (-1, -1, -1)
+
+    # {(query, itemtype): (results, candidates)}
+    entries: OrderedDict[tuple[str, str], tuple[list, Candidates | None]] = (
+        OrderedDict()
+    )
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_generation():
+        return (TrackStore.generation, AlbumStore.generation, ArtistStore.generation)
+
+    @classmethod
+    def check_generation(cls, generation: tuple[int, int, int]):
+        """
+        Drops all entries if the library has changed since they were cached.
+        Should be called with the lock held.
+        """
+        if generation != cls.generation:
+            cls.entries.clear()
+            cls.generation = generation
+
+    @classmethod
+    def get(cls, query: str, itemtype: str):
+        with cls.lock:
+            cls.check_generation(cls.get_generation())
+            entry = cls.entries.get((query, itemtype))
+
+            if entry is not None:
+                cls.entries.move_to_end((query, itemtype))
+
+            return entry
+
+    @classmethod
+    def get_reusable(cls, query: str, itemtype: str) -> Candidates | None:
+        """
+        Returns the candidates of the longest cached query that this query
+        starts with. Whether they can be reused is decided by the corpus.
+        """
+        best: Candidates | None = None
+        length = -1
+
+        with cls.lock:
+            for (_query, _itemtype), (_, candidates) in cls.entries.items():
+                if (
+                    candidates is not None
+                    and _itemtype == itemtype
+                    and len(_query) > length
+                    and query.startswith(_query)
+                ):
+                    best, length = candidates, len(_query)
+
+        return best
+
+    @classmethod
+    def set(
+        cls,
+        query: str,
+        itemtype: str,
+        generation: tuple[int, int, int],
+        results: list,
+        candidates: Candidates | None,
+    ):
+        with cls.lock:
+            cls.check_generation(cls.get_generation())
+
+            # INFO: The library changed while searching
+            if generation != cls.generation:
+                return
+
+            cls.entries[(query, itemtype)] = (results, candidates)
+            cls.entries.move_to_end((query, itemtype))
+
+            while len(cls.entries) > cls.maxsize:
+                cls.entries.popitem(last=False)
+
+
+class CachedSearchMatches(searchlib.SearchMatches):
+    """
+    Search matches that are read from and saved to the search cache.
+    """
+
+    def __init__(self, query: str) -> None:
+        self.key = normalize(query)
+        self.generation = SearchCache.get_generation()
+        super().__init__(query)
+
+    def find(self, itemtype: str) -> list:
+        entry = SearchCache.get(self.key, itemtype)
+
+        if entry is not None:
+            return entry[0]
+
+        reuse = SearchCache.get_reusable(self.key, itemtype)
+        finder = self.finders[itemtype](self.query, reuse=reuse)
+        results = finder()
+
+        SearchCache.set(
+            self.key, itemtype, self.generation, results, finder.candidates
+        )
+        return results
+
+    def find_all(self) -> dict[str, list]:
+        entries = {t: SearchCache.get(self.key, t) for t in self.finders}
+
+        if all(entry is not None for entry in entries.values()):
+            return {t: entry[0] for t, entry in entries.items()}
+
+        results = super().find_all()
+
+        for itemtype, items in results.items():
+            SearchCache.set(self.key, itemtype, self.generation, items, None)
+
+        return results
+
+
 class Search:
     def __init__(self, query: str) -> None:
-        self.tracks: list[models.Track] = []
         self.query = unidecode(query)
+        self.matches = CachedSearchMatches(self.query)
 
     def search_tracks(self):
         """
         Calls :class:`SearchTracks` which returns the tracks that fuzzily match
         the search terms. Then adds them to the `SearchResults` store.
         """
-        self.tracks = TrackStore.get_flat_list()
-        return searchlib.TopResults().search(self.query, tracks_only=True)
+        return searchlib.TopResults().search(
+            self.query, tracks_only=True, matches=self.matches
+        )
 
     def search_artists(self):
         """Calls :class:`SearchArtists` which returns the artists that fuzzily match
         the search term. Then adds them to the `SearchResults` store.
         """
-        return searchlib.SearchArtists(self.query)()
+        return self.matches.artists
 
     def search_albums(self):
         """Calls :class:`SearchAlbums` which returns the albums that fuzzily match
         the search term. Then adds them to the `SearchResults` store.
         """
-        return searchlib.TopResults().search(self.query, albums_only=True)
+        return searchlib.TopResults().search(
+            self.query, albums_only=True, matches=self.matches
+        )
 
     def get_top_results(
         self,
         limit: int,
     ):
         finder = searchlib.TopResults()
-        return finder.search(self.query, limit=limit)
+        return finder.search(self.query, limit=limit, matches=self.matches)
 
 
 @api.get("/top")
@@ -5,10 +5,12 @@ from flask_openapi3 import APIBlueprint
 from pydantic import BaseModel, Field
 from app.api.auth import admin_required
 
+from app.db.engine import DbEngine
+from app.db.writequeue import WriteQueue
 from app.db.userdata import PluginTable
 from app.lib.index import index_everything
 from app.settings import Info
-from app.config import UserConfig
+from app.config import UserConfig, get_config
 from app.utils.auth import get_current_userid
 
 bp_tag = Tag(name="Settings", description="Customize stuff")
@@ -86,7 +88,7 @@ def get_root_dirs():
     """
     Get root directories
     """
-    return {"dirs": UserConfig().rootDirs}
+    return {"dirs": get_config().rootDirs}
 
 
 @api.get("")
@@ -94,7 +96,7 @@ def get_all_settings():
     """
     Get all settings
     """
-    config = asdict(UserConfig())
+    config = asdict(get_config())
     plugins = PluginTable.get_all()
     config["plugins"] = plugins
     config["version"] = Info.SWINGMUSIC_APP_VERSION
@@ -106,6 +108,17 @@ def get_all_settings():
     return config
 
 
+@api.get("/db-pool")
+def get_db_pool_stats():
+    """
+    Get database connection stats
+
+    Returns the number of read-only connections opened, the number of reads and
+    writes, the time spent waiting for the writer connection, and the write queue.
+    """
+    return {**DbEngine.get_stats(), "write_queue": WriteQueue.get_stats()}
+
+
 class SetSettingBody(BaseModel):
     key: str = Field(
         description="The setting key",
@@ -121,8 +134,10 @@ class SetSettingBody(BaseModel):
 def trigger_scan():
     """
     Triggers scan for new music
+
+    This does a full scan, so files modified in place are picked up too.
     """
-    index_everything()
+    index_everything(full_scan=True)
     return {"msg": "Scan triggered!"}
 
 
@@ -2,41 +2,37 @@
 Contains all the track routes.
 """
 
+import math
+from concurrent.futures import ThreadPoolExecutor
 import os
-import tempfile
 import time
-from typing import Literal
+from typing import IO, Literal
+from urllib.parse import urlencode
 
 from flask import send_file, request, Response
 from flask_openapi3 import APIBlueprint, Tag
 from pydantic import BaseModel, Field
 from app.api.apischemas import TrackHashSchema
-from app.lib.trackslib import get_silence_paddings
-from app.lib.transcoder import start_transcoding
-
+from app.lib.trackslib import get_silence_paddings, get_track_analysis
+from app.lib.transcodecache import TranscodeCache
+from app.lib.transcoder import (
+    Priority,
+    TranscodeJob,
+    TranscodeScheduler,
+    start_segmented_transcoding,
+    start_transcoding,
+)
+
+from app.models import Track
+from app.settings import Defaults
 from app.store.tracks import TrackStore
-from app.utils.files import guess_mime_type
+from app.utils.files import guess_mime_type, warm_page_cache
+from app.utils.ranges import send_file_range
 
 bp_tag = Tag(name="File", description="Audio files")
 api = APIBlueprint("track", __name__, url_prefix="/file", abp_tags=[bp_tag])
 
 
-class TransCodeStore:
-    map: dict[str, str] = {}
-
-    @classmethod
-    def add_file(cls, trackhash: str, filepath: str):
-        cls.map[trackhash] = filepath
-
-    @classmethod
-    def remove_file(cls, trackhash: str):
-        del cls.map[trackhash]
-
-    @classmethod
-    def find(cls, trackhash: str):
-        return cls.map.get(trackhash)
-
-
 class SendTrackFileQuery(BaseModel):
     filepath: str = Field(
         description="The filepath to play (if available)", default=None
@@ -49,6 +45,10 @@ class SendTrackFileQuery(BaseModel):
         "mp3",
         description="The container format of the audio file. Options: mp3, aac, flac, webm, ogg",
     )
+    live: bool = Field(
+        False,
+        description="Whether to stream the whole transcode in one chunked response as ffmpeg encodes it",
+    )
 
 
 @api.get("/<trackhash>/legacy")
@@ -103,120 +103,510 @@ def send_track_file(path: TrackHashSchema, query: SendTrackFileQuery):
     - The quality parameter is the desired bitrate in kbps.
     - The mp3 container is the best container for upto 320kbps (and has better duration reporting). The flac container allows for higher bitrates but it produces dramatically larger files (when transcoding from lossy formats).
     - You can get the transcoded bitrate by checking the X-Transcoded-Bitrate header on the first request's response.
+    - With `live=true`, a transcode that is not cached yet is sent as one chunked response (no Range support) as ffmpeg encodes it. The transcode is still saved to the transcode cache, and is shared with other requests for it.
+    - For transcoded streams with accurate durations and seeking, use the HLS playlist at `/file/<trackhash>/hls` instead.
     """
     trackhash = path.trackhash
-    filepath = query.filepath
+    track = find_track(trackhash, query.filepath)
+
+    if track is not None:
+        if query.quality == "original":
+            return send_file_range(track.filepath, guess_mime_type(track.filepath))
+
+        quality = get_transcode_bitrate(track, query.quality, query.container)
 
+        if quality is None:
+            return {"msg": "Invalid quality"}, 400
+
+        return transcode_and_stream(
+            trackhash, track.filepath, quality, query.container, live=query.live
+        )
+
+    return {"msg": "File Not Found"}, 404
+
+
+def find_track(trackhash: str, filepath: str | None) -> Track | None:
+    """
+    Returns the track at the given filepath if it exists. Otherwise, returns
+    the highest bitrate track with the given trackhash that exists on disk.
+    """
     # If filepath is provided, try to send that
-    track = None
     tracks = TrackStore.get_tracks_by_filepaths([filepath])
 
     if len(tracks) > 0 and os.path.exists(filepath):
-        track = tracks[0]
-    else:
-        res = TrackStore.trackhashmap.get(trackhash)
+        return tracks[0]
 
-        # When finding by trackhash, sort by bitrate
-        # and get the first track that exists
-        if res is not None:
-            tracks = sorted(res.tracks, key=lambda x: x.bitrate, reverse=True)
+    res = TrackStore.trackhashmap.get(trackhash)
 
-            for t in tracks:
-                if os.path.exists(t.filepath):
-                    track = t
-                    break
+    # When finding by trackhash, sort by bitrate
+    # and get the first track that exists
+    if res is not None:
+        tracks = sorted(res.tracks, key=lambda x: x.bitrate, reverse=True)
 
-    if track is not None:
-        if query.quality == "original":
-            return send_file_as_chunks(track.filepath)
+        for t in tracks:
+            if os.path.exists(t.filepath):
+                return t
 
-        # prevent requesting over transcoding
-        max_bitrate = track.bitrate
-        requested_bitrate = int(query.quality)
 
-        if query.container != "flac":
-            # drop to 320 for non-flac containers
-            requested_bitrate = min(320, requested_bitrate)
+def is_valid_quality(quality: str):
+    """
+    Checks that a transcode quality is a positive number of kbps.
+    """
+    return quality.isascii() and quality.isdigit() and int(quality) > 0
 
-        quality = f"{min(max_bitrate, requested_bitrate)}k"
-        return transcode_and_stream(trackhash, track.filepath, quality, query.container)
 
-    return {"msg": "File Not Found"}, 404
+def get_transcode_bitrate(track: Track, quality: str, container: str) -> str | None:
+    """
+    Returns the bitrate to transcode to (eg. "320k"), capped
+    at the source bitrate to prevent over transcoding.
+
+    Returns None if the quality is not a positive number of kbps.
+    """
+    if not is_valid_quality(quality):
+        return None
+
+    max_bitrate = track.bitrate
+    requested_bitrate = int(quality)
+
+    if container != "flac":
+        # drop to 320 for non-flac containers
+        requested_bitrate = min(320, requested_bitrate)
+
+    return f"{min(max_bitrate, requested_bitrate)}k"
+
+
+FORMAT_PARAMS = {
+    "mp3": ["-c:a", "libmp3lame", "-f", "mp3"],
+    "aac": ["-c:a", "aac", "-f", "adts"],
+    "webm": ["-c:a", "libopus", "-f", "webm"],
+    "ogg": ["-c:a", "libvorbis", "-f", "ogg"],
+    "flac": ["-c:a", "flac", "-f", "flac"],
+    "wav": ["-c:a", "pcm_s16le", "-f", "wav"],
+}
+
+TRANSCODE_WAIT_TIMEOUT = 30
+"""
+How long a request waits for a queued transcode to start, in seconds.
+"""
 
 
-def transcode_and_stream(trackhash: str, filepath: str, bitrate: str, container: str):
+def transcode_and_stream(
+    trackhash: str, filepath: str, bitrate: str, container: str, live: bool = False
+):
     """
     Initiates transcoding and returns the first chunk of the transcoded file.
 
     The other chunks are streamed on subsequent requests and are rerouted to `send_file_as_chunks`.
+    In live mode, the whole transcode is streamed in one response instead, following
+    the transcode's output file, and the transcode runs ahead of all others.
+    Completed transcodes are served from the transcode cache.
     """
-    temp_file = TransCodeStore.find(trackhash)
-    if temp_file is not None:
-        return send_file_as_chunks(temp_file)
-
-    format_params = {
-        "mp3": ["-c:a", "libmp3lame"],
-        "aac": ["-c:a", "aac"],
-        "webm": ["-c:a", "libopus"],
-        "ogg": ["-c:a", "libvorbis"],
-        "flac": ["-c:a", "flac"],
-        "wav": ["-c:a", "pcm_s16le"],
-    }
-
-    # Create a temporary file
-    format = f".{container}" if container in format_params.keys() else ".flac"
-    container_args = (
-        format_params[container]
-        if container in format_params.keys()
-        else format_params["flac"]
-    )
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=format)
-    temp_filename = temp_file.name
-    temp_file.close()
-
-    TransCodeStore.add_file(trackhash, temp_filename)
-    start_transcoding(filepath, temp_filename, bitrate, container_args)
+    if container not in FORMAT_PARAMS:
+        container = "flac"
+
+    key = TranscodeCache.get_key(trackhash, filepath, bitrate, container)
+    response = send_cached_transcode(key, bitrate)
+
+    if response is not None:
+        return response
+
+    job = TranscodeScheduler.find(key)
+    running = job is not None and job.output_ready
+
+    if not live and running:
+        try:
+            return send_file_as_chunks(open(job.output_path, "rb"))
+        except FileNotFoundError:
+            # INFO: The transcode completed and was moved into the cache
+            response = send_cached_transcode(key, bitrate)
+
+            if response is not None:
+                return response
+
+    # INFO: Joins the queued or running job if there's one,
+    # moving it to the live or playback lane
+    priority = Priority.LIVE if live else Priority.PLAYBACK
+    job = queue_transcode(key, filepath, bitrate, container, priority)
+    audio_type = guess_mime_type(TranscodeCache.get_partial_path(key))
+
+    if not job.wait_for_output(TRANSCODE_WAIT_TIMEOUT):
+        return {"msg": "Transcoder busy, try again"}, 503
+
+    file = open_transcode(job, key)
+
+    if file is None:
+        return {"msg": "Transcoding failed"}, 500
+
+    if live:
+        # INFO: Follows the running transcode's output file
+        def follow():
+            with file:
+                yield from job.tail(file)
+
+        response = Response(
+            follow(),
+            200,
+            mimetype=audio_type,
+            content_type=audio_type,
+            direct_passthrough=True,
+        )
+        response.headers.add("Cache-Control", "no-cache")
+        response.headers.add("X-Transcoded-Bitrate", bitrate)
+        return response
 
     chunk_size = 1024 * 512  # 0.5MB
-    file_size = os.path.getsize(filepath)
-
-    def generate():
-        # Poll for the output file
-        while (
-            not os.path.exists(temp_filename)
-            or os.path.getsize(temp_filename) < chunk_size
-        ):
-            print(f"Waiting for transcoding to complete... filename: {temp_filename}")
-            time.sleep(0.1)  # Wait for 100ms before checking again
-
-        with open(temp_filename, "rb") as file:
-            file.seek(0)
-            return file.read(chunk_size)
-
-    audio_type = guess_mime_type(temp_filename)
+
+    # INFO: Returns as soon as the encoder has produced the first chunk,
+    # or with what there is if the transcode is shorter than a chunk.
+    with file:
+        data = job.read_head(file, chunk_size)
+        done = job.done.is_set()
+        file_size = os.fstat(file.fileno()).st_size
+
+    # NOTE: Like `send_file_as_chunks`, the size of a running transcode
+    # is padded by a chunk, so that the player requests the next one.
+    if not done:
+        file_size += chunk_size
+
     response = Response(
-        generate(),
+        data,
         206,
         mimetype=audio_type,
         content_type=audio_type,
         direct_passthrough=True,
     )
-    response.headers.add("Content-Range", f"bytes {0}-{chunk_size}/{file_size}")
+    response.headers.add(
+        "Content-Range", f"bytes 0-{max(len(data) - 1, 0)}/{file_size}"
+    )
     response.headers.add("Accept-Ranges", "bytes")
     response.headers.add("X-Transcoded-Bitrate", bitrate)
     return response
 
 
-def send_file_as_chunks(filepath: str) -> Response:
+def send_cached_transcode(key: str, bitrate: str, mimetype: str | None = None):
+    """
+    Sends a cached transcode, or returns None if it's not cached.
+    """
+    file = TranscodeCache.open(key)
+
+    if file is None:
+        return None
+
+    response = send_file_range(
+        file.name, mimetype or guess_mime_type(file.name), file=file
+    )
+    response.headers.add("X-Transcoded-Bitrate", bitrate)
+    return response
+
+
+def open_transcode(job: TranscodeJob, key: str) -> IO[bytes] | None:
+    """
+    Opens the output of a transcode job. Completed transcodes have been moved
+    from the partial file into the cache. Returns None if the transcode failed.
+    """
+    try:
+        return open(job.output_path, "rb")
+    except FileNotFoundError:
+        return TranscodeCache.open(key)
+
+
+def queue_transcode(
+    key: str, filepath: str, bitrate: str, container: str, priority: int
+):
+    """
+    Queues a whole-file transcode into the transcode cache. Returns the
+    existing job if the file is already being transcoded.
+    """
+
+    def on_complete(success: bool):
+        if success:
+            TranscodeCache.add(key)
+        else:
+            TranscodeCache.discard_partial(key)
+
+    return start_transcoding(
+        filepath,
+        TranscodeCache.get_partial_path(key),
+        bitrate,
+        FORMAT_PARAMS[container],
+        on_complete=on_complete,
+        key=key,
+        priority=priority,
+    )
+
+
+PREFETCH_LIMIT = 5
+"""
+The number of upcoming tracks warmed per prefetch request.
+"""
+
+
+class PrefetchQueueBody(BaseModel):
+    trackhashes: list[str] = Field(
+        description="The trackhashes of the next tracks in the queue, in play order",
+        example=[Defaults.API_TRACKHASH],
+    )
+    quality: str = Field(
+        "original",
+        description="The quality the tracks will be requested in. See `GET /file/<trackhash>`",
+    )
+    container: Literal["mp3", "aac", "flac", "webm", "ogg"] = Field(
+        "mp3",
+        description="The container the tracks will be requested in",
+    )
+
+
+@api.post("/prefetch")
+def prefetch_queue(body: PrefetchQueueBody):
+    """
+    Prefetch upcoming tracks
+
+    Warms the server for the next tracks in the client's queue, so that
+    playback doesn't stall at track boundaries. Transcodes that are not
+    cached are queued at a low priority, behind transcodes for playback,
+    and the files are read ahead into the OS page cache.
+
+    NOTE: Only the first few trackhashes are used.
+    """
+    container = body.container if body.container in FORMAT_PARAMS else "flac"
+
+    if body.quality != "original" and not is_valid_quality(body.quality):
+        return {"msg": "Invalid quality"}, 400
+
+    filepaths: list[str] = []
+    queued: list[str] = []
+
+    for trackhash in body.trackhashes[:PREFETCH_LIMIT]:
+        track = find_track(trackhash, None)
+
+        if track is None:
+            continue
+
+        if body.quality == "original":
+            filepaths.append(track.filepath)
+            continue
+
+        bitrate = get_transcode_bitrate(track, body.quality, container)
+        key = TranscodeCache.get_key(trackhash, track.filepath, bitrate, container)
+
+        if TranscodeCache.contains(key):
+            filepaths.append(TranscodeCache.get_path(key))
+            continue
+
+        # INFO: The source is read ahead for when the transcode starts
+        filepaths.append(track.filepath)
+        queue_transcode(key, track.filepath, bitrate, container, Priority.PREFETCH)
+        queued.append(trackhash)
+
+    for filepath in filepaths:
+        page_cache_warmer.submit(warm_page_cache, filepath)
+
+    return {"transcoding": queued}
+
+
+page_cache_warmer = ThreadPoolExecutor(max_workers=1)
+"""
+Reads prefetched files into the OS page cache, one at a time, on a single reused thread.
+"""
+
+
+HLS_SEGMENT_LENGTH = 10  # in seconds
+
+HLS_SEGMENT_TIMEOUT = 60
+"""
+How long a request waits for a segment to be transcoded, in seconds.
+"""
+
+HLS_FORMAT_PARAMS = ["-c:a", "aac", "-segment_format", "mpegts", "-muxdelay", "0"]
+"""
+AAC in MPEG-TS segments, which all HLS clients can play.
+"""
+
+
+class GetHlsQuery(BaseModel):
+    filepath: str = Field(
+        description="The filepath to play (if available)", default=None
+    )
+    quality: str = Field(
+        "320",
+        description="The bitrate of the segments in kbps. Options: 320, 256, 128, 96",
+    )
+
+
+class GetHlsSegmentPath(TrackHashSchema):
+    index: int = Field(description="The segment number, starting from 0")
+
+
+@api.get("/<trackhash>/hls")
+def get_hls_playlist(path: TrackHashSchema, query: GetHlsQuery):
+    """
+    Get an HLS playlist
+
+    Returns a VOD playlist of fixed length segments for the given track. The
+    segment durations add up to the track's duration, so seeking works as
+    expected. The track is transcoded into segments in one pass when a segment
+    is first requested, and each segment is cached as soon as it's written.
+    """
+    track = find_track(path.trackhash, query.filepath)
+
+    if track is None:
+        return {"msg": "File Not Found"}, 404
+
+    if track.duration <= 0:
+        return {"msg": "Track duration is unknown"}, 400
+
+    if get_transcode_bitrate(track, query.quality, "aac") is None:
+        return {"msg": "Invalid quality"}, 400
+
+    params = urlencode({"filepath": track.filepath, "quality": query.quality})
+    count = math.ceil(track.duration / HLS_SEGMENT_LENGTH)
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{HLS_SEGMENT_LENGTH}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+
+    for index in range(count):
+        start = index * HLS_SEGMENT_LENGTH
+        duration = min(HLS_SEGMENT_LENGTH, track.duration - start)
+        # NOTE: Relative to /file/<trackhash>/hls
+        lines.extend([f"#EXTINF:{duration:.3f},", f"hls/{index}.ts?{params}"])
+
+    lines.append("#EXT-X-ENDLIST")
+
+    response = Response(
+        "\n".join(lines) + "\n", mimetype="application/vnd.apple.mpegurl"
+    )
+    response.headers.add("Cache-Control", "no-cache")
+    return response
+
+
+@api.get("/<trackhash>/hls/<int:index>.ts")
+def get_hls_segment(path: GetHlsSegmentPath, query: GetHlsQuery):
+    """
+    Get an HLS segment
+
+    Returns the given segment of the track. If it's not cached, the whole
+    track is transcoded into segments, and the request waits for this one.
+    """
+    track = find_track(path.trackhash, query.filepath)
+
+    if track is None or path.index * HLS_SEGMENT_LENGTH >= track.duration:
+        return {"msg": "File Not Found"}, 404
+
+    bitrate = get_transcode_bitrate(track, query.quality, "aac")
+
+    if bitrate is None:
+        return {"msg": "Invalid quality"}, 400
+
+    key = get_hls_segment_key(path.trackhash, track, bitrate, path.index)
+    response = send_cached_transcode(key, bitrate, "video/mp2t")
+
+    if response is not None:
+        return response
+
+    job = transcode_segments(track, path.trackhash, bitrate)
+
+    if not job.wait_for(lambda: TranscodeCache.contains(key), HLS_SEGMENT_TIMEOUT):
+        return {"msg": "Transcoding timed out"}, 504
+
+    response = send_cached_transcode(key, bitrate, "video/mp2t")
+
+    if response is None:
+        return {"msg": "Transcoding failed"}, 500
+
+    return response
+
+
+def get_hls_segment_key(trackhash: str, track: Track, bitrate: str, index: int | str):
+    """
+    Returns the cache key of an HLS segment. Pass "%d" as the
+    index to get the pattern that ffmpeg names the segments by.
+    """
+    return TranscodeCache.get_segment_key(
+        trackhash, track.filepath, bitrate, "ts", HLS_SEGMENT_LENGTH, index
+    )
+
+
+def transcode_segments(
+    track: Track,
+    trackhash: str,
+    bitrate: str,
+    priority: int = Priority.PLAYBACK,
+):
+    """
+    Queues the transcode of a track into HLS segments. Each segment is moved
+    into the transcode cache as soon as ffmpeg has written it. Returns the
+    existing job if the track is already being transcoded.
+
+    The track is encoded in one pass rather than a segment at a time, as
+    separately encoded AAC segments each start with encoder priming and end
+    with padding, which is heard as clicks or gaps at the boundaries.
+    Seeking ahead of the encoder waits for it to get there.
+    """
+    pattern = get_hls_segment_key(trackhash, track, bitrate, "%d")
+    count = math.ceil(track.duration / HLS_SEGMENT_LENGTH)
+
+    def on_segment(index: int):
+        TranscodeCache.add(get_hls_segment_key(trackhash, track, bitrate, index))
+        job = TranscodeScheduler.find(pattern)
+
+        if job is not None:
+            job.notify()
+
+    def on_complete(success: bool):
+        if not success:
+            for index in range(count):
+                TranscodeCache.discard_partial(
+                    get_hls_segment_key(trackhash, track, bitrate, index)
+                )
+
+    return start_segmented_transcoding(
+        track.filepath,
+        TranscodeCache.get_partial_path(pattern),
+        bitrate,
+        HLS_FORMAT_PARAMS,
+        HLS_SEGMENT_LENGTH,
+        on_segment,
+        on_complete=on_complete,
+        key=pattern,
+        priority=priority,
+    )
+
+
+@api.get("/transcode-cache")
+def get_transcode_cache_stats():
+    """
+    Get transcode cache stats
+
+    Returns the size, budget and hit/miss counts of the transcode cache,
+    and the number of running and queued transcodes.
+    """
+    return {**TranscodeCache.get_stats(), "jobs": TranscodeScheduler.get_stats()}
+
+
+def send_file_as_chunks(file: IO[bytes]) -> Response:
     """
     Returns a Response object that streams the file in chunks.
+
+    Used for files that are still being written to (eg. by the transcoder).
+    Complete files should be sent with `send_file_range` instead.
+
+    The file is passed open, as the transcoder may move it once it's complete.
     """
+
+    def get_size():
+        return os.fstat(file.fileno()).st_size
+
     # NOTE: +1 makes sure the last byte is included in the range.
     # NOTE: -1 is used to convert the end index to a 0-based index.
     chunk_size = 1024 * 512  # 0.5MB
 
     # Get file size
-    file_size = os.path.getsize(filepath)
+    file_size = get_size()
     start = 0
     end = chunk_size
 
@@ -235,46 +625,49 @@ def send_file_as_chunks(filepath: str) -> Response:
             end = _end
 
     def generate_chunks():
-        with open(filepath, "rb") as file:
-            file.seek(start)
-            remaining_bytes = end - start + 1
+        file.seek(start)
+        remaining_bytes = end - start + 1
 
-            retry_count = 0
-            max_retries = 10  # 5 * 100ms = 500ms total wait time
+        retry_count = 0
+        max_retries = 10  # 5 * 100ms = 500ms total wait time
 
-            while remaining_bytes > 0 or retry_count < max_retries:
-                if retry_count == max_retries:
-                    print("💚 sending final chunk! ...")
+        while remaining_bytes > 0 or retry_count < max_retries:
+            if retry_count == max_retries:
+                print("💚 sending final chunk! ...")
 
-                    pos = file.tell()
-                    chunk = file.read(os.path.getsize(filepath) - pos)
+                pos = file.tell()
+                chunk = file.read(get_size() - pos)
 
-                    return chunk, pos, True
+                return chunk, pos, True
 
-                if remaining_bytes < chunk_size:
-                    time.sleep(0.25)
-                    retry_count += 1
-                    remaining_bytes = os.path.getsize(filepath) - file.tell()
-                    continue
+            if remaining_bytes < chunk_size:
+                time.sleep(0.25)
+                retry_count += 1
+                remaining_bytes = get_size() - file.tell()
+                continue
 
-                chunk = file.read(min(chunk_size, remaining_bytes))
-                if chunk:
-                    remaining_bytes -= len(chunk)
-                    return chunk, file.tell(), False
-                else:
-                    # If no data is read, wait for 100ms before retrying
-                    time.sleep(0.25)
-                    retry_count += 1
+            chunk = file.read(min(chunk_size, remaining_bytes))
+            if chunk:
+                remaining_bytes -= len(chunk)
+                return chunk, file.tell(), False
+            else:
+                # If no data is read, wait for 100ms before retrying
+                time.sleep(0.25)
+                retry_count += 1
 
-                    # update remaining bytes
-                    remaining_bytes = os.path.getsize(filepath) - file.tell()
-                    print(f"▶ Remaining bytes: {remaining_bytes}")
+                # update remaining bytes
+                remaining_bytes = get_size() - file.tell()
+                print(f"▶ Remaining bytes: {remaining_bytes}")
 
-            return None, 0, True
+        return None, 0, True
 
-    data, position, is_final = generate_chunks()
+    try:
+        data, position, is_final = generate_chunks()
+        file_size = get_size()
+    finally:
+        file.close()
 
-    audio_type = guess_mime_type(filepath)
+    audio_type = guess_mime_type(file.name)
     response = Response(
         response=data,
         status=206,  # Partial Content status code
@@ -286,7 +679,7 @@ def send_file_as_chunks(filepath: str) -> Response:
     bytes_to_add = chunk_size if not is_final else 0
     response.headers.add(
         "Content-Range",
-        f"bytes {start}-{position}/{os.path.getsize(filepath) + bytes_to_add}",
+        f"bytes {start}-{position}/{file_size + bytes_to_add}",
     )
     response.headers.add("Access-Control-Expose-Headers", "Content-Range")
     response.headers.add("Accept-Ranges", "bytes")
@@ -320,7 +713,7 @@ def get_audio_silence(body: GetAudioSilenceBody):
 
     Returns the duration of silence at the end of the current ending track and the duration of silence at the beginning of the next track.
 
-    NOTE: Durations are in milliseconds.
+    NOTE: Durations are in milliseconds. The ending file's value is null if its duration is unknown.
     """
     ending_file = body.ending_file  # ending file's filepath
     starting_file = body.starting_file  # starting file's filepath
@@ -329,3 +722,15 @@ def get_audio_silence(body: GetAudioSilenceBody):
         return {"msg": "No filepath provided"}, 400
 
     return get_silence_paddings(ending_file, starting_file)
+
+
+@api.get("/<trackhash>/analysis")
+def get_analysis(path: TrackHashSchema):
+    """
+    Get track analysis
+
+    Returns where the leading silence ends and the trailing silence starts (in milliseconds), the EBU R128 loudness (LUFS), true peak (dBTP) and the ReplayGain 2.0 gain (dB) of a track.
+
+    NOTE: Loudness is only measured when the `analyseTracks` setting is on. Values are null until the track is analysed.
+    """
+    return get_track_analysis(path.trackhash)
@@ -1,6 +1,7 @@
 from dataclasses import dataclass, asdict, field
 import json
 import os
+import threading
 from typing import Any
 from .settings import Paths
 
@@ -44,6 +45,26 @@ class UserConfig:
     cleanAlbumTitle: bool = True
     showAlbumsAsSingles: bool = False
 
+    # search
+    searchPrefilter: bool = True
+    searchPrefilterMinHits: int = 5
+    searchVectorized: bool = False
+    searchWorkers: int = -1
+
+    # streaming
+    transcodeCacheSize: int = 1024  # in MB
+    transcodeWorkers: int = 0  # 0 uses one per core
+    analyseTracks: bool = False  # silence and loudness, after indexing
+
+    # images
+    thumbnailCacheSize: int = 64  # in MB
+    prewarmThumbnails: bool = False  # most played albums, at startup
+
+    # database
+    pooledDbConnections: bool = True  # per-thread readers and one writer
+    writeQueueInterval: int = 5  # in ms, how long a group commit waits for writes
+    durableWrites: bool = False  # wait for queued writes to commit before responding
+
     # misc
     enablePeriodicScans: bool = False
     scanInterval: int = 10
@@ -104,6 +125,8 @@ class UserConfig:
         with open(self._config_path, "w") as f:
             json.dump(settings, f, indent=4, default=list)
 
+        invalidate_config()
+
     def __setattr__(self, key: str, value: Any) -> None:
         """
         Writes to the config file whenever a value is set
@@ -116,3 +139,57 @@ class UserConfig:
 
         print(f"writing to file: {key}={value}")
         self.write_to_file(asdict(self))
+
+
+class ConfigSnapshot:
+    """
+    Holds a process-wide `UserConfig` instance.
+
+    Creating a `UserConfig` reads and parses the config file, which is too
+    slow for hot paths like hydrating thousands of tracks. The snapshot is
+    rebuilt only when the config file changes on disk (by mtime) or when a
+    write goes through `UserConfig.write_to_file`.
+    """
+
+    config: UserConfig | None = None
+    path: str = ""
+    mtime: float = -1
+    lock = threading.Lock()
+
+
+def get_config_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return -1
+
+
+def get_config() -> UserConfig:
+    """
+    Returns the cached config, reloading it if the config file has changed.
+
+    NOTE: Treat the returned instance as read-only. To change a setting,
+    create a new `UserConfig()` and set the value on it.
+    """
+    path = Paths.get_config_file_path()
+    mtime = get_config_mtime(path)
+
+    with ConfigSnapshot.lock:
+        if (
+            ConfigSnapshot.config is None
+            or ConfigSnapshot.path != path
+            or ConfigSnapshot.mtime != mtime
+        ):
+            ConfigSnapshot.config = UserConfig()
+            ConfigSnapshot.path = path
+            ConfigSnapshot.mtime = mtime
+
+        return ConfigSnapshot.config
+
+
+def invalidate_config():
+    """
+    Drops the cached config so that the next `get_config` call reloads it.
+    """
+    with ConfigSnapshot.lock:
+        ConfigSnapshot.config = None
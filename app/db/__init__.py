@@ -7,6 +7,7 @@ from sqlalchemy import (
     select,
 )
 
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import DeclarativeBase, MappedAsDataclass
 from app.db.engine import DbEngine
 
@@ -15,7 +16,7 @@ class Base(MappedAsDataclass, DeclarativeBase):
     """
     Base class for all database models.
 
-    It has methods common to all tables. eg. `insert_one`, `insert_many`, `remove_all`, `remove_one`, `all`, `count`.
+    It has methods common to all tables. eg. `insert_one`, `insert_many`, `upsert_many`, `remove_all`, `remove_one`, `all`, `count`.
     """
 
     @classmethod
@@ -30,6 +31,68 @@ class Base(MappedAsDataclass, DeclarativeBase):
         """
         return cls.execute(insert(cls).values(items), commit=True)
 
+    @classmethod
+    def upsert_many(
+        cls,
+        items: list[dict[str, Any]],
+        index_elements: list[str] | None = None,
+        update: list[str] | None = None,
+    ):
+        """
+        Inserts multiple items in a single transaction.
+
+        Items that conflict with an existing row on `index_elements` (which
+        must match a unique index) update that row's `update` columns, or are
+        skipped if there are none. Without `index_elements`, the items are
+        inserted as is.
+
+        All items must have the same keys. They are bound to one prepared
+        statement (executemany), so SQLite's bound parameter limit doesn't
+        apply and the SQL is only compiled once.
+        """
+        if not items:
+            return
+
+        stmt = sqlite_insert(cls)
+
+        if index_elements and update:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={column: stmt.excluded[column] for column in update},
+            )
+        elif index_elements:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+        with DbEngine.manager(commit=True) as conn:
+            conn.execute(stmt, items)
+
+    @classmethod
+    def to_rows(cls, items: list[dict[str, Any]], **defaults: Any):
+        """
+        Returns the items with exactly the table's columns, so that they
+        can be passed to `upsert_many`.
+
+        Unknown keys and the autoincrement id are dropped. Missing columns
+        are filled from `defaults`, then the column's own default, or None.
+        """
+        table = cls.__table__
+        fallbacks: dict[str, Any] = {}
+
+        for column in table.columns:
+            if column is table.autoincrement_column:
+                continue
+
+            default = column.default
+            fallbacks[column.key] = defaults.get(
+                column.key,
+                default.arg if default is not None and default.is_scalar else None,
+            )
+
+        return [
+            {key: item.get(key, fallback) for key, fallback in fallbacks.items()}
+            for item in items
+        ]
+
     @classmethod
     def insert_one(cls, item: dict[str, Any]):
         """
@@ -1,6 +1,9 @@
 from contextlib import contextmanager
 import gc
-from sqlalchemy import Engine, event
+import threading
+import time
+import weakref
+from sqlalchemy import Connection, Engine, event
 
 
 @event.listens_for(Engine, "connect")
@@ -15,12 +18,61 @@ def set_sqlite_pragma(dbapi_connection, connection_record):
     cursor.close()
 
 
+class ThreadReader:
+    """
+    A thread's read-only connection. It is kept in a `threading.local`,
+    which drops it when the thread exits, and the connection is closed then.
+    """
+
+    readers: "weakref.WeakSet[ThreadReader]" = weakref.WeakSet()
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.depth = 0
+        self.finalizer = weakref.finalize(self, close_reader, conn)
+        ThreadReader.readers.add(self)
+
+
+def close_reader(conn: Connection):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+    with DbEngine.stats_lock:
+        DbEngine.readers_closed += 1
+
+
 class DbEngine:
     """
     The database engine instance.
+
+    In pooled mode (see `app.setup.sqlite.setup_sqlite`), every thread
+    keeps one long-lived read-only connection for queries, and all writes
+    go through a single writer connection, one transaction at a time.
+    Connections are opened once, so the PRAGMAs above run once per thread
+    instead of once per statement. A thread's read connection is closed
+    when the thread exits.
     """
 
     engine: Engine
+    read_engine: Engine | None = None
+    """
+    Opens the per-thread read-only connections. Only set in pooled mode.
+    """
+
+    local = threading.local()
+    write_lock = threading.RLock()
+    writer: Connection | None = None
+    write_depth: int = 0
+
+    stats_lock = threading.Lock()
+    readers_opened: int = 0
+    readers_closed: int = 0
+    reads: int = 0
+    writes: int = 0
+    write_wait: float = 0
+    max_write_wait: float = 0
 
     @classmethod
     @contextmanager
@@ -31,7 +83,22 @@ class DbEngine:
         When the context manager is entered, it returns a session object that can be used to execute SQL statements.
 
         If the `commit` parameter is set to `True`, the context manager will commit the transaction when it exits.
+        In pooled mode, contexts that don't commit get the thread's read-only connection,
+        and nested write contexts only commit when the outermost one exits.
         """
+        if cls.read_engine is None:
+            with cls.unpooled(commit) as conn:
+                yield conn
+        elif commit:
+            with cls.write_connection() as conn:
+                yield conn
+        else:
+            with cls.read_connection() as conn:
+                yield conn
+
+    @classmethod
+    @contextmanager
+    def unpooled(cls, commit: bool):
         conn = cls.engine.connect()
 
         try:
@@ -43,3 +110,104 @@ class DbEngine:
             raise e
         finally:
             conn.close()
+
+    @classmethod
+    @contextmanager
+    def read_connection(cls):
+        """
+        Yields the current thread's read-only connection, opening it on first use.
+        """
+        reader: ThreadReader | None = getattr(cls.local, "reader", None)
+
+        if reader is None or reader.conn.closed:
+            conn = cls.read_engine.connect()
+            conn.execution_options(preserve_rowcount=True)
+            reader = ThreadReader(conn)
+            cls.local.reader = reader
+
+            with cls.stats_lock:
+                cls.readers_opened += 1
+
+        with cls.stats_lock:
+            cls.reads += 1
+
+        reader.depth += 1
+
+        try:
+            yield reader.conn
+        finally:
+            reader.depth -= 1
+
+            # INFO: Ends the transaction SQLAlchemy began, so that the
+            # next query on this connection reads the latest commits.
+            if reader.depth == 0:
+                reader.conn.rollback()
+
+    @classmethod
+    @contextmanager
+    def write_connection(cls):
+        """
+        Yields the writer connection, waiting for other threads' writes to finish.
+
+        Nested write contexts on the same thread share the transaction, which
+        is committed (or rolled back on error) by the outermost context.
+        """
+        start = time.perf_counter()
+
+        with cls.write_lock:
+            waited = time.perf_counter() - start
+
+            with cls.stats_lock:
+                cls.writes += 1
+                cls.write_wait += waited
+                cls.max_write_wait = max(cls.max_write_wait, waited)
+
+            if cls.writer is None or cls.writer.closed:
+                cls.writer = cls.engine.connect()
+                cls.writer.execution_options(preserve_rowcount=True)
+
+            cls.write_depth += 1
+
+            try:
+                yield cls.writer
+
+                if cls.write_depth == 1:
+                    cls.writer.commit()
+            except Exception as e:
+                if cls.write_depth == 1:
+                    cls.writer.rollback()
+                raise e
+            finally:
+                cls.write_depth -= 1
+
+    @classmethod
+    def forget_connections(cls):
+        """
+        Drops the connections and locks inherited by a forked process, without
+        closing them, as the parent process is still using them. Any database
+        access from the child then opens its own connections.
+        """
+        for reader in list(ThreadReader.readers):
+            reader.finalizer.detach()
+
+        cls.local = threading.local()
+        cls.write_lock = threading.RLock()
+        cls.stats_lock = threading.Lock()
+        cls.writer = None
+        cls.write_depth = 0
+
+        for engine in (getattr(cls, "engine", None), cls.read_engine):
+            if engine is not None:
+                engine.dispose(close=False)
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            "pooled": cls.read_engine is not None,
+            "readers_opened": cls.readers_opened,
+            "readers_open": cls.readers_opened - cls.readers_closed,
+            "reads": cls.reads,
+            "writes": cls.writes,
+            "write_wait_ms": round(cls.write_wait * 1000, 2),
+            "max_write_wait_ms": round(cls.max_write_wait * 1000, 2),
+        }
@@ -1,7 +1,8 @@
+from app.config import get_config
 from app.db import Base
 from app.db.utils import tracks_to_dataclasses
 from app.db.engine import DbEngine
-from sqlalchemy import JSON, Integer, String, delete, select
+from sqlalchemy import JSON, Float, Integer, String, delete, insert, select
 from sqlalchemy.orm import Mapped, mapped_column
 
 
@@ -41,6 +42,37 @@ class TrackTable(Base):
             result = conn.execute(select(cls))
             return tracks_to_dataclasses(result.fetchall())
 
+    @classmethod
+    def get_all_in_batches(cls, batch_size: int = 5000):
+        """
+        Yields all tracks in batches of `batch_size`.
+
+        The rows are streamed from the database instead of being
+        fetched at once, and one config instance is used for all batches.
+        """
+        config = get_config()
+
+        with DbEngine.manager() as conn:
+            result = conn.execution_options(yield_per=batch_size).execute(
+                select(cls)
+            )
+
+            for rows in result.partitions():
+                yield tracks_to_dataclasses(rows, config)
+
+    @classmethod
+    def get_modification_info(cls):
+        """
+        Returns the filepath, folder, last_mod, trackhash and albumhash of all tracks.
+        """
+        with DbEngine.manager() as conn:
+            result = conn.execute(
+                select(
+                    cls.filepath, cls.folder, cls.last_mod, cls.trackhash, cls.albumhash
+                )
+            )
+            return result.fetchall()
+
     @classmethod
     def get_tracks_by_filepaths(cls, filepaths: list[str]):
         with DbEngine.manager() as conn:
@@ -65,3 +97,150 @@ class TrackTable(Base):
     def remove_tracks_by_filepaths(cls, filepaths: set[str]):
         with DbEngine.manager(commit=True) as conn:
             conn.execute(delete(TrackTable).where(TrackTable.filepath.in_(filepaths)))
+
+
+class ScanManifestTable(Base):
+    """
+    Holds the mtime and entry count of every scanned directory.
+
+    Used to skip listing directories that haven't changed since the last scan.
+    """
+
+    __tablename__ = "scanmanifest"
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    path: Mapped[str] = mapped_column(String(), index=True, unique=True)
+    mtime: Mapped[float] = mapped_column(Float())
+    entries: Mapped[int] = mapped_column(Integer())
+
+    @classmethod
+    def get_all(cls) -> dict[str, tuple[float, int]]:
+        with DbEngine.manager() as conn:
+            result = conn.execute(select(cls.path, cls.mtime, cls.entries))
+            return {path: (mtime, entries) for path, mtime, entries in result}
+
+    @classmethod
+    def update_dirs(
+        cls,
+        changed: dict[str, tuple[float, int]],
+        removed: set[str],
+        replace: bool = False,
+    ):
+        """
+        Saves the changed directories and drops the removed ones
+        in a single transaction. If `replace` is True, all existing
+        entries are dropped first.
+        """
+        to_remove = list(removed.union(changed.keys()))
+        items = [
+            {"path": path, "mtime": mtime, "entries": entries}
+            for path, (mtime, entries) in changed.items()
+        ]
+
+        # INFO: Chunked to stay under SQLite's bound parameter limit
+        chunk_size = 900
+
+        with DbEngine.manager(commit=True) as conn:
+            if replace:
+                conn.execute(delete(cls))
+            else:
+                for i in range(0, len(to_remove), chunk_size):
+                    chunk = to_remove[i : i + chunk_size]
+                    conn.execute(delete(cls).where(cls.path.in_(chunk)))
+
+            if items:
+                conn.execute(insert(cls), items)
+
+
+class TrackSilenceTable(Base):
+    """
+    Holds where the leading silence of each track ends and where
+    its trailing silence starts, in milliseconds.
+    """
+
+    __tablename__ = "tracksilence"
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    trackhash: Mapped[str] = mapped_column(String(), index=True, unique=True)
+    silence_start: Mapped[int] = mapped_column(Integer())
+    silence_end: Mapped[int] = mapped_column(Integer())
+
+    @classmethod
+    def get_by_hash(cls, trackhash: str) -> tuple[int, int] | None:
+        """
+        Returns the (silence_start, silence_end) of a track, if it's been analysed.
+        """
+        result = cls.execute(
+            select(cls.silence_start, cls.silence_end).where(
+                cls.trackhash == trackhash
+            )
+        )
+        row = result.fetchone()
+
+        if row is not None:
+            return row[0], row[1]
+
+    @classmethod
+    def insert_item(cls, trackhash: str, silence_start: int, silence_end: int):
+        """
+        Saves the silence of a track, replacing the existing entry.
+        """
+        cls.insert_items(
+            [
+                {
+                    "trackhash": trackhash,
+                    "silence_start": silence_start,
+                    "silence_end": silence_end,
+                }
+            ]
+        )
+
+    @classmethod
+    def insert_items(cls, items: list[dict[str, Any]]):
+        """
+        Saves the silence of multiple tracks, replacing the existing entries.
+        """
+        cls.upsert_many(
+            items,
+            index_elements=["trackhash"],
+            update=["silence_start", "silence_end"],
+        )
+
+
+class TrackLoudnessTable(Base):
+    """
+    Holds the EBU R128 integrated loudness (in LUFS) and
+    true peak (in dBTP) of each track.
+    """
+
+    __tablename__ = "trackloudness"
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    trackhash: Mapped[str] = mapped_column(String(), index=True, unique=True)
+    loudness: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
+    peak: Mapped[Optional[float]] = mapped_column(Float(), nullable=True)
+
+    @classmethod
+    def get_by_hash(cls, trackhash: str) -> tuple[float | None, float | None] | None:
+        """
+        Returns the (loudness, peak) of a track, if it's been analysed.
+        """
+        result = cls.execute(
+            select(cls.loudness, cls.peak).where(cls.trackhash == trackhash)
+        )
+        row = result.fetchone()
+
+        if row is not None:
+            return row[0], row[1]
+
+    @classmethod
+    def get_all_hashes(cls) -> set[str]:
+        result = cls.execute(select(cls.trackhash))
+        return {row[0] for row in result}
+
+    @classmethod
+    def insert_items(cls, items: list[dict[str, Any]]):
+        """
+        Saves the loudness of multiple tracks, replacing the existing entries.
+        """
+        cls.upsert_many(items, index_elements=["trackhash"], update=["loudness", "peak"])
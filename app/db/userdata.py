@@ -18,6 +18,7 @@ from sqlalchemy import (
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.engine import DbEngine
+from app.db.writequeue import WriteQueue
 from app.db.utils import (
     favorites_to_dataclass,
     playlist_to_dataclass,
@@ -199,20 +200,23 @@ class FavoritesTable(Base):
 
     @classmethod
     def insert_item(cls, item: dict[str, Any]):
+        """
+        Saves a favorite through the `WriteQueue`, returning once it is committed,
+        so that the next read sees it.
+        """
         item["timestamp"] = int(datetime.datetime.now().timestamp())
         item["userid"] = get_current_userid()
 
-        with DbEngine.manager(commit=True) as conn:
-            conn.execute(insert(cls).values(item))
+        WriteQueue.insert(cls, item).result()
 
     @classmethod
     def remove_item(cls, item: dict[str, Any]):
-        with DbEngine.manager(commit=True) as conn:
-            conn.execute(
-                delete(cls).where(
-                    (cls.hash == item["hash"]) & (cls.type == item["type"])
-                )
-            )
+        """
+        Removes a favorite through the `WriteQueue`, returning once it is committed.
+        """
+        WriteQueue.execute(
+            delete(cls).where((cls.hash == item["hash"]) & (cls.type == item["type"]))
+        ).result()
 
     @classmethod
     def check_exists(cls, hash: str, type: str):
@@ -290,8 +294,11 @@ class ScrobbleTable(Base):
 
     @classmethod
     def add(cls, item: dict[str, Any]):
+        """
+        Queues a scrobble to be saved. See `WriteQueue`.
+        """
         item["userid"] = get_current_userid()
-        return cls.insert_one(item)
+        return WriteQueue.insert(cls, item)
 
     @classmethod
     def get_all(cls, start: int, limit: int | None = None, userid: int | None = None):
@@ -305,6 +312,18 @@ class ScrobbleTable(Base):
 
         return tracklog_to_dataclasses(result.fetchall())
 
+    @classmethod
+    def get_all_keys(cls, userid: int | None = None) -> set[tuple[str, int]]:
+        """
+        Returns the (trackhash, timestamp) of all of a user's scrobbles.
+        """
+        result = cls.execute(
+            select(cls.trackhash, cls.timestamp).where(
+                cls.userid == (userid if userid else get_current_userid())
+            )
+        )
+        return {(trackhash, timestamp) for trackhash, timestamp in result}
+
     @classmethod
     def get_all_in_period(cls, start_time: int, end_time: int, userid: int | None):
         # UserId will be None if function is called from the API
@@ -476,6 +495,18 @@ class LibDataTable(Base):
         )
         return [{"itemhash": r[0], "color": r[1]} for r in result.fetchall()]
 
+    @classmethod
+    def upsert_colors(cls, colors: dict[str, str], type: str):
+        """
+        Saves the colors of many items in one transaction, as {itemhash: color}.
+        Existing entries keep their other fields.
+        """
+        items = [
+            {"itemhash": itemhash, "color": color, "itemtype": type}
+            for itemhash, color in colors.items()
+        ]
+        cls.upsert_many(items, index_elements=["itemhash"], update=["color"])
+
 
 class MixTable(Base):
     __tablename__ = "mix"
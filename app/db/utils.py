@@ -1,6 +1,6 @@
 from typing import Any
 
-from app.config import UserConfig
+from app.config import UserConfig, get_config
 from app.models import Album as AlbumModel, Artist as ArtistModel, Track as TrackModel
 from app.models.favorite import Favorite
 from app.models.lastfm import SimilarArtist
@@ -14,8 +14,16 @@ def track_to_dataclass(track: Any, config: UserConfig):
     return TrackModel(**track._asdict(), config=config)
 
 
-def tracks_to_dataclasses(tracks: Any):
-    return [track_to_dataclass(track, UserConfig()) for track in tracks]
+def tracks_to_dataclasses(tracks: Any, config: UserConfig | None = None):
+    """
+    Converts track rows to Track objects.
+
+    A single config instance is shared by the whole batch.
+    """
+    if config is None:
+        config = get_config()
+
+    return [track_to_dataclass(track, config) for track in tracks]
 
 
 def album_to_dataclass(album: Any):
@@ -0,0 +1,185 @@
+"""
+Queues small writes and commits them in groups on a single writer thread.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any
+
+from sqlalchemy import insert
+
+from app.config import get_config
+from app.db.engine import DbEngine
+from app.logger import log
+
+MAX_BATCH_SIZE = 500
+
+
+class QueuedWrite:
+    """
+    A write waiting on the queue. Rows with a `table` are inserted,
+    otherwise the `statement` is executed.
+    """
+
+    def __init__(self, table: Any = None, row: dict | None = None, statement=None):
+        self.table = table
+        self.row = row
+        self.statement = statement
+        self.future: Future[None] = Future()
+
+
+class WriteQueue:
+    """
+    Commits queued writes on a single thread. Writes that arrive within
+    `writeQueueInterval` ms of each other are committed in one transaction,
+    so concurrent requests don't each wait for the database write lock.
+
+    Writes are applied in the order they were queued. If a group fails,
+    its writes are retried one at a time, so that only the bad ones fail.
+
+    With `durableWrites` on, `insert` and `execute` only return once
+    the write is committed, and raise the error if it failed.
+    """
+
+    pending: queue.Queue[QueuedWrite] = queue.Queue()
+    worker: threading.Thread | None = None
+    lock = threading.Lock()
+
+    queued: int = 0
+    committed: int = 0
+    failed: int = 0
+    batches: int = 0
+
+    @classmethod
+    def insert(cls, table: Any, row: dict[str, Any]) -> Future[None]:
+        """
+        Queues a row to be inserted into the given table.
+        """
+        return cls.put(QueuedWrite(table=table, row=row))
+
+    @classmethod
+    def execute(cls, statement: Any) -> Future[None]:
+        """
+        Queues a statement (eg. an update or delete) to be executed.
+        """
+        return cls.put(QueuedWrite(statement=statement))
+
+    @classmethod
+    def put(cls, write: QueuedWrite):
+        with cls.lock:
+            cls.queued += 1
+
+            if cls.worker is None or not cls.worker.is_alive():
+                cls.worker = threading.Thread(target=cls.work, daemon=True)
+                cls.worker.start()
+
+        cls.pending.put(write)
+
+        if get_config().durableWrites:
+            write.future.result()
+
+        return write.future
+
+    @classmethod
+    def work(cls):
+        while True:
+            batch = [cls.pending.get()]
+            deadline = time.monotonic() + get_config().writeQueueInterval / 1000
+
+            while len(batch) < MAX_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                try:
+                    batch.append(cls.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            cls.commit(batch)
+
+            for _ in batch:
+                cls.pending.task_done()
+
+    @classmethod
+    def commit(cls, batch: list[QueuedWrite]):
+        """
+        Applies the writes in one transaction, then resolves their futures.
+        """
+        try:
+            with DbEngine.manager(commit=True) as conn:
+                for table, rows, statement in group_writes(batch):
+                    if table is not None:
+                        conn.execute(insert(table), rows)
+                    else:
+                        conn.execute(statement)
+        except Exception as e:
+            if len(batch) > 1:
+                for write in batch:
+                    cls.commit([write])
+
+                return
+
+            log.error("Queued database write failed: %s", e)
+            cls.failed += 1
+            batch[0].future.set_exception(e)
+            return
+
+        cls.batches += 1
+        cls.committed += len(batch)
+
+        for write in batch:
+            write.future.set_result(None)
+
+    @classmethod
+    def flush(cls):
+        """
+        Waits for all queued writes to be committed.
+        """
+        if cls.worker is not None and cls.worker.is_alive():
+            cls.pending.join()
+
+    @classmethod
+    def get_stats(cls):
+        return {
+            "queued": cls.pending.qsize(),
+            "committed": cls.committed,
+            "failed": cls.failed,
+            "batches": cls.batches,
+            "avg_batch_size": (
+                round(cls.committed / cls.batches, 2) if cls.batches else 0
+            ),
+        }
+
+
+atexit.register(WriteQueue.flush)
+
+
+def group_writes(batch: list[QueuedWrite]):
+    """
+    Yields (table, rows, statement) for the batch, with consecutive
+    inserts into the same table merged into one executemany.
+    """
+    table = None
+    rows: list[dict] = []
+
+    for write in batch:
+        if write.table is not None and write.table is table:
+            rows.append(write.row)
+            continue
+
+        if table is not None:
+            yield table, rows, None
+
+        if write.table is not None:
+            table, rows = write.table, [write.row]
+        else:
+            table, rows = None, []
+            yield None, None, write.statement
+
+    if table is not None:
+        yield table, rows, None
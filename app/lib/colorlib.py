@@ -2,9 +2,13 @@
 Contains everything that deals with image color extraction.
 """
 
+import colorsys
+from functools import partial
 from pathlib import Path
+from typing import Callable
 
-import colorgram
+import numpy as np
+from PIL import Image
 
 from app import settings
 
@@ -14,25 +18,43 @@ from app.lib.errors import PopulateCancelledError
 from app.store.albums import AlbumStore
 from app.store.artists import ArtistStore
 from app.utils.progressbar import tqdm
+from app.utils.threading import create_process_pool
 
 PROCESS_ALBUM_COLORS_KEY = ""
 PROCESS_ARTIST_COLORS_KEY = ""
 
+SAMPLE_SIZE = 64
+"""
+Images are downsampled to fit in this many pixels (per side) before counting colors.
+"""
+
 
 def get_image_colors(image: str, count=1) -> list[str]:
     """Extracts n number of the most dominant colors from an image."""
     try:
-        colors = sorted(colorgram.extract(image, count), key=lambda c: c.hsl.h)
+        with Image.open(image) as img:
+            img.draft("RGB", (SAMPLE_SIZE, SAMPLE_SIZE))
+            img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+            pixels = np.asarray(img.convert("RGB"), dtype=np.int64).reshape(-1, 3)
     except OSError:
         return []
 
-    formatted_colors = []
+    # INFO: Group the pixels into 8x8x8 RGB buckets. The dominant
+    # colors are the averages of the fullest buckets.
+    buckets = (pixels[:, 0] >> 5) << 6 | (pixels[:, 1] >> 5) << 3 | (pixels[:, 2] >> 5)
+    counts = np.bincount(buckets, minlength=512)
 
-    for color in colors:
-        color = f"rgb({color.rgb.r}, {color.rgb.g}, {color.rgb.b})"
-        formatted_colors.append(color)
+    top = np.argsort(-counts, kind="stable")[:count]
+    top = top[counts[top] > 0]
 
-    return formatted_colors
+    sums = np.stack(
+        [np.bincount(buckets, weights=pixels[:, i], minlength=512) for i in range(3)],
+        axis=1,
+    )
+    colors = np.rint(sums[top] / counts[top, None]).astype(int).tolist()
+    colors.sort(key=lambda c: colorsys.rgb_to_hls(*(v / 255 for v in c))[0])
+
+    return [f"rgb({r}, {g}, {b})" for r, g, b in colors]
 
 
 def process_color(item_hash: str, is_album=True):
@@ -49,45 +71,73 @@ def process_color(item_hash: str, is_album=True):
     return get_image_colors(str(path))
 
 
-class ProcessAlbumColors:
+def extract_colors(
+    itemhashes: list[str], is_album: bool, desc: str, is_current: Callable[[], bool]
+):
     """
-    Extracts the most dominant color from the album art and saves it to the database.
+    Extracts the dominant color of each item's image in a process pool.
+
+    Returns the colors found, as {itemhash: color}, and whether all items were
+    processed. Stops early once `is_current` returns False.
     """
+    colors: dict[str, str] = {}
 
-    def __init__(self, instance_key: str) -> None:
-        global PROCESS_ALBUM_COLORS_KEY
-        PROCESS_ALBUM_COLORS_KEY = instance_key
+    with create_process_pool() as executor:
+        results = executor.map(
+            partial(process_color, is_album=is_album), itemhashes, chunksize=64
+        )
+
+        for itemhash, result in tqdm(
+            zip(itemhashes, results), total=len(itemhashes), desc=desc
+        ):
+            if not is_current():
+                executor.shutdown(wait=False, cancel_futures=True)
+                return colors, False
 
-        albums = [a for a in AlbumStore.get_flat_list() if not a.color]
+            if result:
+                colors[itemhash] = result[0]
 
-        for album in tqdm(albums, desc="Processing missing album colors"):
-            albumhash = album.albumhash
-            if PROCESS_ALBUM_COLORS_KEY != instance_key:
-                raise PopulateCancelledError(
-                    "A newer 'ProcessAlbumColors' instance is running. Stopping this one."
-                )
+    return colors, True
 
-            albumrecord = LibDataTable.find_one(albumhash, type="album")
-            if albumrecord is not None and albumrecord.color is not None:
-                continue
 
-            colors = process_color(albumhash)
+class ProcessAlbumColors:
+    """
+    Extracts the most dominant color from the album art and saves it to the database.
+    """
 
-            if colors is None:
-                continue
+    def __init__(self, instance_key: str) -> None:
+        global PROCESS_ALBUM_COLORS_KEY
+        PROCESS_ALBUM_COLORS_KEY = instance_key
 
+        saved = {
+            c["itemhash"] for c in LibDataTable.get_all_colors("album") if c["color"]
+        }
+        albumhashes = [
+            a.albumhash
+            for a in AlbumStore.get_flat_list()
+            if not a.color and a.albumhash not in saved
+        ]
+
+        colors, completed = extract_colors(
+            albumhashes,
+            is_album=True,
+            desc="Processing missing album colors",
+            is_current=lambda: PROCESS_ALBUM_COLORS_KEY == instance_key,
+        )
+
+        for albumhash, color in colors.items():
             album = AlbumStore.albummap.get(albumhash)
 
             if album:
-                album.set_color(colors[0])
+                album.set_color(color)
+
+        # INFO: Write to the database.
+        LibDataTable.upsert_colors(colors, "album")
 
-            # INFO: Write to the database.
-            if albumrecord is None:
-                LibDataTable.insert_one(
-                    {"itemhash": albumhash, "color": colors[0], "itemtype": "album"}
-                )
-            else:
-                LibDataTable.update_one(albumhash, {"color": colors[0]})
+        if not completed:
+            raise PopulateCancelledError(
+                "A newer 'ProcessAlbumColors' instance is running. Stopping this one."
+            )
 
 
 class ProcessArtistColors:
@@ -96,43 +146,38 @@ class ProcessArtistColors:
     """
 
     def __init__(self, instance_key: str) -> None:
-        all_artists = [a for a in ArtistStore.get_flat_list() if not a.color]
-
         global PROCESS_ARTIST_COLORS_KEY
         PROCESS_ARTIST_COLORS_KEY = instance_key
 
-        for artist in tqdm(all_artists, desc="Processing missing artist colors"):
-            artisthash = artist.artisthash
-            if PROCESS_ARTIST_COLORS_KEY != instance_key:
-                raise PopulateCancelledError(
-                    "A newer 'ProcessArtistColors' instance is running. Stopping this one."
-                )
-
-            record = LibDataTable.find_one(artisthash, "artist")
-
-            if (record is not None) and (record.color is not None):
-                continue
-
-            colors = process_color(artisthash, is_album=False)
-
-            if colors is None:
-                continue
-
+        saved = {
+            c["itemhash"] for c in LibDataTable.get_all_colors("artist") if c["color"]
+        }
+        artisthashes = [
+            a.artisthash
+            for a in ArtistStore.get_flat_list()
+            if not a.color and "artist" + a.artisthash not in saved
+        ]
+
+        colors, completed = extract_colors(
+            artisthashes,
+            is_album=False,
+            desc="Processing missing artist colors",
+            is_current=lambda: PROCESS_ARTIST_COLORS_KEY == instance_key,
+        )
+
+        for artisthash, color in colors.items():
             artist = ArtistStore.artistmap.get(artisthash)
 
             if artist:
-                artist.set_color(colors[0])
-
-            # INFO: Write to the database.
-            print("RECORD")
-            print(record)
-            if record is None:
-                LibDataTable.insert_one(
-                    {
-                        "itemhash": "artist" + artisthash,
-                        "color": colors[0],
-                        "itemtype": "artist",
-                    }
-                )
-            else:
-                LibDataTable.update_one("artist" + artisthash, {"color": colors[0]})
+                artist.set_color(color)
+
+        # INFO: Write to the database. Artist entries are keyed as "artist" + artisthash.
+        LibDataTable.upsert_colors(
+            {"artist" + artisthash: color for artisthash, color in colors.items()},
+            "artist",
+        )
+
+        if not completed:
+            raise PopulateCancelledError(
+                "A newer 'ProcessArtistColors' instance is running. Stopping this one."
+            )
@@ -8,23 +8,16 @@ from app.lib.mapstuff import (
 )
 from app.lib.populate import CordinateMedia
 from app.lib.recipes.recents import RecentlyAdded
+from app.lib.storeloader import LoadStores
 from app.lib.tagger import IndexTracks
-from app.store.albums import AlbumStore
-from app.store.artists import ArtistStore
-from app.store.folder import FolderStore
-from app.store.tracks import TrackStore
 from app.utils.threading import background
 
 
 class IndexEverything:
-    def __init__(self) -> None:
-        IndexTracks(instance_key=time())
+    def __init__(self, full_scan: bool = False) -> None:
+        IndexTracks(instance_key=time(), full_scan=full_scan)
 
-        key = str(time())
-        TrackStore.load_all_tracks(key)
-        AlbumStore.load_albums(key)
-        ArtistStore.load_artists(key)
-        FolderStore.load_filepaths()
+        LoadStores(instance_key=str(time()))
 
         # NOTE: Rebuild recently added items on the homepage store
         RecentlyAdded()
@@ -41,5 +34,5 @@ class IndexEverything:
 
 
 @background
-def index_everything():
-    return IndexEverything()
+def index_everything(full_scan: bool = False):
+    return IndexEverything(full_scan=full_scan)
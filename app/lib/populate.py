@@ -9,16 +9,22 @@ from app import settings
 from app.lib.artistlib import CheckArtistImages
 from app.lib.colorlib import ProcessAlbumColors, ProcessArtistColors
 from app.lib.errors import PopulateCancelledError
-from app.lib.taglib import extract_thumb
+from app.lib.taglib import extract_album_thumb, get_thumbnail_sizes
+from app.lib.thumbcache import ThumbnailCache
+from app.lib.trackslib import analyse_track
 from app.logger import log
-from app.models import Album, Artist
+from app.models import Artist
 from app.models.lastfm import SimilarArtist
 from app.requests.artists import fetch_similar_artists
 from app.store.albums import AlbumStore
 from app.store.artists import ArtistStore
+from app.store.tracks import TrackStore
 from app.utils.network import has_connection
 from app.utils.progressbar import tqdm
+from app.utils.threading import create_process_pool, get_cpu_count
 
+from app.config import get_config
+from app.db.libdata import TrackLoudnessTable, TrackSilenceTable
 from app.db.userdata import SimilarArtistTable
 
 
@@ -68,34 +74,12 @@ class CordinateMedia:
                 log.warn(e)
                 return
 
-
-def get_image(_map: tuple[str, Album]):
-    """
-    The function retrieves an image from an album by iterating through its tracks and extracting the thumbnail from the first track that has one.
-
-    :param album: An instance of the `Album` class representing the album to retrieve the image from.
-    :type album: Album
-    :return: None
-    """
-
-    instance_key, album = _map
-
-    if POPULATE_KEY != instance_key:
-        raise PopulateCancelledError("'ProcessTrackThumbnails': Populate key changed")
-
-    matching_tracks = AlbumStore.get_album_tracks(album.albumhash)
-
-    for track in matching_tracks:
-        if extract_thumb(track.filepath, track.albumhash + ".webp"):
-            break
-
-
-def get_cpu_count():
-    """
-    Returns the number of CPUs on the machine.
-    """
-    cpu_count = os.cpu_count() or 0
-    return cpu_count // 2 if cpu_count > 2 else cpu_count
+        if get_config().analyseTracks:
+            try:
+                AnalyseTracks(instance_key)
+            except PopulateCancelledError as e:
+                log.warn(e)
+                return
 
 
 class ProcessTrackThumbnails:
@@ -106,37 +90,59 @@ class ProcessTrackThumbnails:
     def __init__(self, instance_key: str) -> None:
         """
         Filters out albums that already have thumbnails and
-        extracts the thumbnail for the other albums.
+        extracts the thumbnail for the other albums in a process pool.
         """
         path = settings.Paths.get_sm_thumb_path()
 
         # read all the files in the thumbnail directory
-        processed = "".join(os.listdir(path)).replace("webp", "")
+        processed = {os.path.splitext(name)[0] for name in os.listdir(path)}
 
         # filter out albums that already have thumbnails
-        albums = filter(
-            lambda album: album.albumhash not in processed, AlbumStore.get_flat_list()
-        )
-        albums = list(albums)
+        albums = [
+            album
+            for album in AlbumStore.get_flat_list()
+            if album.albumhash not in processed
+        ]
+
+        # INFO: Workers get the filepaths to try, as
+        # they don't share the stores with this process.
+        filepaths = [
+            [t.filepath for t in AlbumStore.get_album_tracks(album.albumhash)]
+            for album in albums
+        ]
+        webp_paths = [album.albumhash + ".webp" for album in albums]
+
+        with create_process_pool() as executor:
+            results = executor.map(
+                extract_album_thumb, filepaths, webp_paths, chunksize=16
+            )
 
-        # process the rest
-        key_album_map = ((instance_key, album) for album in albums)
+            for webp_path, extracted in tqdm(
+                zip(webp_paths, results),
+                total=len(albums),
+                desc="Extracting track images",
+            ):
+                # INFO: The workers' caches are their own, so the cached
+                # bytes and misses of new thumbnails are dropped here.
+                if extracted:
+                    ThumbnailCache.invalidate(
+                        *(path for path, _ in get_thumbnail_sizes(webp_path))
+                    )
+
+                if POPULATE_KEY != instance_key:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise PopulateCancelledError(
+                        "'ProcessTrackThumbnails': Populate key changed"
+                    )
 
-        with ThreadPoolExecutor(max_workers=get_cpu_count()) as executor:
-            results = list(
-                tqdm(
-                    executor.map(get_image, key_album_map),
-                    total=len(albums),
-                    desc="Extracting track images",
-                )
-            )
 
-            list(results)
+SIMILAR_ARTISTS_BATCH_SIZE = 50
 
 
 def save_similar_artists(_map: tuple[str, Artist]):
     """
-    Downloads and saves similar artists to the database.
+    Downloads the similar artists of an artist. The results are
+    saved to the database in batches by `FetchSimilarArtistsLastFM`.
     """
 
     instance_key, artist = _map
@@ -147,17 +153,13 @@ def save_similar_artists(_map: tuple[str, Artist]):
             "'FetchSimilarArtistsLastFM': Populate key changed"
         )
 
-    if SimilarArtistTable.exists(artist.artisthash):
-        return
-
     artists = fetch_similar_artists(artist.name)
 
     # INFO: Nones mean there was a connection error
     if artists is None:
-        return
+        return None
 
-    artist_ = SimilarArtist(artist.artisthash, artists)
-    SimilarArtistTable.insert_one(asdict(artist_))
+    return SimilarArtist(artist.artisthash, artists)
 
 
 class FetchSimilarArtistsLastFM:
@@ -167,30 +169,34 @@ class FetchSimilarArtistsLastFM:
 
     def __init__(self, instance_key: str) -> None:
         # read all artists from db
-        processed = SimilarArtistTable.get_all()
-        processed = ".".join(a.artisthash for a in processed)
+        processed = {a.artisthash for a in SimilarArtistTable.get_all()}
 
         # filter out artists that already have similar artists
-        artists = filter(
-            lambda a: a.artisthash not in processed, ArtistStore.get_flat_list()
-        )
-        artists = list(artists)
+        artists = [
+            a for a in ArtistStore.get_flat_list() if a.artisthash not in processed
+        ]
 
         # process the rest
         key_artist_map = ((instance_key, artist) for artist in artists)
+        batch: list[dict] = []
 
         with ThreadPoolExecutor(max_workers=get_cpu_count()) as executor:
             try:
                 print("Processing similar artists")
-                results = list(
-                    tqdm(
-                        executor.map(save_similar_artists, key_artist_map),
-                        total=len(artists),
-                        desc="Fetching similar artists",
-                    )
-                )
 
-                list(results)
+                for result in tqdm(
+                    executor.map(save_similar_artists, key_artist_map),
+                    total=len(artists),
+                    desc="Fetching similar artists",
+                ):
+                    if result is None:
+                        continue
+
+                    batch.append(asdict(result))
+
+                    if len(batch) >= SIMILAR_ARTISTS_BATCH_SIZE:
+                        SimilarArtistTable.upsert_many(batch)
+                        batch = []
 
             except PopulateCancelledError as e:
                 raise e
@@ -198,4 +204,86 @@ class FetchSimilarArtistsLastFM:
             # any exception that can be raised by the pool
             except Exception as e:
                 log.warn(e)
-                return
+
+            finally:
+                # INFO: Save what was fetched before a cancellation or error
+                SimilarArtistTable.upsert_many(batch)
+
+
+ANALYSIS_BATCH_SIZE = 200
+
+
+class AnalyseTracks:
+    """
+    Measures the leading and trailing silence and the EBU R128 loudness
+    and peak of every track in a process pool, and saves them by trackhash.
+
+    Tracks that have already been analysed are skipped, so an interrupted
+    pass picks up where it stopped.
+    """
+
+    def __init__(self, instance_key: str) -> None:
+        processed = TrackLoudnessTable.get_all_hashes()
+
+        # INFO: Tracks with the same trackhash are analysed once
+        tracks = [
+            group.get_best()
+            for trackhash, group in TrackStore.trackhashmap.items()
+            if trackhash not in processed and group.tracks
+        ]
+
+        filepaths = [t.filepath for t in tracks]
+        durations = [t.duration * 1000 if t.duration else None for t in tracks]
+        silence: list[dict] = []
+        loudness: list[dict] = []
+
+        def save():
+            if silence:
+                TrackSilenceTable.insert_items(silence)
+
+            if loudness:
+                TrackLoudnessTable.insert_items(loudness)
+
+            silence.clear()
+            loudness.clear()
+
+        with create_process_pool() as executor:
+            results = executor.map(analyse_track, filepaths, durations, chunksize=8)
+
+            for track, result in tqdm(
+                zip(tracks, results), total=len(tracks), desc="Analysing tracks"
+            ):
+                if POPULATE_KEY != instance_key:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    save()
+                    raise PopulateCancelledError(
+                        "'AnalyseTracks': Populate key changed"
+                    )
+
+                if result is None:
+                    continue
+
+                silence_start, silence_end, track_loudness, peak = result
+
+                # INFO: Left to `get_silence` to retry if the duration is unknown
+                if silence_end is not None:
+                    silence.append(
+                        {
+                            "trackhash": track.trackhash,
+                            "silence_start": silence_start,
+                            "silence_end": silence_end,
+                        }
+                    )
+
+                loudness.append(
+                    {
+                        "trackhash": track.trackhash,
+                        "loudness": track_loudness,
+                        "peak": peak,
+                    }
+                )
+
+                if len(loudness) >= ANALYSIS_BATCH_SIZE:
+                    save()
+
+        save()
@@ -0,0 +1,380 @@
+"""
+Pre-normalized search corpora built from the in-memory stores.
+
+Normalizing every title on every search query is slower than the fuzzy
+matching itself. The corpora here keep the normalized strings around and
+only rebuild when the store they are built from changes.
+
+For large libraries, a word prefix index narrows down the strings that are
+scored, so that search-as-you-type does not score every title on each key.
+"""
+
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+from unidecode import unidecode
+
+from app.config import get_config
+from app.store.albums import AlbumStore
+from app.store.artists import ArtistStore
+from app.store.tracks import TrackStore
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes a string for fuzzy matching.
+
+    Transliterates to ASCII, lowercases and strips non-alphanumeric characters.
+    """
+    return utils.default_process(unidecode(text or ""))
+
+
+PREFILTER_MIN_CORPUS = 5000
+"""
+Corpora smaller than this are always fully scanned.
+"""
+
+PREFIX_MIN_LENGTH = 2
+"""
+Query words shorter than this match too many words to be worth looking up.
+"""
+
+
+def get_lookup_words(query: str) -> frozenset[str]:
+    """
+    Returns the words of a normalized query that are long enough to look up.
+    """
+    return frozenset(w for w in query.split() if len(w) >= PREFIX_MIN_LENGTH)
+
+
+@dataclass
+class Candidates:
+    """
+    The positions a query was scored against after prefiltering,
+    and the choices list they point into.
+    """
+
+    words: frozenset[str]
+    positions: list[int]
+    choices: list[str]
+
+    def narrow(self, words: frozenset[str]) -> "Candidates | None":
+        """
+        Returns the candidates for a query whose words each extend one of
+        this query's words (eg. "beatl" after "beat"). Their strings are a
+        subset of these, so only these positions are checked.
+
+        Returns None if any of the words doesn't extend one of these.
+        """
+        if not all(any(w.startswith(u) for u in self.words) for w in words):
+            return None
+
+        prefixes = tuple(words)
+        positions = [
+            p
+            for p in self.positions
+            if any(token.startswith(prefixes) for token in self.choices[p].split())
+        ]
+
+        return Candidates(words, positions, self.choices)
+
+
+class TokenIndex:
+    """
+    An inverted index from the words in a corpus to the positions
+    of the strings that contain them.
+
+    The words are kept sorted so that a query word can be looked up as a
+    prefix, which is what search-as-you-type sends.
+    """
+
+    def __init__(self, choices: list[str]) -> None:
+        postings: dict[str, list[int]] = {}
+
+        for position, choice in enumerate(choices):
+            for token in set(choice.split()):
+                postings.setdefault(token, []).append(position)
+
+        self.choices = choices
+        self.postings = postings
+        self.tokens = sorted(postings)
+
+    def lookup(self, words: frozenset[str]) -> set[int]:
+        """
+        Returns the positions of the strings with a word starting with
+        any of the given words.
+        """
+        positions: set[int] = set()
+
+        for word in words:
+            index = bisect_left(self.tokens, word)
+
+            while index < len(self.tokens) and self.tokens[index].startswith(word):
+                positions.update(self.postings[self.tokens[index]])
+                index += 1
+
+        return positions
+
+
+class SearchCorpus:
+    """
+    Holds the items of a store and their normalized search strings.
+
+    The corpus is rebuilt on access when the store's generation has changed.
+    Normalized strings are memoized by their source text, so a rebuild only
+    normalizes strings that were not in the previous corpus.
+    """
+
+    def __init__(
+        self,
+        get_generation: Callable[[], Any],
+        get_items: Callable[[], list[Any]],
+        get_text: Callable[[Any], str],
+    ) -> None:
+        self.get_generation = get_generation
+        self.get_items = get_items
+        self.get_text = get_text
+
+        self.generation: Any = None
+        self.items: list[Any] = []
+        self.choices: list[str] = []
+        self.memo: dict[str, str] = {}
+        self.token_index: TokenIndex | None = None
+        self.lock = threading.Lock()
+
+    def get(self) -> tuple[list[Any], list[str]]:
+        """
+        Returns the items and their normalized strings, rebuilding them if stale.
+        """
+        generation = self.get_generation()
+
+        if generation != self.generation:
+            with self.lock:
+                if generation != self.generation:
+                    self.rebuild(generation)
+
+        return self.items, self.choices
+
+    def rebuild(self, generation: Any):
+        items = self.get_items()
+        choices: list[str] = []
+        memo: dict[str, str] = {}
+
+        for item in items:
+            text = self.get_text(item)
+            choice = self.memo.get(text)
+
+            if choice is None:
+                choice = normalize(text)
+
+            memo[text] = choice
+            choices.append(choice)
+
+        # INFO: Readers hold references to the old lists,
+        # so these are replaced, not mutated.
+        self.items, self.choices, self.memo = items, choices, memo
+        self.generation = generation
+
+    def get_token_index(self, choices: list[str]) -> TokenIndex:
+        """
+        Returns the token index for the given choices, building it if needed.
+
+        The index is built on first use, so corpora that are never
+        prefiltered don't pay for it.
+        """
+        index = self.token_index
+
+        if index is None or index.choices is not choices:
+            with self.lock:
+                index = self.token_index
+
+                if index is None or index.choices is not choices:
+                    index = TokenIndex(choices)
+                    self.token_index = index
+
+        return index
+
+    def search(
+        self,
+        query: str,
+        score_cutoff: float,
+        limit: int,
+        prefilter: bool | None = None,
+    ) -> list[Any]:
+        """
+        Returns the items that fuzzily match the query, best first.
+
+        :param prefilter: Overrides the `searchPrefilter` setting.
+        """
+        return self.find(query, score_cutoff, limit, prefilter)[0]
+
+    def find(
+        self,
+        query: str,
+        score_cutoff: float,
+        limit: int,
+        prefilter: bool | None = None,
+        reuse: Candidates | None = None,
+    ) -> tuple[list[Any], Candidates | None]:
+        """
+        Returns the items that fuzzily match the query, best first, and the
+        prefiltered candidates they were picked from. The candidates are None
+        if the whole corpus was scanned.
+
+        On large corpora, only the strings sharing a word prefix with the
+        query are scored. If that yields fewer than `searchPrefilterMinHits`
+        results (eg. the query has a typo), the whole corpus is scanned.
+
+        :param reuse: The candidates found for a shorter query this one was
+            typed on top of. They are narrowed down instead of looking up the
+            index, if each of this query's words extends one of theirs.
+        """
+        items, choices = self.get()
+        query = normalize(query)
+        config = get_config()
+
+        if prefilter is None:
+            prefilter = config.searchPrefilter
+
+        words = get_lookup_words(query)
+
+        if prefilter and words and len(choices) >= PREFILTER_MIN_CORPUS:
+            candidates = None
+
+            if reuse and reuse.choices is choices:
+                candidates = reuse if reuse.words == words else reuse.narrow(words)
+
+            if candidates is None:
+                # INFO: Sorted so that ties are broken the same way a full scan would.
+                positions = sorted(self.get_token_index(choices).lookup(words))
+                candidates = Candidates(words, positions, choices)
+
+            results = process.extract(
+                query,
+                {p: choices[p] for p in candidates.positions},
+                score_cutoff=score_cutoff,
+                limit=limit,
+                processor=None,
+            )
+
+            if len(results) >= min(limit, config.searchPrefilterMinHits):
+                return [items[r[2]] for r in results], candidates
+
+        results = process.extract(
+            query,
+            choices,
+            score_cutoff=score_cutoff,
+            limit=limit,
+            processor=None,
+        )
+
+        return [items[r[2]] for r in results], None
+
+
+class CombinedCorpus(SearchCorpus):
+    """
+    Joins several corpora into one, reusing their normalized strings.
+    """
+
+    def __init__(self, *corpora: SearchCorpus) -> None:
+        self.corpora = corpora
+        super().__init__(
+            get_generation=lambda: tuple(c.get_generation() for c in corpora),
+            get_items=lambda: [],
+            get_text=lambda item: "",
+        )
+        self.spans: list[tuple[int, int]] = []
+
+    def rebuild(self, generation: Any):
+        items: list[Any] = []
+        choices: list[str] = []
+        spans: list[tuple[int, int]] = []
+
+        for corpus in self.corpora:
+            _items, _choices = corpus.get()
+            spans.append((len(items), len(items) + len(_items)))
+            items.extend(_items)
+            choices.extend(_choices)
+
+        self.spans, self.items, self.choices = spans, items, choices
+        self.generation = generation
+
+    def search_each(
+        self,
+        query: str,
+        score_cutoff: float,
+        limits: list[int],
+        workers: int = -1,
+    ) -> tuple[Any | None, list[list[Any]]]:
+        """
+        Scores the query against all the corpora in one `process.cdist` call
+        spread over `workers` threads (-1 uses all cores).
+
+        Returns the best match overall and the best matches of each corpus,
+        limited by the corresponding entry in `limits`.
+        """
+        items, choices = self.get()
+        spans = self.spans
+
+        if not choices:
+            return None, [[] for _ in spans]
+
+        # INFO: cdist splits the work across workers by row, so the
+        # choices are the rows and the query is the only column.
+        scores = process.cdist(
+            choices,
+            [normalize(query)],
+            scorer=fuzz.WRatio,
+            processor=None,
+            score_cutoff=score_cutoff,
+            workers=workers,
+        )[:, 0]
+
+        # INFO: Scores below the cutoff are set to 0.
+        # `argmax` returns the first of any ties, like `process.extract` does.
+        best = int(np.argmax(scores))
+        top = items[best] if scores[best] > 0 else None
+
+        results: list[list[Any]] = []
+
+        for (start, end), limit in zip(spans, limits):
+            row = scores[start:end]
+            hits = np.flatnonzero(row)
+            hits = hits[np.argsort(-row[hits], kind="stable")][:limit]
+            results.append([items[start + i] for i in hits])
+
+        return top, results
+
+
+class SearchIndex:
+    """
+    The search corpora for tracks, albums, artists and all three combined.
+    """
+
+    tracks = SearchCorpus(
+        lambda: TrackStore.generation,
+        TrackStore.get_flat_list,
+        lambda track: track.og_title,
+    )
+    albums = SearchCorpus(
+        lambda: AlbumStore.generation,
+        AlbumStore.get_flat_list,
+        lambda album: album.og_title,
+    )
+    artists = SearchCorpus(
+        lambda: ArtistStore.generation,
+        ArtistStore.get_flat_list,
+        lambda artist: artist.name,
+    )
+    top = CombinedCorpus(artists, tracks, albums)
+
+    @classmethod
+    def refresh(cls):
+        """
+        Rebuilds any stale corpora ahead of the first search.
+        """
+        cls.top.get()
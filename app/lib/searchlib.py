@@ -2,13 +2,14 @@
 This library contains all the functions related to the search functionality.
 """
 
-from typing import Any, Generator, List, TypeVar
+from functools import cached_property
+from typing import List, TypeVar
 
 from rapidfuzz import process, utils
-from unidecode import unidecode
 
 from app import models
-from app.config import UserConfig
+from app.config import get_config
+from app.lib.searchindex import Candidates, SearchIndex
 
 # from app.db.libdata import AlbumTable, ArtistTable, TrackTable
 
@@ -21,7 +22,6 @@ from app.serializers.artist import serialize_for_cards
 from app.serializers.track import serialize_track, serialize_tracks
 
 from app.store.albums import AlbumStore
-from app.store.artists import ArtistStore
 from app.store.tracks import TrackStore
 
 from app.utils.remove_duplicates import remove_duplicates
@@ -53,71 +53,76 @@ class Limit:
 
 
 class SearchTracks:
-    def __init__(self, query: str) -> None:
+    def __init__(self, query: str, reuse: Candidates | None = None) -> None:
         self.query = query
-        self.tracks = TrackStore.get_flat_list()
+        self.reuse = reuse
+        self.candidates: Candidates | None = None
 
     def __call__(self) -> List[models.Track]:
         """
         Gets all songs with a given title.
         """
-
-        track_titles = [unidecode(track.og_title).lower() for track in self.tracks]
-        results = process.extract(
+        tracks, self.candidates = SearchIndex.tracks.find(
             self.query,
-            track_titles,
             score_cutoff=Cutoff.tracks,
             limit=Limit.tracks,
-            processor=utils.default_process,
+            reuse=self.reuse,
         )
-
-        tracks = [self.tracks[i[2]] for i in results]
         return remove_duplicates(tracks)
 
 
 class SearchArtists:
-    def __init__(self, query: str) -> None:
+    def __init__(self, query: str, reuse: Candidates | None = None) -> None:
         self.query = query
-        self.artists = ArtistStore.get_flat_list()
+        self.reuse = reuse
+        self.candidates: Candidates | None = None
 
-    def __call__(self):
+    def __call__(self) -> List[models.Artist]:
         """
         Gets all artists with a given name.
         """
-        artists = [unidecode(a.name).lower() for a in self.artists]
-
-        results = process.extract(
+        artists, self.candidates = SearchIndex.artists.find(
             self.query,
-            artists,
             score_cutoff=Cutoff.artists,
             limit=Limit.artists,
-            processor=utils.default_process,
+            reuse=self.reuse,
         )
-
-        return [self.artists[i[2]] for i in results]
+        return artists
 
 
 class SearchAlbums:
-    def __init__(self, query: str) -> None:
+    def __init__(self, query: str, reuse: Candidates | None = None) -> None:
         self.query = query
-        self.albums = AlbumStore.get_flat_list()
+        self.reuse = reuse
+        self.candidates: Candidates | None = None
 
     def __call__(self) -> List[models.Album]:
         """
         Gets all albums with a given title.
         """
-
-        albums = [unidecode(a.og_title).lower() for a in self.albums]
-
-        results = process.extract(
+        albums, self.candidates = SearchIndex.albums.find(
             self.query,
-            albums,
             score_cutoff=Cutoff.albums,
             limit=Limit.albums,
-            processor=utils.default_process,
+            reuse=self.reuse,
         )
+        return albums
 
-        return [self.albums[i[2]] for i in results]
+
+class SearchTop:
+    def __init__(self, query: str, reuse: Candidates | None = None) -> None:
+        self.query = query
+        self.reuse = reuse
+        self.candidates: Candidates | None = None
+
+    def __call__(self) -> List[models.Track | models.Album | models.Artist]:
+        """
+        Gets the best match across all artists, tracks and albums.
+        """
+        results, self.candidates = SearchIndex.top.find(
+            self.query, score_cutoff=Cutoff.tracks, limit=1, reuse=self.reuse
+        )
+        return results
 
 
 class SearchPlaylists:
@@ -143,18 +148,75 @@ _S2 = TypeVar("_S2")
 _ResultType = int | float
 
 
-def get_titles(items: list[_type]):
-    for item in items:
-        if isinstance(item, models.Track):
-            text = item.og_title
-        elif isinstance(item, models.Album):
-            text = item.title
-        elif isinstance(item, models.Artist):
-            text = item.name
-        else:
-            text = None
+class SearchMatches:
+    """
+    The matches of a query across artists, tracks and albums.
 
-        yield text
+    Each type is searched when it is first accessed. When `searchVectorized`
+    is set, all the types are scored at once in a single `process.cdist`
+    call that runs on `searchWorkers` threads.
+    """
+
+    finders = {
+        "top": SearchTop,
+        "tracks": SearchTracks,
+        "albums": SearchAlbums,
+        "artists": SearchArtists,
+    }
+
+    def __init__(self, query: str) -> None:
+        self.query = query
+
+        if get_config().searchVectorized:
+            # INFO: Pre-fills the cached properties below
+            results = self.find_all()
+            self.__dict__.update(
+                top=results["top"][0] if results["top"] else None,
+                tracks=results["tracks"],
+                albums=results["albums"],
+                artists=results["artists"],
+            )
+
+    def find(self, itemtype: str) -> list:
+        """
+        Searches a single item type.
+        """
+        return self.finders[itemtype](self.query)()
+
+    def find_all(self) -> dict[str, list]:
+        """
+        Searches all the item types in one vectorized call.
+        """
+        top, (artists, tracks, albums) = SearchIndex.top.search_each(
+            self.query,
+            score_cutoff=Cutoff.tracks,
+            limits=[Limit.artists, Limit.tracks, Limit.albums],
+            workers=get_config().searchWorkers,
+        )
+
+        return {
+            "top": [top] if top is not None else [],
+            "tracks": remove_duplicates(tracks),
+            "albums": albums,
+            "artists": artists,
+        }
+
+    @cached_property
+    def top(self) -> _type | None:
+        results = self.find("top")
+        return results[0] if results else None
+
+    @cached_property
+    def tracks(self) -> list[models.Track]:
+        return self.find("tracks")
+
+    @cached_property
+    def albums(self) -> list[models.Album]:
+        return self.find("albums")
+
+    @cached_property
+    def artists(self) -> list[models.Artist]:
+        return self.find("artists")
 
 
 class TopResults:
@@ -164,24 +226,11 @@ class TopResults:
     """
 
     @staticmethod
-    def collect_all():
-        all_items: list[_type] = []
-
-        all_items.extend(ArtistStore.get_flat_list())
-        all_items.extend(TrackStore.get_flat_list())
-        all_items.extend(TrackStore.get_flat_list())
-
-        return all_items, get_titles(all_items)
-
-    @staticmethod
-    def get_results(items: Generator[str, Any, None], query: str):
-        items = list(items)
-
-        results = process.extract(
-            query=query, choices=items, score_cutoff=Cutoff.tracks, limit=1
-        )
-
-        return results
+    def get_results(query: str) -> list[_type]:
+        """
+        Returns the best match across all artists, tracks and albums.
+        """
+        return SearchTop(query)()
 
     @staticmethod
     def map_with_type(item: _type):
@@ -201,7 +250,7 @@ class TopResults:
                 item.duration = 0
 
             item.check_type(
-                tracks, singleTrackAsSingle=UserConfig().showAlbumsAsSingles
+                tracks, singleTrackAsSingle=get_config().showAlbumsAsSingles
             )
 
             return {"type": "album", "item": item}
@@ -220,11 +269,11 @@ class TopResults:
             return {"type": "artist", "item": item}
 
     @staticmethod
-    def get_track_items(item: dict[str, _type], query: str, limit=5):
+    def get_track_items(item: dict[str, _type], matches: SearchMatches, limit=5):
         tracks: list[Track] = []
 
         if item["type"] == "track":
-            tracks.extend(SearchTracks(query)())
+            tracks.extend(matches.tracks)
 
         if item["type"] == "album":
             t = TrackStore.get_tracks_by_albumhash(item["item"].albumhash)
@@ -233,7 +282,7 @@ class TopResults:
             # if there are less than the limit, get more tracks
             if len(t) < limit:
                 remainder = limit - len(t)
-                more_tracks = SearchTracks(query)()
+                more_tracks = matches.tracks
                 t.extend(more_tracks[:remainder])
 
             tracks.extend(t)
@@ -245,7 +294,7 @@ class TopResults:
             # if there are less than the limit, get more tracks
             if len(t) < limit:
                 remainder = limit - len(t)
-                more_tracks = SearchTracks(query)()
+                more_tracks = matches.tracks
                 t.extend(more_tracks[:remainder])
 
             tracks.extend(t)
@@ -253,12 +302,12 @@ class TopResults:
         return tracks[:limit]
 
     @staticmethod
-    def get_album_items(item: dict[str, _type], query: str, limit=6):
+    def get_album_items(item: dict[str, _type], matches: SearchMatches, limit=6):
         if item["type"] == "track":
-            return SearchAlbums(query)()[:limit]
+            return matches.albums[:limit]
 
         if item["type"] == "album":
-            return SearchAlbums(query)()[:limit]
+            return matches.albums[:limit]
 
         if item["type"] == "artist":
             # albums = AlbumStore.get_albums_by_artisthash(item["item"].artisthash)
@@ -267,7 +316,7 @@ class TopResults:
             # if there are less than the limit, get more albums
             if len(albums) < limit:
                 remainder = limit - len(albums)
-                more_albums = SearchAlbums(query)()
+                more_albums = matches.albums
                 albums.extend(more_albums[:remainder])
 
             return albums[:limit]
@@ -278,18 +327,19 @@ class TopResults:
         limit: int = None,
         albums_only=False,
         tracks_only=False,
+        matches: SearchMatches | None = None,
     ):
-        items, titles = TopResults.collect_all()
-        results = TopResults.get_results(titles, query)
+        if matches is None:
+            matches = SearchMatches(query)
 
         tracks_limit = Limit.tracks if tracks_only else 4
         albums_limit = Limit.albums if albums_only else limit
         artists_limit = limit
 
         # map results to their respective items
-        try:
-            result = [items[i[2]] for i in results][0]
-        except IndexError:
+        result = matches.top
+
+        if result is None:
             if tracks_only:
                 return []
 
@@ -305,19 +355,19 @@ class TopResults:
 
         result = TopResults.map_with_type(result)
 
-        top_tracks = TopResults.get_track_items(result, query, limit=tracks_limit)
+        top_tracks = TopResults.get_track_items(result, matches, limit=tracks_limit)
         top_tracks = serialize_tracks(top_tracks)
 
         if tracks_only:
             return top_tracks
 
-        albums = TopResults.get_album_items(result, query, limit=albums_limit)
+        albums = TopResults.get_album_items(result, matches, limit=albums_limit)
         albums = serialize_albums(albums)
 
         if albums_only:
             return albums
 
-        artists = SearchArtists(query)()[:artists_limit]
+        artists = matches.artists[:artists_limit]
         artists = serialize_for_cards(artists)
 
         if result["type"] == "track":
@@ -0,0 +1,96 @@
+"""
+Loads the indexed library from the database into the in-memory stores.
+"""
+
+from time import time
+
+from app.db.libdata import TrackTable
+from app.lib.searchindex import SearchIndex
+from app.lib.tagger import AlbumBuilder, ArtistBuilder
+from app.logger import log
+from app.store.albums import AlbumStore
+from app.store.artists import ArtistStore
+from app.store.folder import FolderStore
+from app.store.tracks import TrackStore
+
+LOAD_KEY = ""
+
+
+class LoadStores:
+    """
+    Builds the track, folder, album and artist stores from a single
+    streamed scan of the track table.
+
+    The tracks are read in batches and fed into the track and folder stores
+    as they arrive. The albums and artists are then aggregated together in a
+    single pass over the best track of each trackhash group, instead of each
+    store re-reading and re-deduplicating the whole library.
+
+    An instance key is used to stop this loader when a newer one is started.
+    """
+
+    def __init__(self, instance_key: str, batch_size: int = 5000) -> None:
+        global LOAD_KEY
+        LOAD_KEY = instance_key
+
+        self.instance_key = instance_key
+        self.timings: dict[str, float] = {}
+
+        if not self.load_tracks(batch_size):
+            log.warning("'LoadStores': Load key changed. Stopping this instance.")
+            return
+
+        self.load_albums_and_artists()
+
+        start = time()
+        SearchIndex.refresh()
+        self.timings["search index"] = time() - start
+
+        total = sum(self.timings.values())
+        summary = ", ".join(f"{k}: {v:.2f}s" for k, v in self.timings.items())
+        log.info("Loaded library in %.2fs (%s)", total, summary)
+
+    def is_cancelled(self):
+        return LOAD_KEY != self.instance_key
+
+    def load_tracks(self, batch_size: int):
+        """
+        Streams the track table into the track and folder stores.
+
+        Returns False if the load was cancelled.
+        """
+        start = time()
+        TrackStore.clear()
+        FolderStore.clear()
+
+        for tracks in TrackTable.get_all_in_batches(batch_size):
+            if self.is_cancelled():
+                return False
+
+            TrackStore.add_tracks(tracks)
+            FolderStore.add_tracks(tracks)
+
+        self.timings["tracks"] = time() - start
+        return True
+
+    def load_albums_and_artists(self):
+        """
+        Aggregates the albums and artists from the loaded tracks.
+        """
+        start = time()
+        albums = AlbumBuilder()
+        artists = ArtistBuilder()
+
+        # INFO: The best track in each group is the one `remove_duplicates`
+        # would have kept, so this doubles as the deduplication step.
+        for group in TrackStore.trackhashmap.values():
+            track = group.get_best()
+            albums.add(track)
+            artists.add(track)
+
+        self.timings["aggregation"] = time() - start
+
+        start = time()
+        AlbumStore.load_albums(self.instance_key, albums=albums.build())
+        ArtistStore.load_artists(self.instance_key, artists=artists.build())
+        self.timings["albums & artists"] = time() - start
@@ -1,7 +1,12 @@
 import os
+from functools import partial
+from typing import Any
+
+from sqlalchemy.exc import SQLAlchemyError
+
 from app import settings
-from app.config import UserConfig
-from app.db.libdata import TrackTable
+from app.config import get_config
+from app.db.libdata import ScanManifestTable, TrackTable
 
 from app.lib.taglib import extract_thumb, get_tags
 from app.models.album import Album
@@ -10,28 +15,38 @@ from app.models.track import Track
 from app.store.folder import FolderStore
 from app.store.tracks import TrackStore
 from app.utils import flatten
-from app.utils.filesystem import run_fast_scandir
+from app.utils.filesystem import normalize_dirpath, scan_changed_dirs
 from app.utils.parsers import get_base_album_title
 from app.utils.progressbar import tqdm
+from app.utils.threading import create_process_pool, map_in_batches
 
 from app.logger import log
 from app.utils.remove_duplicates import remove_duplicates
 
 POPULATE_KEY: float = 0
+INSERT_BATCH_SIZE = 1000
+"""
+The number of tracks written to the database in a single transaction.
+"""
 
 
 class IndexTracks:
-    def __init__(self, instance_key: float) -> None:
+    def __init__(self, instance_key: float, full_scan: bool = False) -> None:
         """
         Indexes all tracks in the database.
 
         An instance key is used to prevent multiple instances of the
         same class from running at the same time.
+
+        By default, only directories that have changed since the last scan
+        (according to the scan manifest) are listed and only the files in
+        them are checked for changes. Set `full_scan` to crawl and check
+        everything, eg. to pick up files that were retagged in place.
         """
         global POPULATE_KEY
         POPULATE_KEY = instance_key
 
-        dirs_to_scan = UserConfig().rootDirs
+        dirs_to_scan = get_config().rootDirs
 
         if len(dirs_to_scan) == 0:
             log.warning(
@@ -48,17 +63,28 @@ class IndexTracks:
         except IndexError:
             pass
 
-        files = set()
+        manifest = dict() if full_scan else ScanManifestTable.get_all()
+        files, changed_dirs, seen_dirs = scan_changed_dirs(dirs_to_scan, manifest)
+        removed_dirs = set(manifest.keys()) - seen_dirs
 
-        for _dir in dirs_to_scan:
-            files = files.union(run_fast_scandir(_dir, full=True)[1])
+        folders = None
 
-        unmodified, modified_tracks = self.filter_modded()
+        if not full_scan:
+            folders = {
+                normalize_dirpath(d) for d in removed_dirs.union(changed_dirs.keys())
+            }
+
+        unmodified, modified_tracks = self.filter_modded(folders)
         untagged = files - unmodified
 
         self.tag_untagged(untagged, instance_key)
         self.extract_thumb_with_overwrite(modified_tracks)
 
+        # INFO: Only save the manifest if this scan was not cancelled,
+        # so that an interrupted scan is retried next time.
+        if POPULATE_KEY == instance_key:
+            ScanManifestTable.update_dirs(changed_dirs, removed_dirs, replace=full_scan)
+
     @staticmethod
     def extract_thumb_with_overwrite(tracks: list[dict[str, str]]):
         """
@@ -75,11 +101,14 @@ class IndexTracks:
                 continue
 
     @staticmethod
-    def filter_modded():
+    def filter_modded(folders: set[str] | None = None):
         """
         Removes tracks from the database that have been modified
         since they were indexed.
 
+        If `folders` is given, only tracks in those folders are checked
+        and the rest are treated as unmodified.
+
         Returns a tuple of unmodified paths and modified tracks.
         Unmodified paths are indexed and the modified tracks are
 
@@ -90,7 +119,13 @@ class IndexTracks:
 
         to_remove = set()
 
-        for track in TrackTable.get_all():
+        # INFO: Only the columns needed to check for changes are read,
+        # so that no Track objects are created here.
+        for track in TrackTable.get_modification_info():
+            if folders is not None and normalize_dirpath(track.folder) not in folders:
+                unmodified_paths.add(track.filepath)
+                continue
+
             try:
                 if track.last_mod == round(os.path.getmtime(track.filepath)):
                     unmodified_paths.add(track.filepath)
@@ -103,6 +138,7 @@ class IndexTracks:
                 {
                     "filepath": track.filepath,
                     "trackhash": track.trackhash,
+                    "albumhash": track.albumhash,
                 }
             )
 
@@ -121,49 +157,77 @@ class IndexTracks:
         tracks = TrackTable.get_all()
 
     def tag_untagged(self, files: set[str], key: float):
-        config = UserConfig()
-        for file in tqdm(files, desc="Reading files"):
-            if POPULATE_KEY != key:
-                log.warning("'Populate.tag_untagged': Populate key changed")
-                return
+        """
+        Reads the tags of the given files in a process pool and
+        writes them to the database in batches from this thread.
+        """
+        read_tags = partial(get_tags, config=get_config())
+        batch: list[dict[str, Any]] = []
 
-            tags = get_tags(file, config=config)
+        with create_process_pool() as executor:
+            results = map_in_batches(executor, read_tags, files)
 
-            if tags is not None:
-                TrackTable.insert_one(tags)
-                FolderStore.filepaths.add(tags["filepath"])
+            for tags in tqdm(results, total=len(files), desc="Reading files"):
+                if POPULATE_KEY != key:
+                    log.warning("'Populate.tag_untagged': Populate key changed")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.insert_tracks(batch)
+                    return
 
-            del tags
+                if tags is not None:
+                    batch.append(tags)
+
+                if len(batch) >= INSERT_BATCH_SIZE:
+                    self.insert_tracks(batch)
+                    batch = []
+
+        self.insert_tracks(batch)
 
         print(f"{len(files)} new files indexed")
         print("Done")
 
+    @staticmethod
+    def insert_tracks(tracks: list[dict[str, Any]]):
+        """
+        Writes a batch of tracks to the database in one transaction.
 
-def create_albums(_trackhashes: list[str] = []) -> list[tuple[Album, set[str]]]:
-    """
-    Creates album objects using the indexed tracks. Takes in an optional
-    list of trackhashes to create the albums from. If no list is provided,
-    all tracks are used.
+        If the batch fails, the tracks are retried one at a time
+        so that a single bad file doesn't drop the whole batch.
+        """
+        if len(tracks) == 0:
+            return
 
-    The trackhashes are passed when creating albums from the watchdogg module.
+        try:
+            TrackTable.insert_many(tracks)
+            FolderStore.filepaths.update(t["filepath"] for t in tracks)
+            return
+        except SQLAlchemyError as e:
+            log.warning("Batch insert failed, retrying one by one: %s", e)
 
-    Returns a list of tuples containing the album and the trackhashes in the album.
-    ie:
+        for track in tracks:
+            try:
+                TrackTable.insert_one(track)
+                FolderStore.filepaths.add(track["filepath"])
+            except SQLAlchemyError as e:
+                log.warning("Failed to index %s: %s", track["filepath"], e)
 
-    >>> list[tuple[Album, set[str]]]
+
+class AlbumBuilder:
     """
-    albums = dict()
+    Aggregates tracks into album objects one track at a time.
 
-    if _trackhashes:
-        all_tracks: list[Track] = TrackStore.get_tracks_by_trackhashes(_trackhashes)
-    else:
-        all_tracks: list[Track] = TrackStore.get_flat_list()
+    Tracks passed to `add` should already be deduplicated by trackhash.
+    """
 
-    all_tracks = remove_duplicates(all_tracks)
+    def __init__(self) -> None:
+        self.albums: dict[str, dict[str, Any]] = dict()
 
-    for track in all_tracks:
-        if track.albumhash not in albums:
-            albums[track.albumhash] = {
+    def add(self, track: Track):
+        """
+        Adds a track's data to the album it belongs to.
+        """
+        if track.albumhash not in self.albums:
+            self.albums[track.albumhash] = {
                 "albumartists": track.albumartists,
                 "artisthashes": [a["artisthash"] for a in track.albumartists],
                 "albumhash": track.albumhash,
@@ -183,7 +247,7 @@ def create_albums(_trackhashes: list[str] = []) -> list[tuple[Album, set[str]]]:
                 "extra": {},
             }
         else:
-            album = albums[track.albumhash]
+            album = self.albums[track.albumhash]
             album["tracks"].add(track.trackhash)
             album["playcount"] += track.playcount
             album["playduration"] += track.playduration
@@ -195,50 +259,46 @@ def create_albums(_trackhashes: list[str] = []) -> list[tuple[Album, set[str]]]:
             if track.genres:
                 album["genres"].extend(track.genres)
 
-    for album in albums.values():
-        genres = []
-        for genre in album["genres"]:
-            if genre not in genres:
-                genres.append(genre)
+    def build(self) -> list[tuple[Album, set[str]]]:
+        """
+        Creates the album objects from the aggregated data.
+        """
+        albums: list[tuple[Album, set[str]]] = []
 
-        album["genres"] = genres
-        album["genrehashes"] = " ".join([g["genrehash"] for g in genres])
-        album["base_title"], _ = get_base_album_title(album["og_title"])
+        for album in self.albums.values():
+            genres = []
+            for genre in album["genres"]:
+                if genre not in genres:
+                    genres.append(genre)
 
-        del genres
-        trackhashes = album.pop("tracks")
-        album["trackcount"] = len(trackhashes)
+            album["genres"] = genres
+            album["genrehashes"] = " ".join([g["genrehash"] for g in genres])
+            album["base_title"], _ = get_base_album_title(album["og_title"])
 
-        albums[album["albumhash"]] = (Album(**album), trackhashes)
+            del genres
+            trackhashes = album.pop("tracks")
+            album["trackcount"] = len(trackhashes)
 
-    return list(albums.values())
+            albums.append((Album(**album), trackhashes))
 
+        self.albums = dict()
+        return albums
 
-def create_artists(
-    artisthashes: list[str] = [],
-) -> list[tuple[Artist, set[str], set[str]]]:
-    """
-    Creates artist objects using the indexed tracks. Takes in an optional
-    list of artisthashes to create the artists from. If no list is provided,
-    all tracks are used.
 
-    Returns a list of tuples containing the artist, the trackhashes for the artist
-    and the albumhashes for the artist.
-    ie:
+class ArtistBuilder:
+    """
+    Aggregates tracks into artist objects one track at a time.
 
-    >>> list[tuple[Artist, set[str], set[str]]]
+    Tracks passed to `add` should already be deduplicated by trackhash.
     """
-    if artisthashes:
-        all_tracks: list[Track] = flatten(
-            [TrackStore.get_tracks_by_artisthash(hash) for hash in artisthashes]
-        )
-    else:
-        all_tracks: list[Track] = TrackStore.get_flat_list()
 
-    all_tracks = remove_duplicates(all_tracks)
-    artists = dict()
+    def __init__(self) -> None:
+        self.artists: dict[str, dict[str, Any]] = dict()
 
-    for track in all_tracks:
+    def add(self, track: Track):
+        """
+        Adds a track's data to each of its artists and albumartists.
+        """
         this_artists = [*track.artists]
 
         for a in track.albumartists:
@@ -247,15 +307,15 @@ def create_artists(
                 this_artists.append(a)
 
         for thisartist in this_artists:
-            if thisartist["artisthash"] not in artists:
-                artists[thisartist["artisthash"]] = {
+            if thisartist["artisthash"] not in self.artists:
+                self.artists[thisartist["artisthash"]] = {
                     "albumcount": None,
                     "albums": {track.albumhash},
                     "artisthash": thisartist["artisthash"],
                     "created_date": track.last_mod,
                     "date": track.date,
                     "duration": track.duration,
-                    "genres": track.genres if track.genres else [],
+                    "genres": [*track.genres] if track.genres else [],
                     "name": None,
                     "names": {thisartist["name"]},
                     "lastplayed": track.lastplayed,
@@ -268,7 +328,7 @@ def create_artists(
                     "extra": {},
                 }
             else:
-                artist: dict = artists[thisartist["artisthash"]]
+                artist: dict = self.artists[thisartist["artisthash"]]
                 artist["duration"] += track.duration
                 artist["playcount"] += track.playcount
                 artist["playduration"] += track.playduration
@@ -278,37 +338,97 @@ def create_artists(
                 artist["created_date"] = min(artist["created_date"], track.last_mod)
                 artist["names"].add(thisartist["name"])
 
-                artist.setdefault("albums", set())
-
                 if thisartist.get("in_track", True):
                     artist["tracks"].add(track.trackhash)
 
                 if track.genres:
                     artist["genres"].extend(track.genres)
 
-    for artist in artists.values():
-        artist["albumcount"] = len(artist["albums"])
-        artist["trackcount"] = len(artist["tracks"])
+    def build(self) -> list[tuple[Artist, set[str], set[str]]]:
+        """
+        Creates the artist objects from the aggregated data.
+        """
+        artists: list[tuple[Artist, set[str], set[str]]] = []
+
+        for artist in self.artists.values():
+            artist["albumcount"] = len(artist["albums"])
+            artist["trackcount"] = len(artist["tracks"])
+
+            genres = []
+
+            for genre in artist["genres"]:
+                if genre not in genres:
+                    genres.append(genre)
+
+            artist["genres"] = genres
+            artist["genrehashes"] = " ".join([g["genrehash"] for g in genres])
+            artist["name"] = sorted(artist["names"])[0]
+
+            # INFO: Delete temporary keys
+            del artist["names"]
+
+            tracks = artist.pop("tracks")
+            albums = artist.pop("albums")
+
+            # INFO: Delete local variables
+            del genres
 
-        genres = []
+            artists.append((Artist(**artist), tracks, albums))
 
-        for genre in artist["genres"]:
-            if genre not in genres:
-                genres.append(genre)
+        self.artists = dict()
+        return artists
 
-        artist["genres"] = genres
-        artist["genrehashes"] = " ".join([g["genrehash"] for g in genres])
-        artist["name"] = sorted(artist["names"])[0]
 
-        # INFO: Delete temporary keys
-        del artist["names"]
+def create_albums(_trackhashes: list[str] = []) -> list[tuple[Album, set[str]]]:
+    """
+    Creates album objects using the indexed tracks. Takes in an optional
+    list of trackhashes to create the albums from. If no list is provided,
+    all tracks are used.
+
+    The trackhashes are passed when creating albums from the watchdogg module.
 
-        tracks = artist.pop("tracks")
-        albums = artist.pop("albums")
+    Returns a list of tuples containing the album and the trackhashes in the album.
+    ie:
+
+    >>> list[tuple[Album, set[str]]]
+    """
+    if _trackhashes:
+        all_tracks: list[Track] = TrackStore.get_tracks_by_trackhashes(_trackhashes)
+    else:
+        all_tracks: list[Track] = TrackStore.get_flat_list()
+
+    builder = AlbumBuilder()
+
+    for track in remove_duplicates(all_tracks):
+        builder.add(track)
+
+    return builder.build()
+
+
+def create_artists(
+    artisthashes: list[str] = [],
+) -> list[tuple[Artist, set[str], set[str]]]:
+    """
+    Creates artist objects using the indexed tracks. Takes in an optional
+    list of artisthashes to create the artists from. If no list is provided,
+    all tracks are used.
+
+    Returns a list of tuples containing the artist, the trackhashes for the artist
+    and the albumhashes for the artist.
+    ie:
+
+    >>> list[tuple[Artist, set[str], set[str]]]
+    """
+    if artisthashes:
+        all_tracks: list[Track] = flatten(
+            [TrackStore.get_tracks_by_artisthash(hash) for hash in artisthashes]
+        )
+    else:
+        all_tracks: list[Track] = TrackStore.get_flat_list()
 
-        # INFO: Delete local variables
-        del genres
+    builder = ArtistBuilder()
 
-        artists[artist["artisthash"]] = (Artist(**artist), tracks, albums)
+    for track in remove_duplicates(all_tracks):
+        builder.add(track)
 
-    return list(artists.values())
+    return builder.build()
@@ -13,6 +13,7 @@ from PIL import Image, UnidentifiedImageError
 from tinytag import TinyTag
 
 from app.config import UserConfig
+from app.lib.thumbcache import ThumbnailCache
 from app.settings import Defaults, Paths
 from app.utils.hashing import create_hash
 from app.utils.parsers import split_artists
@@ -31,29 +32,58 @@ def parse_album_art(filepath: str):
         return None
 
 
+def create_thumbnails(img: Image.Image, images: list[tuple[str, int]]):
+    """
+    Saves the image as a webp thumbnail for each (path, width).
+
+    The image is decoded once, at a reduced scale where possible, and each
+    thumbnail is resized from the next larger one instead of the source.
+    """
+    images = sorted(images, key=lambda i: i[1], reverse=True)
+    largest = images[0][1]
+
+    if img.format == "JPEG":
+        # INFO: Lets the JPEG decoder scale down by up to 8x while decoding
+        img.draft("RGB", (largest, largest))
+
+    factor = img.width // largest
+
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    ratio = img.width / img.height
+
+    for path, width in images:
+        img = img.resize((width, max(int(width / ratio), 1)), Image.LANCZOS)
+        img.save(path, "webp")
+
+
+def get_thumbnail_sizes(webp_path: str) -> list[tuple[str, int]]:
+    """
+    Returns the (path, width) of each size of a thumbnail.
+    """
+    return [
+        (os.path.join(Paths.get_lg_thumb_path(), webp_path), Defaults.LG_THUMB_SIZE),
+        (os.path.join(Paths.get_sm_thumb_path(), webp_path), Defaults.SM_THUMB_SIZE),
+        (os.path.join(Paths.get_xsm_thumb_path(), webp_path), Defaults.XSM_THUMB_SIZE),
+        (os.path.join(Paths.get_md_thumb_path(), webp_path), Defaults.MD_THUMB_SIZE),
+    ]
+
+
 def extract_thumb(filepath: str, webp_path: str, overwrite=False) -> bool:
     """
     Extracts the thumbnail from an audio file.
     Returns the path to the thumbnail.
+
+    NOTE: The thumbnail cache is only invalidated in the calling process.
+    When run in a process pool, invalidate it in the parent instead.
     """
-    lg_img_path = os.path.join(Paths.get_lg_thumb_path(), webp_path)
-    sm_img_path = os.path.join(Paths.get_sm_thumb_path(), webp_path)
-    xms_img_path = os.path.join(Paths.get_xsm_thumb_path(), webp_path)
-    md_img_path = os.path.join(Paths.get_md_thumb_path(), webp_path)
-
-    images = [
-        (lg_img_path, Defaults.LG_THUMB_SIZE),
-        (sm_img_path, Defaults.SM_THUMB_SIZE),
-        (xms_img_path, Defaults.XSM_THUMB_SIZE),
-        (md_img_path, Defaults.MD_THUMB_SIZE),
-    ]
+    images = get_thumbnail_sizes(webp_path)
+    sm_img_path = images[1][0]
 
     def save_image(img: Image.Image):
-        width, height = img.size
-        ratio = width / height
-
-        for path, size in images:
-            img.resize((size, int(size / ratio)), Image.ANTIALIAS).save(path, "webp")
+        create_thumbnails(img, images)
+        ThumbnailCache.invalidate(*(path for path, _ in images))
 
     if not overwrite and os.path.exists(sm_img_path):
         img_size = os.path.getsize(sm_img_path)
@@ -73,7 +103,7 @@ def extract_thumb(filepath: str, webp_path: str, overwrite=False) -> bool:
             save_image(img)
         except OSError:
             try:
-                png = img.convert("RGB")
+                png = Image.open(BytesIO(album_art)).convert("RGB")
                 save_image(png)
             except:  # pylint: disable=bare-except
                 return False
@@ -82,6 +112,18 @@ def extract_thumb(filepath: str, webp_path: str, overwrite=False) -> bool:
     return False
 
 
+def extract_album_thumb(filepaths: list[str], webp_path: str) -> bool:
+    """
+    Extracts the thumbnail from the first of the given files that has one.
+    Returns whether the thumbnail exists.
+    """
+    for filepath in filepaths:
+        if extract_thumb(filepath, webp_path):
+            return True
+
+    return False
+
+
 def parse_date(date_str: str) -> int | None:
     """
     Extracts the date from a string and returns a timestamp.
@@ -0,0 +1,220 @@
+"""
+An in-memory cache of thumbnail files.
+"""
+
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+from app.config import get_config
+
+
+@dataclass(slots=True)
+class ThumbnailEntry:
+    data: bytes
+    mtime: float
+    mtime_ns: int
+
+
+class ThumbnailCache:
+    """
+    Holds the bytes of recently served thumbnails, keyed by path (ie. one entry
+    per thumbnail size and hash), so that hot thumbnails are served without
+    touching the file system.
+
+    Once the cached bytes grow past `thumbnailCacheSize` MB, the least
+    recently used thumbnails are dropped. Rewritten thumbnails should be
+    invalidated with `invalidate`.
+    """
+
+    MAX_ENTRY_SIZE = 1024 * 512  # 0.5MB
+
+    # {'path': ThumbnailEntry}, least recently used first
+    entries: OrderedDict[str, ThumbnailEntry] = OrderedDict()
+    size: int = 0
+    lock = threading.Lock()
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @staticmethod
+    def get_budget():
+        return get_config().thumbnailCacheSize * 1024 * 1024
+
+    @classmethod
+    def get(cls, path: str) -> ThumbnailEntry | None:
+        """
+        Returns a cached thumbnail, or None on a miss.
+        """
+        path = os.path.normpath(path)
+
+        with cls.lock:
+            entry = cls.entries.get(path)
+
+            if entry is None:
+                cls.misses += 1
+                return None
+
+            cls.entries.move_to_end(path)
+            cls.hits += 1
+            return entry
+
+    @classmethod
+    def load(cls, path: str, info: os.stat_result | None = None):
+        """
+        Reads a thumbnail into the cache. Returns None if the file doesn't
+        exist, is too large to cache, or caching is disabled.
+        """
+        budget = cls.get_budget()
+        path = os.path.normpath(path)
+
+        try:
+            if info is None:
+                info = os.stat(path)
+
+            if not stat.S_ISREG(info.st_mode):
+                return None
+
+            if info.st_size > min(cls.MAX_ENTRY_SIZE, budget):
+                return None
+
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        entry = ThumbnailEntry(data, info.st_mtime, info.st_mtime_ns)
+
+        with cls.lock:
+            cls.size += len(data) - cls.pop(path)
+            cls.entries[path] = entry
+
+            while cls.size > budget and cls.entries:
+                _, evicted = cls.entries.popitem(last=False)
+                cls.size -= len(evicted.data)
+                cls.evictions += 1
+
+        return entry
+
+    @classmethod
+    def pop(cls, path: str) -> int:
+        """
+        Removes an entry and returns its size. Should be called with the lock held.
+        """
+        entry = cls.entries.pop(path, None)
+        return len(entry.data) if entry is not None else 0
+
+    @classmethod
+    def invalidate(cls, *paths: str):
+        """
+        Drops the cached bytes of thumbnails that have been rewritten,
+        and the misses recorded for them.
+        """
+        with cls.lock:
+            for path in paths:
+                cls.size -= cls.pop(os.path.normpath(path))
+
+        MissCache.discard(*(os.path.basename(path) for path in paths))
+
+    @classmethod
+    def prewarm(cls, paths: Iterable[str]):
+        """
+        Reads the given thumbnails into the cache, in order, until it's full.
+        """
+        budget = cls.get_budget()
+
+        for path in paths:
+            if cls.size >= budget:
+                break
+
+            cls.load(path)
+
+    @classmethod
+    def get_stats(cls):
+        lookups = cls.hits + cls.misses
+
+        return {
+            "entries": len(cls.entries),
+            "size": cls.size,
+            "budget": cls.get_budget(),
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "evictions": cls.evictions,
+            "hit_ratio": round(cls.hits / lookups, 4) if lookups else 0,
+        }
+
+
+class MissCache:
+    """
+    Remembers the image requests that ended in a fallback, so that repeat
+    requests skip the file system lookups and the folder scan.
+
+    Entries expire after a while, and are dropped when a thumbnail with
+    the same filename is written.
+    """
+
+    TTL = 60  # in seconds
+    MAX_SIZE = 10_000
+
+    # {'filename': {(folder, pathhash): expiry}}
+    entries: dict[str, dict[tuple[str, str], float]] = {}
+    size: int = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def has(cls, key: tuple[str, str, str]):
+        folder, filename, pathhash = key
+        expiry = cls.entries.get(filename, {}).get((folder, pathhash))
+
+        if expiry is None:
+            return False
+
+        if expiry < time.monotonic():
+            with cls.lock:
+                misses = cls.entries.get(filename, {})
+
+                if misses.pop((folder, pathhash), None) is not None:
+                    cls.size -= 1
+
+                if not misses:
+                    cls.entries.pop(filename, None)
+
+            return False
+
+        return True
+
+    @classmethod
+    def add(cls, key: tuple[str, str, str]):
+        folder, filename, pathhash = key
+
+        with cls.lock:
+            if cls.size >= cls.MAX_SIZE:
+                cls.entries.clear()
+                cls.size = 0
+
+            misses = cls.entries.setdefault(filename, {})
+
+            if (folder, pathhash) not in misses:
+                cls.size += 1
+
+            misses[(folder, pathhash)] = time.monotonic() + cls.TTL
+
+    @classmethod
+    def discard(cls, *filenames: str):
+        """
+        Drops the misses recorded for the given filenames (eg. `albumhash.webp`).
+        """
+        with cls.lock:
+            for filename in filenames:
+                cls.size -= len(cls.entries.pop(filename, {}))
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.entries.clear()
+            cls.size = 0
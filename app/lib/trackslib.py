@@ -3,46 +3,227 @@ This library contains all the functions related to tracks.
 """
 
 import os
+import re
+import subprocess
 
-from app.lib.pydub.pydub import AudioSegment
-from app.lib.pydub.pydub.silence import detect_leading_silence, detect_silence
+import numpy as np
+
+from app.db.libdata import TrackLoudnessTable, TrackSilenceTable
+from app.store.tracks import TrackStore
 from app.utils.threading import ThreadWithReturnValue
 
+SILENCE_THRESHOLD = -40.0  # in dBFS
+SILENCE_WINDOW = 30  # seconds decoded at each end of a track
+CHUNK_SIZE = 10  # in ms
+SAMPLE_RATE = 16000
+REPLAYGAIN_REFERENCE = -18.0  # in LUFS
+
+DURATION_PATTERN = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+LOUDNESS_PATTERN = re.compile(r"I:\s+(-?inf|-?\d+(?:\.\d+)?) LUFS")
+PEAK_PATTERN = re.compile(r"Peak:\s+(-?inf|-?\d+(?:\.\d+)?) dBFS")
+
+
+def decode_window(filepath: str, from_end: bool = False):
+    """
+    Decodes the first (or last) `SILENCE_WINDOW` seconds of a file to mono PCM.
+
+    Only the window is decoded, instead of the whole file. Returns the samples
+    and the file's duration in ms as reported by ffmpeg (None if unknown).
+    """
+    command = ["ffmpeg", "-hide_banner", "-nostdin"]
+
+    if from_end:
+        command.extend(["-sseof", f"-{SILENCE_WINDOW}"])
+
+    command += [
+        "-i",
+        filepath,
+        "-t",
+        str(SILENCE_WINDOW),
+        "-vn",
+        "-ac",
+        "1",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-f",
+        "s16le",
+        "pipe:1",
+    ]
+
+    result = subprocess.run(command, capture_output=True)
+    samples = np.frombuffer(result.stdout, dtype=np.int16)
+
+    duration = None
+    match = DURATION_PATTERN.search(result.stderr.decode(errors="ignore"))
+
+    if match is not None:
+        hours, minutes, seconds = match.groups()
+        duration = int((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000)
+
+    return samples, duration
+
+
+def get_chunk_loudness(samples: np.ndarray):
+    """
+    Returns the loudness of each `CHUNK_SIZE` ms chunk, in dBFS.
+    """
+    chunk_length = SAMPLE_RATE * CHUNK_SIZE // 1000
+    count = len(samples) // chunk_length
+
+    chunks = samples[: count * chunk_length].reshape(count, chunk_length)
+    rms = np.sqrt(np.mean(chunks.astype(np.float64) ** 2, axis=1))
+
+    with np.errstate(divide="ignore"):
+        return 20 * np.log10(rms / 32768)
+
 
 def get_leading_silence_end(filepath: str):
     """
     Returns the leading silence of a track.
     """
-    format = filepath.split(".")[-1]
-    audio = AudioSegment.from_file(filepath, format=format)
-    silence = detect_leading_silence(audio, silence_threshold=-40.0, chunk_size=10)
+    samples, _ = decode_window(filepath)
+    is_loud = get_chunk_loudness(samples) >= SILENCE_THRESHOLD
+
+    chunks = int(np.argmax(is_loud)) if is_loud.any() else len(is_loud)
+    silence = chunks * CHUNK_SIZE
 
     return silence if silence > 1000 else 0
 
 
-def get_trailing_silence_start(filepath: str):
+def get_trailing_silence_start(filepath: str, duration: int | None = None):
     """
     Returns the trailing silence of a track.
+
+    :param duration: The track's duration in ms, used if ffmpeg doesn't report one.
+
+    Returns None if the duration is unknown.
     """
-    format = filepath.split(".")[-1]
-    audio = AudioSegment.from_file(filepath, format=format)
-    duration = len(audio)
+    samples, reported_duration = decode_window(filepath, from_end=True)
+    duration = reported_duration or duration
 
-    audio = audio[-30000:] if len(audio) > 30000 else audio
-    silence_groups = detect_silence(audio, silence_thresh=-40.0, seek_step=10)
+    if duration is None:
+        # INFO: The samples only give the duration if the whole file fit in the window
+        if len(samples) >= SILENCE_WINDOW * SAMPLE_RATE:
+            return None
 
-    if len(silence_groups) == 0:
-        return duration
+        duration = len(samples) * 1000 // SAMPLE_RATE
 
-    silence_group = silence_groups[-1]
-    is_ok = silence_group[1] == len(audio)
+    is_loud = get_chunk_loudness(samples) >= SILENCE_THRESHOLD
+    chunks = int(np.argmax(is_loud[::-1])) if is_loud.any() else len(is_loud)
+    silence = chunks * CHUNK_SIZE
 
-    if is_ok:
-        return duration - (silence_group[1] - silence_group[0])
+    if silence >= 1000:
+        return duration - silence
 
     return duration
 
 
+def get_loudness(filepath: str):
+    """
+    Returns the EBU R128 integrated loudness (in LUFS) and true peak (in dBTP)
+    of a file. Either is None if ffmpeg couldn't measure it.
+
+    Decodes the whole file, so it's meant for background analysis.
+    """
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostdin",
+        "-i",
+        filepath,
+        "-vn",
+        "-af",
+        "ebur128=peak=true",
+        "-f",
+        "null",
+        "-",
+    ]
+
+    result = subprocess.run(command, capture_output=True)
+    output = result.stderr.decode(errors="ignore")
+
+    def parse_last(pattern: re.Pattern):
+        # INFO: The per-frame log also has "I:" values. The summary comes last.
+        matches = pattern.findall(output)
+
+        if not matches or "inf" in matches[-1]:
+            return None
+
+        return float(matches[-1])
+
+    return parse_last(LOUDNESS_PATTERN), parse_last(PEAK_PATTERN)
+
+
+def analyse_track(filepath: str, duration: int | None = None):
+    """
+    Returns the silence and loudness of a file, as
+    (silence_start, silence_end, loudness, peak).
+    silence_end is None if the duration is unknown.
+
+    Returns None if the file can't be analysed. Meant to
+    be run in a process pool.
+
+    :param duration: The track's duration in ms. See `get_trailing_silence_start`.
+    """
+    try:
+        return (
+            get_leading_silence_end(filepath),
+            get_trailing_silence_start(filepath, duration),
+            *get_loudness(filepath),
+        )
+    except Exception:
+        return None
+
+
+def get_silence(filepath: str):
+    """
+    Returns where the leading silence of a track ends
+    and where its trailing silence starts.
+
+    Stored by trackhash, so each track is only analysed once. Where the
+    trailing silence starts is None, and nothing is stored, if the
+    track's duration is unknown.
+    """
+    tracks = TrackStore.get_tracks_by_filepaths([filepath])
+    trackhash = tracks[0].trackhash if tracks else None
+    duration = tracks[0].duration * 1000 if tracks and tracks[0].duration else None
+
+    if trackhash is not None:
+        silence = TrackSilenceTable.get_by_hash(trackhash)
+
+        if silence is not None:
+            return silence
+
+    silence = (
+        get_leading_silence_end(filepath),
+        get_trailing_silence_start(filepath, duration),
+    )
+
+    if trackhash is not None and silence[1] is not None:
+        TrackSilenceTable.insert_item(trackhash, *silence)
+
+    return silence
+
+
+def get_track_analysis(trackhash: str):
+    """
+    Returns the stored silence and loudness of a track.
+    Values are None if the track hasn't been analysed.
+    """
+    silence = TrackSilenceTable.get_by_hash(trackhash) or (None, None)
+    loudness, peak = TrackLoudnessTable.get_by_hash(trackhash) or (None, None)
+
+    return {
+        "silence_start": silence[0],
+        "silence_end": silence[1],
+        "loudness": loudness,
+        "peak": peak,
+        "replaygain": (
+            round(REPLAYGAIN_REFERENCE - loudness, 2) if loudness is not None else None
+        ),
+    }
+
+
 def get_silence_paddings(ending_file: str, starting_file: str):
     """
     Returns the ending silence of a track and the starting silence of the next.
@@ -52,21 +233,19 @@ def get_silence_paddings(ending_file: str, starting_file: str):
     starting_thread = None
 
     if os.path.exists(ending_file):
-        ending_thread = ThreadWithReturnValue(
-            target=get_trailing_silence_start, args=(ending_file,)
-        )
+        ending_thread = ThreadWithReturnValue(target=get_silence, args=(ending_file,))
         ending_thread.start()
 
     if os.path.exists(starting_file):
         starting_thread = ThreadWithReturnValue(
-            target=get_leading_silence_end, args=(starting_file,)
+            target=get_silence, args=(starting_file,)
         )
         starting_thread.start()
 
     if ending_thread:
-        silence["ending_file"] = ending_thread.join()
+        silence["ending_file"] = ending_thread.join()[1]
 
     if starting_thread:
-        silence["starting_file"] = starting_thread.join()
+        silence["starting_file"] = starting_thread.join()[0]
 
     return silence
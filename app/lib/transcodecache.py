@@ -0,0 +1,248 @@
+"""
+An on-disk cache of transcoded audio files.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import IO
+
+from app.config import get_config
+from app.logger import log
+from app.settings import Paths
+
+PARTIAL_MARKER = ".part"
+"""
+Inserted before the extension of partial files. ffmpeg picks
+the output format from the extension, so it has to stay last.
+"""
+
+
+def is_partial(filename: str):
+    return os.path.splitext(filename)[0].endswith(PARTIAL_MARKER)
+
+
+class TranscodeCache:
+    """
+    Holds transcoded files on disk, keyed by the source track, bitrate,
+    container and the source file's mtime. Replacing or re-tagging a source
+    file changes its mtime, so the stale transcode is never served.
+
+    Once the cache grows past `transcodeCacheSize` MB, the least recently
+    used files are deleted. Hits update a file's access time, so the LRU
+    order is rebuilt from the files themselves after a restart.
+
+    Transcodes are written to a partial file (eg. `key.part.mp3`) that is
+    renamed into the cache when the transcode completes.
+    """
+
+    # {'filename': size}, least recently used first
+    entries: OrderedDict[str, int] = OrderedDict()
+    size: int = 0
+    loaded: bool = False
+    lock = threading.RLock()
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @staticmethod
+    def get_key(trackhash: str, filepath: str, bitrate: str, container: str):
+        """
+        Returns the cache filename for a transcode of the given file.
+        """
+        mtime = os.stat(filepath).st_mtime_ns
+        return f"{trackhash}-{bitrate}-{mtime:x}.{container}"
+
+    @classmethod
+    def get_segment_key(
+        cls,
+        trackhash: str,
+        filepath: str,
+        bitrate: str,
+        container: str,
+        length: int,
+        index: int | str,
+    ):
+        """
+        Returns the cache filename for one segment of a segmented transcode.
+        """
+        key = cls.get_key(trackhash, filepath, bitrate, container)
+        base, ext = os.path.splitext(key)
+        return f"{base}-{length}s{index}{ext}"
+
+    @staticmethod
+    def get_path(key: str):
+        return os.path.join(Paths.get_transcode_cache_path(), key)
+
+    @classmethod
+    def get_partial_path(cls, key: str):
+        base, ext = os.path.splitext(key)
+        return cls.get_path(base + PARTIAL_MARKER + ext)
+
+    @staticmethod
+    def get_budget():
+        return get_config().transcodeCacheSize * 1024 * 1024
+
+    @classmethod
+    def load(cls, remove_partials: bool = False):
+        """
+        Indexes the files in the cache directory, least recently used first.
+
+        :param remove_partials: Whether to delete the partial files left
+            behind by interrupted transcodes. Only safe at startup.
+        """
+        with cls.lock:
+            path = Paths.get_transcode_cache_path()
+            os.makedirs(path, exist_ok=True)
+            files: list[tuple[float, str, int]] = []
+
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+
+                    if is_partial(entry.name):
+                        if remove_partials:
+                            cls.remove_file(entry.path)
+
+                        continue
+
+                    stat = entry.stat()
+                    files.append((stat.st_atime, entry.name, stat.st_size))
+
+            files.sort()
+            cls.entries = OrderedDict((name, size) for _, name, size in files)
+            cls.size = sum(size for *_, size in files)
+            cls.loaded = True
+            cls.evict()
+
+    @classmethod
+    def ensure_loaded(cls):
+        if not cls.loaded:
+            cls.load()
+
+    @classmethod
+    def get(cls, key: str) -> str | None:
+        """
+        Returns the path to a cached transcode, or None on a miss.
+        """
+        with cls.lock:
+            cls.ensure_loaded()
+
+            if key not in cls.entries:
+                cls.misses += 1
+                return None
+
+            path = cls.get_path(key)
+
+            if not os.path.exists(path):
+                cls.size -= cls.entries.pop(key)
+                cls.misses += 1
+                return None
+
+            cls.entries.move_to_end(key)
+            cls.hits += 1
+
+        # INFO: Only the access time is updated. The mtime
+        # is used for the ETag of the cached file.
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+        return path
+
+    @classmethod
+    def open(cls, key: str) -> IO[bytes] | None:
+        """
+        Opens a cached transcode, or returns None on a miss.
+
+        The file is opened with the lock held, so that `evict` can't delete it
+        between the lookup and the open. Once open, it can be read to the end
+        even if it's evicted.
+        """
+        with cls.lock:
+            path = cls.get(key)
+
+            if path is None:
+                return None
+
+            try:
+                return open(path, "rb")
+            except OSError:
+                cls.size -= cls.entries.pop(key, 0)
+                return None
+
+    @classmethod
+    def contains(cls, key: str) -> bool:
+        """
+        Checks whether a transcode is cached, without counting a hit or miss.
+        """
+        with cls.lock:
+            cls.ensure_loaded()
+            return key in cls.entries
+
+    @classmethod
+    def add(cls, key: str):
+        """
+        Moves a completed transcode from its partial file into the cache.
+        """
+        partial = cls.get_partial_path(key)
+
+        with cls.lock:
+            cls.ensure_loaded()
+
+            try:
+                os.replace(partial, cls.get_path(key))
+                size = os.path.getsize(cls.get_path(key))
+            except OSError as e:
+                log.error("Failed to cache transcode %s: %s", key, e)
+                return
+
+            cls.size += size - cls.entries.pop(key, 0)
+            cls.entries[key] = size
+            cls.evict()
+
+    @classmethod
+    def discard_partial(cls, key: str):
+        """
+        Deletes the partial file of a failed or cancelled transcode.
+        """
+        cls.remove_file(cls.get_partial_path(key))
+
+    @classmethod
+    def evict(cls):
+        """
+        Deletes the least recently used files until the cache fits its budget.
+        """
+        budget = cls.get_budget()
+
+        with cls.lock:
+            while cls.size > budget and cls.entries:
+                key, size = cls.entries.popitem(last=False)
+                cls.remove_file(cls.get_path(key))
+                cls.size -= size
+                cls.evictions += 1
+
+    @staticmethod
+    def remove_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @classmethod
+    def get_stats(cls):
+        lookups = cls.hits + cls.misses
+
+        return {
+            "files": len(cls.entries),
+            "size": cls.size,
+            "budget": cls.get_budget(),
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "evictions": cls.evictions,
+            "hit_ratio": round(cls.hits / lookups, 4) if lookups else 0,
+        }
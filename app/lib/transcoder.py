@@ -1,33 +1,29 @@
-from app.utils.threading import background
-
-
+import itertools
+import os
+import queue
 import subprocess
+import threading
+from typing import IO, Callable, Iterator
 
+from app.config import get_config
+from app.logger import log
 
-@background
-def start_transcoding(
-    input_path: str, output_path: str, bitrate: str, container_args: list[str], compression_level: int = 12
-):
-    """
-    Starts a background transcoding process for an audio file.
+TAIL_BLOCK_SIZE = 1024 * 64  # 64KB
 
-    This function uses FFmpeg to transcode an audio file from one format to another,
-    with specified bitrate and container format. It runs as a background task.
+TAIL_INTERVAL = 0.1
+"""
+How long readers of a running transcode wait for more output, in seconds.
+"""
 
-    Args:
-        input_path (str): The path to the input audio file.
-        output_path (str): The path where the transcoded file will be saved.
-        bitrate (str): The desired bitrate for the output file (e.g., "128k").
-        container_args (list[str]): FFmpeg arguments specific to the output container format.
-        compression_level (int): Compression level (0-9, default: 6).
 
-    Returns:
-        None
-
-    Note:
-        This function is decorated with @background, which means it runs asynchronously.
-        The actual transcoding process is handled by FFmpeg in a subprocess.
-        The function will print status messages about the transcoding process.
+def get_command(
+    input_path: str,
+    bitrate: str,
+    container_args: list[str],
+    compression_level: int = 12,
+) -> list[str]:
+    """
+    Returns the ffmpeg command for a transcode, without the output.
     """
     # Base command
     command = [
@@ -51,6 +47,46 @@ def start_transcoding(
 
     # Add format-specific parameters
     command.extend(container_args)
+    return command
+
+
+def stop_process(process: subprocess.Popen):
+    try:
+        process.terminate()
+        process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
+    except subprocess.TimeoutExpired:
+        print(f"Process (PID: {process.pid}) did not terminate gracefully. Killing...")
+        process.kill()
+
+
+def transcode(
+    input_path: str,
+    output_path: str,
+    bitrate: str,
+    container_args: list[str],
+    compression_level: int = 12,
+) -> bool:
+    """
+    Transcodes an audio file and waits for it to complete.
+
+    This function uses FFmpeg to transcode an audio file from one format to another,
+    with specified bitrate and container format.
+
+    FFmpeg writes to the output file directly, so that it can seek back and
+    fill in the headers it only knows at the end (eg. FLAC's STREAMINFO sample
+    count and the WebM cues). Readers can follow the file as it is written.
+
+    Args:
+        input_path (str): The path to the input audio file.
+        output_path (str): The path where the transcoded file will be saved.
+        bitrate (str): The desired bitrate for the output file (e.g., "128k").
+        container_args (list[str]): FFmpeg arguments specific to the output container format.
+        compression_level (int): Compression level (0-9, default: 6).
+
+    Returns:
+        bool: Whether FFmpeg exited successfully.
+    """
+    command = get_command(input_path, bitrate, container_args, compression_level)
 
     # Add output path and overwrite flag
     command.extend([output_path, "-y"])
@@ -60,19 +96,381 @@ def start_transcoding(
     )
     print(f"Started transcoding process with PID: {process.pid}")
 
+    success = False
+
     try:
         # Wait for the process to complete
-        process.wait()
+        success = process.wait() == 0
         print(f"Transcoding process (PID: {process.pid}) completed")
     except KeyboardInterrupt:
         print(f"Transcoding interrupted. Terminating process (PID: {process.pid})")
     finally:
         # Ensure the process is terminated
-        try:
-            process.terminate()
-            process.wait(timeout=5)  # Wait up to 5 seconds for graceful termination
-        except subprocess.TimeoutExpired:
-            print(
-                f"Process (PID: {process.pid}) did not terminate gracefully. Killing..."
+        stop_process(process)
+
+    return success
+
+
+def transcode_segments(
+    input_path: str,
+    output_pattern: str,
+    bitrate: str,
+    container_args: list[str],
+    segment_length: int,
+    on_segment: Callable[[int], None],
+    compression_level: int = 12,
+) -> bool:
+    """
+    Transcodes an audio file into consecutive segments of `segment_length`
+    seconds with ffmpeg's segment muxer, and waits for it to complete.
+
+    The whole file is encoded in one pass, so the segments play back without
+    the gaps that encoding each segment on its own leaves at the boundaries.
+    The timestamps run on across segments.
+
+    Args:
+        output_pattern (str): The path of the segments, with `%d` in place of the index.
+        container_args (list[str]): FFmpeg arguments for the codec and the
+            segment format (eg. `-segment_format mpegts`).
+        segment_length (int): The length of each segment, in seconds.
+        on_segment (Callable[[int], None]): Called with the index of each
+            segment once ffmpeg has finished writing it.
+
+        See `transcode` for the other arguments.
+
+    Returns:
+        bool: Whether FFmpeg exited successfully.
+    """
+    command = get_command(input_path, bitrate, container_args, compression_level)
+
+    # INFO: ffmpeg lists each segment on stdout once it's complete
+    command += [
+        "-f",
+        "segment",
+        "-segment_time",
+        str(segment_length),
+        "-segment_list",
+        "pipe:1",
+        "-segment_list_type",
+        "flat",
+        output_pattern,
+        "-y",
+    ]
+
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    print(f"Started segmented transcoding process with PID: {process.pid}")
+
+    success = False
+
+    try:
+        for index, _ in enumerate(process.stdout):
+            on_segment(index)
+
+        success = process.wait() == 0
+        print(f"Transcoding process (PID: {process.pid}) completed")
+    finally:
+        stop_process(process)
+
+    return success
+
+
+class Priority:
+    """
+    Transcode priorities. Lower values run first.
+    """
+
+    LIVE = 0
+    PLAYBACK = 1
+    PREFETCH = 2
+
+
+class TranscodeJob:
+    def __init__(
+        self,
+        key: str,
+        args: tuple,
+        priority: int,
+        target: Callable[..., bool] = transcode,
+    ) -> None:
+        self.key = key
+        self.args = args
+        self.target = target
+        self.output_path: str = args[1]
+        self.priority = priority
+        self.started = False
+        self.output_ready = False
+        self.success = False
+        self.done = threading.Event()
+        self.callbacks: list[Callable[[bool], None]] = []
+
+        # INFO: Notified when the output file is created, on progress
+        # (eg. a segment is written) and when the job is done
+        self.condition = threading.Condition()
+
+    def create_output(self):
+        """
+        Creates the output file before ffmpeg starts, so that readers
+        can open it as soon as the job is running.
+        """
+        open(self.output_path, "wb").close()
+
+        with self.condition:
+            self.output_ready = True
+            self.condition.notify_all()
+
+    def notify(self):
+        """
+        Wakes the requests waiting on the job's progress. See `wait_for`.
+        """
+        with self.condition:
+            self.condition.notify_all()
+
+    def finish(self):
+        with self.condition:
+            self.done.set()
+            self.condition.notify_all()
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: float | None = None):
+        """
+        Waits until the predicate is true or the job is done, checking it
+        each time the job is notified. Returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: predicate() or self.done.is_set(), timeout
+            )
+
+    def wait_for_output(self, timeout: float | None = None) -> bool:
+        """
+        Waits until the output file is created or the job is done.
+        Returns False on timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.output_ready or self.done.is_set(), timeout
             )
-            process.kill()
\ No newline at end of file
+
+    def tail(self, file: IO[bytes]) -> Iterator[bytes]:
+        """
+        Yields the output file's content from the current position, waiting
+        for ffmpeg to write more, until the job is done.
+
+        :param file: The output file, opened after it was created.
+        """
+        while True:
+            # INFO: Checked before reading, so that everything
+            # written before the job was done is read.
+            done = self.done.is_set()
+            chunk = file.read(TAIL_BLOCK_SIZE)
+
+            if chunk:
+                yield chunk
+            elif done:
+                return
+            else:
+                self.done.wait(TAIL_INTERVAL)
+
+    def read_head(self, file: IO[bytes], size: int) -> bytes:
+        """
+        Waits until `size` bytes are written or the job is done,
+        and returns the first `size` bytes.
+        """
+        head = bytearray()
+
+        for chunk in self.tail(file):
+            head += chunk
+
+            if len(head) >= size:
+                break
+
+        return bytes(head[:size])
+
+
+class TranscodeScheduler:
+    """
+    Runs transcodes on a fixed number of worker threads.
+
+    Jobs are identified by a key (eg. the transcode cache key). Submitting
+    a job that is already queued or running returns the existing job, so
+    concurrent requests for the same transcode share one ffmpeg process.
+
+    Live jobs run before playback jobs, which run before prefetch jobs. A
+    queued job is moved to a higher priority lane when a client requests
+    it at that priority (eg. starts playing a prefetched track).
+    """
+
+    jobs: dict[str, TranscodeJob] = {}
+    pending: queue.PriorityQueue = queue.PriorityQueue()
+    counter = itertools.count()
+    workers: list[threading.Thread] = []
+    lock = threading.Lock()
+
+    @staticmethod
+    def get_worker_count():
+        return get_config().transcodeWorkers or os.cpu_count() or 1
+
+    @classmethod
+    def submit(
+        cls,
+        key: str,
+        args: tuple,
+        priority: int = Priority.PLAYBACK,
+        on_complete: Callable[[bool], None] | None = None,
+        target: Callable[..., bool] = transcode,
+    ) -> TranscodeJob:
+        """
+        Queues a transcode, or joins the queued or running one with the same key.
+
+        :param args: The arguments to `target`.
+        :param target: The function that runs the transcode. One of `transcode`
+            or `transcode_segments`.
+        :param on_complete: Called with whether the transcode succeeded,
+            before the job is marked as done. Ignored when joining an
+            existing job, as that job already handles its output.
+        """
+        with cls.lock:
+            job = cls.jobs.get(key)
+
+            if job is None:
+                job = TranscodeJob(key, args, priority, target)
+                cls.jobs[key] = job
+                cls.pending.put((priority, next(cls.counter), job))
+
+                if on_complete is not None:
+                    job.callbacks.append(on_complete)
+            elif priority < job.priority and not job.started:
+                # INFO: The stale queue entry is skipped by the workers
+                job.priority = priority
+                cls.pending.put((priority, next(cls.counter), job))
+
+            cls.start_workers()
+
+        return job
+
+    @classmethod
+    def find(cls, key: str) -> TranscodeJob | None:
+        """
+        Returns the queued or running job with the given key.
+        """
+        return cls.jobs.get(key)
+
+    @classmethod
+    def start_workers(cls):
+        """
+        Starts the worker threads that are missing. Should be called with the lock held.
+        """
+        cls.workers = [w for w in cls.workers if w.is_alive()]
+
+        for _ in range(cls.get_worker_count() - len(cls.workers)):
+            worker = threading.Thread(target=cls.work, daemon=True)
+            worker.start()
+            cls.workers.append(worker)
+
+    @classmethod
+    def work(cls):
+        while True:
+            priority, _, job = cls.pending.get()
+
+            with cls.lock:
+                if job.started or priority != job.priority:
+                    continue
+
+                job.started = True
+
+            try:
+                # INFO: Segmented jobs write many files, named by ffmpeg
+                if job.target is transcode:
+                    job.create_output()
+
+                job.success = job.target(*job.args)
+            except Exception as e:
+                log.error("Transcoding %s failed: %s", job.key, e)
+
+            for callback in job.callbacks:
+                try:
+                    callback(job.success)
+                except Exception as e:
+                    log.error("Transcode callback for %s failed: %s", job.key, e)
+
+            with cls.lock:
+                cls.jobs.pop(job.key, None)
+
+            job.finish()
+
+    @classmethod
+    def get_stats(cls):
+        jobs = list(cls.jobs.values())
+
+        return {
+            "workers": len(cls.workers),
+            "running": sum(1 for j in jobs if j.started),
+            "queued": sum(1 for j in jobs if not j.started),
+        }
+
+
+def start_transcoding(
+    input_path: str,
+    output_path: str,
+    bitrate: str,
+    container_args: list[str],
+    compression_level: int = 12,
+    on_complete: Callable[[bool], None] | None = None,
+    key: str | None = None,
+    priority: int = Priority.PLAYBACK,
+) -> TranscodeJob:
+    """
+    Queues a transcode on the transcode scheduler. See `transcode`.
+
+    Args:
+        on_complete (Callable[[bool], None]): Called with whether ffmpeg succeeded
+            once the process exits. Ignored if an identical job is in progress.
+        key (str): Identifies the transcode for de-duplication. Defaults to the output path.
+        priority (int): One of the `Priority` values.
+    """
+    return TranscodeScheduler.submit(
+        key or output_path,
+        (
+            input_path,
+            output_path,
+            bitrate,
+            container_args,
+            compression_level,
+        ),
+        priority=priority,
+        on_complete=on_complete,
+    )
+
+
+def start_segmented_transcoding(
+    input_path: str,
+    output_pattern: str,
+    bitrate: str,
+    container_args: list[str],
+    segment_length: int,
+    on_segment: Callable[[int], None],
+    on_complete: Callable[[bool], None] | None = None,
+    key: str | None = None,
+    priority: int = Priority.PLAYBACK,
+) -> TranscodeJob:
+    """
+    Queues a segmented transcode on the transcode scheduler. See `transcode_segments`
+    and `start_transcoding`.
+
+    `on_segment` is called on the worker thread, so it should return quickly.
+    """
+    return TranscodeScheduler.submit(
+        key or output_pattern,
+        (
+            input_path,
+            output_pattern,
+            bitrate,
+            container_args,
+            segment_length,
+            on_segment,
+        ),
+        priority=priority,
+        on_complete=on_complete,
+        target=transcode_segments,
+    )
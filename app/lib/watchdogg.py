@@ -12,16 +12,16 @@ from watchdog.observers.api import BaseObserverSubclassCallable
 from watchdog.observers import Observer
 
 from app import settings
-from app.config import UserConfig
+from app.config import get_config
 from app.db.libdata import TrackTable
 from app.db.userdata import LibDataTable
 from app.lib.colorlib import process_color
 from app.lib.tagger import create_albums, create_artists
 from app.lib.taglib import extract_thumb, get_tags
 from app.logger import log
-from app.models import Artist, Track
+from app.models import Track
 from app.store.albums import AlbumStore
-from app.store.artists import ArtistMapEntry, ArtistStore
+from app.store.artists import ArtistStore
 from app.store.tracks import TrackStore
 
 
@@ -45,7 +45,7 @@ class Watcher:
         while trials < 10:
             try:
                 # dirs = sdb.get_root_dirs()
-                dirs = UserConfig().rootDirs
+                dirs = get_config().rootDirs
                 dirs = [rf"{d}" for d in dirs]
 
                 dir_map = [
@@ -159,7 +159,7 @@ def add_track(filepath: str) -> None:
 
     TrackStore.remove_track_by_filepath(filepath)
 
-    config = UserConfig()
+    config = get_config()
     tags = get_tags(filepath, config)
 
     # if the track is somehow invalid, return
@@ -170,7 +170,7 @@ def add_track(filepath: str) -> None:
     extract_thumb(filepath, tags["albumhash"] + ".webp", overwrite=True)
 
     colors = handle_color(tags["albumhash"])
-    track = Track(**tags)
+    track = Track(**tags, config=config)
     TrackStore.add_track(track)
 
     # SECTION: Index album
@@ -190,12 +190,8 @@ def add_track(filepath: str) -> None:
     # SECTION: Index artist
     artists = create_artists(track.artisthashes)
 
-    for artist in artists:
-        ArtistStore.artistmap[artist[0].artisthash] = ArtistMapEntry(
-            artist=artist[0],
-            albumhashes=artist[1],
-            trackhashes=artist[2],
-        )
+    for artist, trackhashes, albumhashes in artists:
+        ArtistStore.index_new_artist(artist, trackhashes, albumhashes)
 
 
 def remove_track(filepath: str) -> None:
@@ -207,21 +203,38 @@ def remove_track(filepath: str) -> None:
     except IndexError:
         return
 
-    db.remove_tracks_by_filepaths(filepath)
+    TrackTable.remove_tracks_by_filepaths({filepath})
     TrackStore.remove_track_by_filepath(filepath)
 
-    empty_album = TrackStore.count_tracks_by_trackhash(track.albumhash) > 0
+    # INFO: The track store indexes only hold albums and artists
+    # that still have tracks, so these checks are constant-time.
+    trackhashes = TrackStore.albumhashmap.get(track.albumhash)
 
-    if empty_album:
+    if trackhashes is None:
         AlbumStore.remove_album_by_hash(track.albumhash)
+    elif track.trackhash not in trackhashes:
+        entry = AlbumStore.albummap.get(track.albumhash)
+
+        if entry is not None and track.trackhash in entry.trackhashes:
+            entry.trackhashes.discard(track.trackhash)
+            entry.album.trackcount -= 1
+
+    artisthashes = {a["artisthash"] for a in track.artists + track.albumartists}
+
+    for artisthash in artisthashes:
+        has_tracks = artisthash in TrackStore.artisthashmap
+        has_albums = AlbumStore.count_albums_by_artisthash(artisthash) > 0
 
-    artists: list[Artist] = track.artists + track.albumartists  # type: ignore
+        if not has_tracks and not has_albums:
+            ArtistStore.remove_artist_by_hash(artisthash)
+            continue
 
-    for artist in artists:
-        empty_artist = not ArtistStore.artist_has_tracks(artist.artisthash)
+        entry = ArtistStore.artistmap.get(artisthash)
 
-        if empty_artist:
-            ArtistStore.remove_artist_by_hash(artist.artisthash)
+        if entry is not None and track.trackhash not in TrackStore.artisthashmap.get(
+            artisthash, {}
+        ):
+            entry.trackhashes.discard(track.trackhash)
 
 
 class Handler(PatternMatchingEventHandler):
@@ -1,6 +1,6 @@
 from dataclasses import asdict, dataclass, field
 
-from app.config import UserConfig
+from app.config import UserConfig, get_config
 from app.utils.auth import get_current_userid
 from app.utils.hashing import create_hash
 from app.utils.parsers import (
@@ -217,4 +217,4 @@ class Track:
         )
 
     def copy(self):
-        return Track(**{**asdict(self), "config": UserConfig()})
+        return Track(**{**asdict(self), "config": get_config()})
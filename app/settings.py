@@ -127,6 +127,10 @@ class Paths:
     def get_image_cache_path(cls):
         return join(cls.get_img_path(), "cache")
 
+    @classmethod
+    def get_transcode_cache_path(cls):
+        return join(cls.get_app_dir(), "cache", "transcodes")
+
 
 # defaults
 class Defaults:
@@ -2,6 +2,7 @@
 Prepares the server for use.
 """
 
+import os
 from time import time
 import uuid
 from app.lib.mapstuff import (
@@ -10,14 +11,15 @@ from app.lib.mapstuff import (
     map_favorites,
     map_scrobble_data,
 )
+from app.lib.storeloader import LoadStores
+from app.lib.thumbcache import ThumbnailCache
+from app.lib.transcodecache import TranscodeCache
+from app.settings import Paths
 from app.setup.files import create_config_dir
 from app.setup.sqlite import run_migrations, setup_sqlite
+from app.config import UserConfig, get_config
 from app.store.albums import AlbumStore
-from app.store.artists import ArtistStore
-from app.store.folder import FolderStore
-from app.store.tracks import TrackStore
-from app.utils.generators import get_random_str
-from app.config import UserConfig
+from app.utils.threading import background
 
 
 def run_setup():
@@ -36,19 +38,43 @@ def run_setup():
     setup_sqlite()
     run_migrations()
 
+    TranscodeCache.load(remove_partials=True)
+
 
 def load_into_mem():
     """
     Load all tracks, albums, and artists into memory.
     """
     # INFO: Load all tracks, albums, and artists data into memory
-    key = str(time())
-    TrackStore.load_all_tracks(get_random_str())
-    AlbumStore.load_albums(key)
-    ArtistStore.load_artists(key)
-    FolderStore.load_filepaths()
+    LoadStores(instance_key=str(time()))
 
     map_scrobble_data()
     map_favorites()
     map_artist_colors()
     map_album_colors()
+
+    if get_config().prewarmThumbnails:
+        prewarm_thumbnails()
+
+
+@background
+def prewarm_thumbnails():
+    """
+    Loads the thumbnails of the most played albums into the thumbnail cache.
+    """
+    albums = sorted(
+        (a for a in AlbumStore.get_flat_list() if a.playcount > 0),
+        key=lambda a: a.playcount,
+        reverse=True,
+    )
+    folders = [
+        Paths.get_md_thumb_path(),
+        Paths.get_sm_thumb_path(),
+        Paths.get_xsm_thumb_path(),
+    ]
+
+    ThumbnailCache.prewarm(
+        os.path.join(folder, album.albumhash + ".webp")
+        for album in albums
+        for folder in folders
+    )
@@ -68,6 +68,8 @@ def create_config_dir() -> None:
     md_mixes_img_path = settings.Paths.get_md_mixes_img_path()
     sm_mixes_img_path = settings.Paths.get_sm_mixes_img_path()
 
+    transcode_cache_path = settings.Paths.get_transcode_cache_path()
+
     dirs = [
         "",  # creates the config folder
         sm_thumb_path,
@@ -83,6 +85,7 @@ def create_config_dir() -> None:
         og_mixes_img_path,
         md_mixes_img_path,
         sm_mixes_img_path,
+        transcode_cache_path,
     ]
 
     for _dir in dirs:
@@ -3,7 +3,10 @@ Module to setup Sqlite databases and tables.
 Applies migrations.
 """
 
+from pathlib import Path
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool, StaticPool
+from app.config import get_config
 from app.db.userdata import UserTable
 from app.migrations import apply_migrations
 from app.settings import DbPaths
@@ -24,12 +27,30 @@ def setup_sqlite():
     """
     Create Sqlite databases and tables.
     """
-    DbEngine.engine = create_engine(
-        f"sqlite+pysqlite:///{DbPaths.get_app_db_path()}",
-        echo=False,
-        max_overflow=20,
-        pool_size=10,
-    )
+    db_path = DbPaths.get_app_db_path()
+
+    if get_config().pooledDbConnections:
+        # INFO: A single writer connection, serialized by DbEngine
+        DbEngine.engine = create_engine(
+            f"sqlite+pysqlite:///{db_path}",
+            echo=False,
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        # INFO: DbEngine keeps the read-only connections open, one per thread
+        DbEngine.read_engine = create_engine(
+            f"sqlite+pysqlite:///{Path(db_path).as_uri()}?mode=ro&uri=true",
+            echo=False,
+            poolclass=NullPool,
+            connect_args={"check_same_thread": False},
+        )
+    else:
+        DbEngine.engine = create_engine(
+            f"sqlite+pysqlite:///{db_path}",
+            echo=False,
+            max_overflow=20,
+            pool_size=10,
+        )
 
     create_all_tables()
     # create_user_tables()
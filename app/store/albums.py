@@ -5,7 +5,6 @@ from app.lib.tagger import create_albums
 from app.models import Album, Track
 from app.store.artists import ArtistStore
 from app.utils.auth import get_current_userid
-from app.utils.customlist import CustomList
 
 from ..utils.hashing import create_hash
 from .tracks import TrackStore
@@ -40,27 +39,86 @@ class AlbumMapEntry:
 class AlbumStore:
     albummap: dict[str, AlbumMapEntry] = {}
 
+    # INFO: Secondary indexes. These are kept in sync with the albummap
+    # by `load_albums`, `index_new_album` and `remove_album_by_hash`.
+
+    # {'albumartist hash': {'albumhash', ...}}
+    artisthashmap: dict[str, set[str]] = {}
+    # {'base title hash': {'albumhash', ...}}
+    basetitlemap: dict[str, set[str]] = {}
+
+    generation: int = 0
+    """
+    Incremented whenever albums are added or removed.
+    """
+
     @classmethod
-    def load_albums(cls, instance_key: str):
+    def load_albums(
+        cls,
+        instance_key: str,
+        albums: list[tuple[Album, set[str]]] | None = None,
+    ):
         """
         Loads all albums from the database into the store.
+
+        Pass `albums` to load albums that have already been created
+        (eg. by the startup loader) instead of creating them here.
         """
         global ALBUM_LOAD_KEY
         ALBUM_LOAD_KEY = instance_key
 
         print("Loading albums... ", end="")
 
-        cls.albummap = {
-            album.albumhash: AlbumMapEntry(album=album, trackhashes=trackhashes)
-            for album, trackhashes in create_albums()
-        }
+        if albums is None:
+            albums = create_albums()
+
+        cls.albummap = {}
+        cls.artisthashmap = {}
+        cls.basetitlemap = {}
+
+        for album, trackhashes in albums:
+            cls.albummap[album.albumhash] = AlbumMapEntry(
+                album=album, trackhashes=trackhashes
+            )
+            cls.add_to_indexes(album)
+
+        cls.generation += 1
         print("Done!")
 
     @classmethod
     def index_new_album(cls, album: Album, trackhashes: set[str]):
+        """
+        Adds or replaces an album entry in the store.
+        """
+        existing = cls.albummap.get(album.albumhash)
+
+        if existing is not None:
+            cls.remove_from_indexes(existing.album)
+
         cls.albummap[album.albumhash] = AlbumMapEntry(
             album=album, trackhashes=trackhashes
         )
+        cls.add_to_indexes(album)
+        cls.generation += 1
+
+    @classmethod
+    def add_to_indexes(cls, album: Album):
+        for artisthash in album.artisthashes:
+            cls.artisthashmap.setdefault(artisthash, set()).add(album.albumhash)
+
+        basetitle = create_hash(album.base_title)
+        cls.basetitlemap.setdefault(basetitle, set()).add(album.albumhash)
+
+    @classmethod
+    def remove_from_indexes(cls, album: Album):
+        for artisthash in album.artisthashes:
+            TrackStore.discard_from_index(
+                cls.artisthashmap, artisthash, album.albumhash
+            )
+
+        TrackStore.discard_from_index(
+            cls.basetitlemap, create_hash(album.base_title), album.albumhash
+        )
 
     @classmethod
     def get_flat_list(cls):
@@ -70,18 +128,34 @@ class AlbumStore:
         return [a.album for a in cls.albummap.values()]
 
     @classmethod
-    def add_album(cls, album: Album):
+    def add_album(cls, album: Album, trackhashes: set[str] | None = None):
         """
         Adds an album to the store.
         """
-        cls.albums.append(album)
+        cls.index_new_album(album, trackhashes or set())
 
     @classmethod
     def add_albums(cls, albums: list[Album]):
         """
         Adds multiple albums to the store.
         """
-        cls.albums.extend(albums)
+        for album in albums:
+            cls.add_album(album)
+
+    @classmethod
+    def get_albumhashes_by_albumartist(cls, artisthash: str) -> set[str]:
+        """
+        Returns the hashes of the albums with the given albumartist.
+        """
+        return cls.artisthashmap.get(artisthash, set())
+
+    @classmethod
+    def get_albumhashes_by_base_title(cls, base_title: str) -> set[str]:
+        """
+        Returns the hashes of the albums whose base titles hash the same
+        as the given base title.
+        """
+        return cls.basetitlemap.get(create_hash(base_title), set())
 
     @classmethod
     def get_albums_by_albumartist(
@@ -90,14 +164,10 @@ class AlbumStore:
         """
         Returns N albums by the given albumartist, excluding the specified album.
         """
-
-        albums = [album for album in cls.albums if artisthash in album.artisthashes]
-
-        albums = [
-            album
-            for album in albums
-            if create_hash(album.base_title) != create_hash(exclude)
-        ]
+        albumhashes = cls.get_albumhashes_by_albumartist(
+            artisthash
+        ) - cls.get_albumhashes_by_base_title(exclude)
+        albums = cls.get_albums_by_hashes(albumhashes)
 
         if len(albums) > limit:
             random.shuffle(albums)
@@ -126,8 +196,7 @@ class AlbumStore:
         """
         Count albums for the given artisthash.
         """
-        master_string = "-".join(a.albumartists_hashes for a in cls.albums)
-        return master_string.count(artisthash)
+        return len(cls.get_albumhashes_by_albumartist(artisthash))
 
     # @classmethod
     # def album_exists(cls, albumhash: str) -> bool:
@@ -141,14 +210,20 @@ class AlbumStore:
         """
         Removes an album from the store.
         """
-        cls.albums.remove(album)
+        cls.remove_album_by_hash(album.albumhash)
 
     @classmethod
     def remove_album_by_hash(cls, albumhash: str):
         """
         Removes an album from the store.
         """
-        cls.albums = CustomList(a for a in cls.albums if a.albumhash != albumhash)
+        entry = cls.albummap.pop(albumhash, None)
+
+        if entry is None:
+            return
+
+        cls.remove_from_indexes(entry.album)
+        cls.generation += 1
 
     @classmethod
     def get_albums_by_artisthash(cls, hash: str):
@@ -160,7 +235,9 @@ class AlbumStore:
         if not artist:
             return []
 
-        return [cls.albummap[albumhash].album for albumhash in artist.albumhashes]
+        return cls.get_albums_by_hashes(
+            albumhash for albumhash in artist.albumhashes if albumhash in cls.albummap
+        )
 
     @classmethod
     def get_albums_by_artisthashes(cls, hashes: Iterable[str]):
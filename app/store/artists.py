@@ -4,7 +4,6 @@ from typing import Iterable
 from app.lib.tagger import create_artists
 from app.models import Artist
 from app.utils.auth import get_current_userid
-from app.utils.customlist import CustomList
 from .tracks import TrackStore
 
 ARTIST_LOAD_KEY = ""
@@ -36,10 +35,23 @@ class ArtistMapEntry:
 class ArtistStore:
     artistmap: dict[str, ArtistMapEntry] = {}
 
+    generation: int = 0
+    """
+    Incremented whenever artists are added or removed.
+    """
+
     @classmethod
-    def load_artists(cls, instance_key: str, _trackhashes: list[str] = []):
+    def load_artists(
+        cls,
+        instance_key: str,
+        _trackhashes: list[str] = [],
+        artists: list[tuple[Artist, set[str], set[str]]] | None = None,
+    ):
         """
         Loads all artists from the database into the store.
+
+        Pass `artists` to load artists that have already been created
+        (eg. by the startup loader) instead of creating them here.
         """
         global ARTIST_LOAD_KEY
         ARTIST_LOAD_KEY = instance_key
@@ -47,12 +59,16 @@ class ArtistStore:
         print("Loading artists... ", end="")
         cls.artistmap.clear()
 
+        if artists is None:
+            artists = create_artists(_trackhashes)
+
         cls.artistmap = {
             artist.artisthash: ArtistMapEntry(
                 artist=artist, albumhashes=albumhashes, trackhashes=trackhashes
             )
-            for artist, trackhashes, albumhashes in create_artists(_trackhashes)
+            for artist, trackhashes, albumhashes in artists
         }
+        cls.generation += 1
 
         # for track in TrackStore.get_flat_list():
         #     if instance_key != ARTIST_LOAD_KEY:
@@ -69,6 +85,18 @@ class ArtistStore:
 
         #     cls.map_artist_color(artist)
 
+    @classmethod
+    def index_new_artist(
+        cls, artist: Artist, trackhashes: set[str], albumhashes: set[str]
+    ):
+        """
+        Adds or replaces an artist entry in the store.
+        """
+        cls.artistmap[artist.artisthash] = ArtistMapEntry(
+            artist=artist, albumhashes=albumhashes, trackhashes=trackhashes
+        )
+        cls.generation += 1
+
     @classmethod
     def get_flat_list(cls):
         """
@@ -145,12 +173,13 @@ class ArtistStore:
     #     master_hash = "-".join(artists)
     #     return artisthash in master_hash
 
-    # @classmethod
-    # def remove_artist_by_hash(cls, artisthash: str):
-    #     """
-    #     Removes an artist from the store.
-    #     """
-    #     cls.artists = CustomList(a for a in cls.artists if a.artisthash != artisthash)
+    @classmethod
+    def remove_artist_by_hash(cls, artisthash: str):
+        """
+        Removes an artist from the store.
+        """
+        if cls.artistmap.pop(artisthash, None) is not None:
+            cls.generation += 1
 
     @classmethod
     def get_artist_tracks(cls, artisthash: str):
@@ -1,7 +1,8 @@
+from typing import Iterable
 from sortedcontainers import SortedSet
 from concurrent.futures import ThreadPoolExecutor
 
-from app.db.libdata import TrackTable
+from app.models import Track
 from app.store.tracks import TrackStore
 
 
@@ -22,13 +23,26 @@ class FolderStore:
     @classmethod
     def load_filepaths(cls):
         """
-        Load all the filepaths from the database into memory.
+        Load all the filepaths from the track store into memory.
 
         This is needed to speed up the process of counting the number of tracks in the folder page.
         """
+        cls.clear()
+        cls.add_tracks(TrackStore.filepathmap.values())
+
+    @classmethod
+    def clear(cls):
+        """
+        Removes all filepaths from the store.
+        """
         cls.filepaths.clear()
+        cls.map = {}
 
-        tracks = TrackTable.get_all()
+    @classmethod
+    def add_tracks(cls, tracks: Iterable[Track]):
+        """
+        Adds the filepaths of the given tracks to the store.
+        """
         for track in tracks:
             cls.filepaths.add(track.filepath)
             cls.map[track.filepath] = track.trackhash
@@ -3,6 +3,9 @@
 import itertools
 import json
 from typing import Callable, Iterable
+
+from sortedcontainers import SortedSet
+
 from app.db.libdata import TrackTable
 
 from app.models import Track
@@ -75,6 +78,26 @@ class TrackStore:
     # {'trackhash': Track[]}
     trackhashmap: dict[str, TrackGroup] = dict()
 
+    # INFO: Secondary indexes. These are kept in sync with the trackhashmap
+    # by `add_track`, `remove_track` and `load_all_tracks`.
+    # The trackhashes are dict keys, not sets, so that they keep the order
+    # the tracks were added in, like the trackhashmap does.
+
+    # {'albumhash': {'trackhash': None, ...}}
+    albumhashmap: dict[str, dict[str, None]] = dict()
+    # {'artisthash': {'trackhash': None, ...}}
+    artisthashmap: dict[str, dict[str, None]] = dict()
+    # {'filepath': Track}
+    filepathmap: dict[str, Track] = dict()
+    # {(folder, filepath), ...} sorted for prefix lookups
+    folderindex: SortedSet = SortedSet()
+
+    generation: int = 0
+    """
+    Incremented whenever tracks are added or removed.
+    Used to tell when data derived from the store (eg. search indexes) is stale.
+    """
+
     @classproperty
     def tracks(cls) -> list[Track]:
         return cls.get_flat_list()
@@ -100,7 +123,7 @@ class TrackStore:
         global TRACKS_LOAD_KEY
         TRACKS_LOAD_KEY = instance_key
 
-        cls.trackhashmap = dict()
+        cls.clear()
         tracks = TrackTable.get_all()
 
         # INFO: Load all tracks into the dict store
@@ -108,11 +131,19 @@ class TrackStore:
             if instance_key != TRACKS_LOAD_KEY:
                 return
 
-            exists = cls.trackhashmap.get(track.trackhash, None)
-            if not exists:
-                cls.trackhashmap[track.trackhash] = TrackGroup([track])
-            else:
-                cls.trackhashmap[track.trackhash].append(track)
+            cls.add_track(track)
+
+    @classmethod
+    def clear(cls):
+        """
+        Removes all tracks from the store and resets the indexes.
+        """
+        cls.trackhashmap = dict()
+        cls.albumhashmap = dict()
+        cls.artisthashmap = dict()
+        cls.filepathmap = dict()
+        cls.folderindex = SortedSet()
+        cls.generation += 1
 
     @classmethod
     def add_track(cls, track: Track):
@@ -122,9 +153,18 @@ class TrackStore:
         group = cls.trackhashmap.get(track.trackhash, None)
 
         if group:
-            return group.append(track)
+            group.append(track)
+        else:
+            cls.trackhashmap[track.trackhash] = TrackGroup([track])
 
-        cls.trackhashmap[track.trackhash] = TrackGroup([track])
+        cls.albumhashmap.setdefault(track.albumhash, {})[track.trackhash] = None
+
+        for artisthash in track.artisthashes:
+            cls.artisthashmap.setdefault(artisthash, {})[track.trackhash] = None
+
+        cls.filepathmap[track.filepath] = track
+        cls.folderindex.add((track.folder, track.filepath))
+        cls.generation += 1
 
     @classmethod
     def add_tracks(cls, tracks: list[Track]):
@@ -142,11 +182,48 @@ class TrackStore:
         """
         group = cls.trackhashmap.get(track.trackhash, None)
 
-        if group:
-            group.remove(track)
+        if not group:
+            return
 
-            if len(group) == 0:
-                del cls.trackhashmap[track.trackhash]
+        group.remove(track)
+        cls.generation += 1
+
+        if len(group) == 0:
+            del cls.trackhashmap[track.trackhash]
+
+        # INFO: Only unlink the trackhash from an album or artist
+        # if no other track in the group still points to it.
+        if not any(t.albumhash == track.albumhash for t in group.tracks):
+            cls.discard_from_index(cls.albumhashmap, track.albumhash, track.trackhash)
+
+        for artisthash in track.artisthashes:
+            if not any(artisthash in t.artisthashes for t in group.tracks):
+                cls.discard_from_index(cls.artisthashmap, artisthash, track.trackhash)
+
+        if cls.filepathmap.get(track.filepath) is track:
+            del cls.filepathmap[track.filepath]
+            cls.folderindex.discard((track.folder, track.filepath))
+
+    @staticmethod
+    def discard_from_index(
+        index: dict[str, set[str]] | dict[str, dict[str, None]], key: str, value: str
+    ):
+        """
+        Removes a hash from a secondary index entry,
+        dropping the entry when it becomes empty.
+        """
+        values = index.get(key)
+
+        if values is None:
+            return
+
+        if isinstance(values, dict):
+            values.pop(value, None)
+        else:
+            values.discard(value)
+
+        if len(values) == 0:
+            del index[key]
 
     @classmethod
     def remove_track_by_filepath(cls, filepath: str):
@@ -162,22 +239,11 @@ class TrackStore:
         Removes multiple tracks from the store by their filepaths.
         """
 
-        filecount = len(filepaths)
+        for filepath in filepaths:
+            track = cls.filepathmap.get(filepath)
 
-        for trackhash in cls.trackhashmap:
-            group = cls.trackhashmap[trackhash]
-
-            for track in group.tracks:
-                if track.filepath in filepaths:
-                    group.remove(track)
-
-                    if len(group) == 0:
-                        del cls.trackhashmap[trackhash]
-
-                    filecount -= 1
-
-                if filecount == 0:
-                    break
+            if track is not None:
+                cls.remove_track(track)
 
     @classmethod
     def count_tracks_by_trackhash(cls, trackhash: str) -> int:
@@ -217,22 +283,32 @@ class TrackStore:
         """
         Returns all tracks matching the given paths.
         """
-        # tracks = sorted(cls.trackhashmap, key=lambda x: x.filepath)
-        # tracks = use_bisection(tracks, "filepath", paths)
-        # return [track for track in tracks if track is not None]
-        # return cls.find_tracks_by(key="filepath", value=paths)
+        tracks: list[Track] = []
+
+        for path in paths:
+            track = cls.filepathmap.get(path)
+
+            if track is not None:
+                tracks.append(track)
 
+        return tracks
+
+    @classmethod
+    def get_tracks_in_groups(
+        cls, trackhashes: Iterable[str], predicate: Callable[[Track], bool]
+    ) -> list[Track]:
+        """
+        Returns the tracks in the given trackhash groups that match the predicate.
+        """
         tracks: list[Track] = []
 
-        for trackhash in cls.trackhashmap:
-            group = cls.trackhashmap.get(trackhash)
+        for trackhash in trackhashes:
+            group = cls.trackhashmap.get(trackhash, None)
 
             if not group:
                 continue
 
-            for track in group.tracks:
-                if track.filepath in paths:
-                    tracks.append(track)
+            tracks.extend(track for track in group.tracks if predicate(track))
 
         return tracks
 
@@ -270,33 +346,42 @@ class TrackStore:
         """
         Returns all tracks matching the given album hash.
         """
-        return cls.find_tracks_by(key="albumhash", value=album_hash)
+        trackhashes = cls.albumhashmap.get(album_hash, {})
+        tracks = cls.get_tracks_in_groups(
+            trackhashes, lambda track: track.albumhash == album_hash
+        )
+
+        return remove_duplicates(tracks)
 
     @classmethod
     def get_tracks_by_artisthash(cls, artisthash: str):
         """
         Returns all tracks matching the given artist. Duplicate tracks are removed.
         """
-        predicate = lambda artisthashes, artisthash: artisthash in artisthashes
-        return cls.find_tracks_by(
-            key="artisthashes", value=artisthash, predicate=predicate
+        trackhashes = cls.artisthashmap.get(artisthash, {})
+        tracks = cls.get_tracks_in_groups(
+            trackhashes, lambda track: artisthash in track.artisthashes
         )
 
+        return remove_duplicates(tracks)
+
     @classmethod
     def get_tracks_in_path(cls, path: str):
         """
         Returns all tracks in the given path.
+
+        Walks the sorted folder index starting from the first folder
+        that can match the path and stops at the first one that doesn't.
         """
-        predicate: Callable[[str, str], bool] = (
-            lambda track_folder, path: track_folder.startswith(path)
-        )
+        tracks: list[Track] = []
 
-        return cls.find_tracks_by(
-            key="folder",
-            value=path,
-            predicate=predicate,
-            including_duplicates=True,
-        )
+        for folder, filepath in cls.folderindex.irange(minimum=(path, "")):
+            if not folder.startswith(path):
+                break
+
+            tracks.append(cls.filepathmap[filepath])
+
+        return tracks
 
     @classmethod
     def get_recently_added(cls, start: int, limit: int | None):
@@ -3,7 +3,7 @@ import hashlib
 
 from flask_jwt_extended import current_user
 
-from app.config import UserConfig
+from app.config import get_config
 
 
 def hash_password(password: str) -> str:
@@ -15,7 +15,7 @@ def hash_password(password: str) -> str:
     :return: The hashed password.
     """
     return hashlib.pbkdf2_hmac(
-        "sha256", password.encode("utf-8"), UserConfig().serverId.encode("utf-8"), 100000
+        "sha256", password.encode("utf-8"), get_config().serverId.encode("utf-8"), 100000
     ).hex()
 
 
@@ -1,4 +1,7 @@
 import mimetypes
+import os
+
+READ_BLOCK_SIZE = 1024 * 1024  # 1MB
 
 
 def get_mime_from_ext(filename: str):
@@ -19,3 +22,23 @@ def guess_mime_type(filename: str):
         return get_mime_from_ext(filename)
 
     return type
+
+
+def warm_page_cache(filepath: str):
+    """
+    Reads a file into the OS page cache ahead of use.
+
+    Uses posix_fadvise where available, which returns right away and lets
+    the kernel read the file in the background. Elsewhere, the file is read
+    and discarded, so this should be called off the request thread.
+    """
+    try:
+        with open(filepath, "rb") as file:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                return
+
+            while file.read(READ_BLOCK_SIZE):
+                pass
+    except OSError:
+        pass
@@ -39,6 +39,82 @@ def run_fast_scandir(_dir: str, full=False) -> tuple[list[str], list[str]]:
     return subfolders, files
 
 
+def normalize_dirpath(path: str):
+    """
+    Normalizes a directory path so that paths from the filesystem
+    and paths stored in the database can be compared.
+    """
+    return win_replace_slash(os.path.normpath(path))
+
+
+def scan_changed_dirs(
+    root_dirs: list[str], manifest: dict[str, tuple[float, int]]
+) -> tuple[set[str], dict[str, tuple[float, int]], set[str]]:
+    """
+    Walks the given root directories using a manifest of
+    directory paths to their (mtime, entry count) from a previous scan.
+
+    A directory's mtime only changes when entries are added, removed or
+    renamed in it. So only directories whose mtime differs from the manifest
+    are listed, while unchanged directories are only stat-ed and the walk
+    continues into their known subdirectories.
+
+    NOTE: Files that are modified in place (eg. retagged) don't change
+    their directory's mtime and will not be picked up by this scan.
+
+    Returns a tuple of:
+    - the supported files in the changed directories
+    - the changed directories mapped to their new (mtime, entry count)
+    - all the directories that still exist
+    """
+    children: dict[str, list[str]] = {}
+
+    for path in manifest:
+        parent = normalize_dirpath(os.path.dirname(path))
+        children.setdefault(parent, []).append(path)
+
+    files: set[str] = set()
+    changed: dict[str, tuple[float, int]] = {}
+    seen: set[str] = set()
+
+    stack = [d for d in root_dirs if d != ""]
+
+    while stack:
+        path = stack.pop()
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except (OSError, ValueError):
+            continue
+
+        seen.add(path)
+        entry = manifest.get(path)
+
+        if entry is not None and entry[0] == mtime:
+            stack.extend(children.get(normalize_dirpath(path), []))
+            continue
+
+        try:
+            entries = list(os.scandir(path))
+        except (OSError, PermissionError, FileNotFoundError, ValueError):
+            continue
+
+        for _file in entries:
+            try:
+                if _file.is_dir() and not _file.name.startswith("."):
+                    stack.append(_file.path)
+                elif _file.is_file():
+                    ext = os.path.splitext(_file.name)[1].lower()
+                    if ext in SUPPORTED_FILES:
+                        files.add(win_replace_slash(_file.path))
+            except OSError:
+                continue
+
+        changed[path] = (mtime, len(entries))
+
+    return files, changed, seen
+
+
 def get_home_res_path(filename: str):
     """
     Returns a path to resources in the home directory of this project.
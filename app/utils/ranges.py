@@ -0,0 +1,240 @@
+"""
+Serves files over HTTP with full Range and conditional request support.
+"""
+
+import os
+import uuid
+from typing import IO, Iterator
+
+from flask import Request, Response, request
+from werkzeug.http import http_date
+
+BLOCK_SIZE = 1024 * 256  # 256KB
+
+MAX_RANGES = 16
+"""
+Requests with more ranges than this are served the whole file.
+"""
+
+ByteRange = tuple[int, int]
+"""
+A byte range as (start, stop), stop being exclusive.
+"""
+
+
+def get_file_etag(stat: os.stat_result) -> str:
+    """
+    Returns a strong ETag (unquoted) for a file's inode, mtime and size.
+    """
+    return f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def is_not_modified(req: Request, etag: str, mtime: float) -> bool:
+    """
+    Checks the If-None-Match and If-Modified-Since request headers.
+    """
+    if req.if_none_match:
+        return req.if_none_match.contains_weak(etag)
+
+    if req.if_modified_since is not None:
+        return int(mtime) <= req.if_modified_since.timestamp()
+
+    return False
+
+
+def is_range_valid(req: Request, etag: str, mtime: float) -> bool:
+    """
+    Checks the If-Range request header. The Range header should be
+    ignored if the client's copy is not the current one.
+    """
+    if_range = req.if_range
+
+    if if_range.etag is not None:
+        return if_range.etag == etag
+
+    if if_range.date is not None:
+        return int(mtime) <= if_range.date.timestamp()
+
+    return True
+
+
+def get_byte_ranges(req: Request, size: int) -> list[ByteRange] | None:
+    """
+    Resolves the request's Range header against the file size.
+
+    Returns None if the whole file should be sent and an empty list if
+    none of the ranges can be satisfied. Overlapping and adjacent ranges
+    are merged.
+    """
+    header = req.range
+
+    if header is None or header.units != "bytes" or len(header.ranges) > MAX_RANGES:
+        return None
+
+    ranges: list[ByteRange] = []
+
+    for start, stop in header.ranges:
+        if start < 0:
+            # suffix range: the last N bytes
+            start, stop = max(size + start, 0), size
+        elif stop is None or stop > size:
+            stop = size
+
+        if start < stop:
+            ranges.append((start, stop))
+
+    ranges.sort()
+    merged: list[ByteRange] = []
+
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+
+    return merged
+
+
+def read_range(file: IO[bytes], start: int, stop: int) -> Iterator[bytes]:
+    """
+    Yields the bytes in [start, stop) in blocks.
+    """
+    file.seek(start)
+    remaining = stop - start
+
+    while remaining > 0:
+        chunk = file.read(min(BLOCK_SIZE, remaining))
+
+        if not chunk:
+            break
+
+        remaining -= len(chunk)
+        yield chunk
+
+
+def iter_file(file: IO[bytes], start: int, stop: int, size: int):
+    """
+    Returns a WSGI iterable over the bytes in [start, stop).
+
+    Ranges that run to the end of the file are handed to the server's
+    `wsgi.file_wrapper`, which sends the file without passing it through
+    Python in blocks. Other ranges are read in blocks so that the server
+    can't send past the range end.
+    """
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+
+    if file_wrapper is not None and stop == size:
+        file.seek(start)
+        return file_wrapper(file, BLOCK_SIZE)
+
+    def generate():
+        try:
+            yield from read_range(file, start, stop)
+        finally:
+            file.close()
+
+    return generate()
+
+
+def iter_multipart(
+    file: IO[bytes],
+    ranges: list[ByteRange],
+    size: int,
+    mimetype: str,
+    boundary: str,
+):
+    """
+    Returns an iterator over a multipart/byteranges body and the body's length.
+    """
+    heads = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n"
+        ).encode()
+        for start, stop in ranges
+    ]
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    length = sum(len(h) for h in heads) + sum(b - a for a, b in ranges) + len(tail)
+
+    def generate():
+        with file:
+            for head, (start, stop) in zip(heads, ranges):
+                yield head
+                yield from read_range(file, start, stop)
+
+        yield tail
+
+    return generate(), length
+
+
+def send_file_range(
+    filepath: str, mimetype: str, file: IO[bytes] | None = None
+) -> Response:
+    """
+    Sends a file, honouring the Range, If-Range, If-None-Match and
+    If-Modified-Since request headers.
+
+    Single ranges get a 206 with Content-Range, several ranges get a
+    multipart/byteranges 206, and unsatisfiable ranges get a 416.
+
+    :param file: The file, if it's already open. Files that can be deleted
+        at any time (eg. cache entries) should be opened by the caller, as
+        an open file can still be read after it's deleted.
+    """
+    if file is None:
+        file = open(filepath, "rb")
+
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    etag = get_file_etag(stat)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": "no-cache",
+        "Access-Control-Expose-Headers": "Content-Range, Content-Length, ETag",
+    }
+
+    if is_not_modified(request, etag, stat.st_mtime):
+        file.close()
+        return Response(status=304, headers=headers)
+
+    ranges = None
+
+    if is_range_valid(request, etag, stat.st_mtime):
+        ranges = get_byte_ranges(request, size)
+
+    if ranges is not None and len(ranges) == 0:
+        headers["Content-Range"] = f"bytes */{size}"
+        file.close()
+        return Response(status=416, headers=headers)
+
+    if ranges is None or len(ranges) == 1:
+        start, stop = ranges[0] if ranges else (0, size)
+        body = iter_file(file, start, stop, size)
+        headers["Content-Length"] = str(stop - start)
+
+        if ranges:
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+        return Response(
+            body,
+            status=206 if ranges else 200,
+            mimetype=mimetype,
+            headers=headers,
+            direct_passthrough=True,
+        )
+
+    boundary = uuid.uuid4().hex
+    body, length = iter_multipart(file, ranges, size, mimetype, boundary)
+    headers["Content-Length"] = str(length)
+
+    return Response(
+        body,
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+        direct_passthrough=True,
+    )
@@ -1,4 +1,11 @@
+import multiprocessing
+import os
 import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator
+
+from app.db.engine import DbEngine
 
 
 def background(func):
@@ -32,3 +39,60 @@ class ThreadWithReturnValue(threading.Thread):
     def join(self, *args):
         threading.Thread.join(self, *args)
         return self._return
+
+
+def get_cpu_count():
+    """
+    Returns the number of CPUs on the machine.
+    """
+    cpu_count = os.cpu_count() or 0
+    return cpu_count // 2 if cpu_count > 2 else cpu_count
+
+
+def create_process_pool(max_workers: int | None = None) -> Executor:
+    """
+    Returns a process pool for CPU bound work.
+
+    Falls back to a thread pool where processes can't be forked. Spawned
+    processes re-import the main module, which would re-run the server
+    setup in `manage.py` for every worker.
+
+    Forked workers drop the database connections and locks inherited from
+    the server, so that they can't share (or deadlock on) the parent's.
+    """
+    max_workers = max_workers or get_cpu_count() or 1
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return ThreadPoolExecutor(max_workers=max_workers)
+
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=DbEngine.forget_connections,
+    )
+
+
+def map_in_batches(
+    executor: Executor,
+    func: Callable[..., Any],
+    items: Iterable[Any],
+    batch_size: int = 1024,
+    chunksize: int = 64,
+) -> Iterator[Any]:
+    """
+    Like `executor.map`, but only submits `batch_size` items at a time
+    (plus the next batch, so the workers don't wait), instead of queueing
+    every item up front.
+    """
+    iterator = iter(items)
+
+    def submit():
+        batch = list(islice(iterator, batch_size))
+        return executor.map(func, batch, chunksize=chunksize) if batch else None
+
+    results = submit()
+
+    while results is not None:
+        upcoming = submit()
+        yield from results
+        results = upcoming
@@ -0,0 +1,137 @@
+"""
+Compares search latency with and without the word prefix prefilter,
+and the top results search done per type against a single `cdist` call.
+
+Builds synthetic corpora of 10k, 100k and 1M titles and times the same
+queries against each.
+
+Usage: python -m benchmarks.search [sizes ...]
+"""
+
+import random
+import string
+import sys
+from statistics import median
+from time import perf_counter
+
+from app.lib.searchindex import CombinedCorpus, SearchCorpus
+
+SIZES = [10_000, 100_000, 1_000_000]
+RUNS = 5
+CUTOFF = 75
+LIMIT = 150
+
+
+def make_words(count: int, rng: random.Random):
+    return [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+        for _ in range(count)
+    ]
+
+
+def make_titles(size: int, rng: random.Random):
+    words = make_words(max(size // 10, 1000), rng)
+    return [" ".join(rng.choices(words, k=rng.randint(1, 5))) for _ in range(size)]
+
+
+def make_queries(titles: list[str], rng: random.Random):
+    title = rng.choice([t for t in titles if len(t) > 12])
+    typo = title[1] + title[0] + title[2:]
+
+    # search-as-you-type prefixes, the full title and one with a typo
+    return [title[:3], title[:6], title, typo]
+
+
+def time_search(corpus: SearchCorpus, query: str, prefilter: bool):
+    """
+    Returns the median latency in milliseconds and the number of results.
+    """
+    timings: list[float] = []
+
+    for _ in range(RUNS):
+        start = perf_counter()
+        results = corpus.search(
+            query, score_cutoff=CUTOFF, limit=LIMIT, prefilter=prefilter
+        )
+        timings.append(perf_counter() - start)
+
+    return median(timings) * 1000, len(results)
+
+
+def run(size: int):
+    rng = random.Random(size)
+    titles = make_titles(size, rng)
+    corpus = SearchCorpus(lambda: size, lambda: titles, lambda title: title)
+
+    start = perf_counter()
+    _, choices = corpus.get()
+    build = perf_counter() - start
+
+    start = perf_counter()
+    corpus.get_token_index(choices)
+    index = perf_counter() - start
+
+    print(f"\n{size:,} items (corpus: {build:.2f}s, token index: {index:.2f}s)")
+    print(f"{'query':<32} {'full scan':>18} {'prefilter':>18}")
+
+    for query in make_queries(titles, rng):
+        full, full_hits = time_search(corpus, query, prefilter=False)
+        pre, pre_hits = time_search(corpus, query, prefilter=True)
+        print(
+            f"{query[:32]:<32} {full:>9.2f}ms ({full_hits:>3})"
+            f" {pre:>9.2f}ms ({pre_hits:>3})"
+        )
+
+
+def time_top(combined: CombinedCorpus, query: str, workers: int | None):
+    """
+    Returns the median latency in milliseconds of finding the top result
+    and the matches of each type. `workers=None` searches each type in turn.
+    """
+    timings: list[float] = []
+
+    for _ in range(RUNS):
+        start = perf_counter()
+
+        if workers is None:
+            combined.search(query, score_cutoff=CUTOFF, limit=1, prefilter=False)
+
+            for corpus in combined.corpora:
+                corpus.search(query, score_cutoff=CUTOFF, limit=LIMIT, prefilter=False)
+        else:
+            combined.search_each(
+                query, score_cutoff=CUTOFF, limits=[LIMIT] * 3, workers=workers
+            )
+
+        timings.append(perf_counter() - start)
+
+    return median(timings) * 1000
+
+
+def run_top(size: int):
+    rng = random.Random(size)
+    titles = make_titles(size, rng)
+    parts = [titles[: size // 10], titles[size // 10 : size // 2], titles[size // 2 :]]
+    corpora = [SearchCorpus(lambda: size, lambda p=p: p, lambda t: t) for p in parts]
+    combined = CombinedCorpus(*corpora)
+    combined.get()
+
+    print(f"\n{size:,} items, top results")
+    print(f"{'query':<32} {'per type':>11} {'cdist x1':>11} {'cdist all':>11}")
+
+    for query in make_queries(titles, rng):
+        sequential = time_top(combined, query, workers=None)
+        single = time_top(combined, query, workers=1)
+        parallel = time_top(combined, query, workers=-1)
+        print(
+            f"{query[:32]:<32} {sequential:>9.2f}ms"
+            f" {single:>9.2f}ms {parallel:>9.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or SIZES
+
+    for size in sizes:
+        run(size)
+        run_top(size)
@@ -0,0 +1,162 @@
+import os
+import tempfile
+import unittest
+
+import pytest
+
+flask = pytest.importorskip("flask")
+
+from werkzeug.http import http_date
+
+from app.utils.ranges import MAX_RANGES, send_file_range
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+SIZE = len(CONTENT)
+
+
+class TestSendFileRange(unittest.TestCase):
+    def setUp(self):
+        fd, self.filepath = tempfile.mkstemp(suffix=".mp3")
+
+        with os.fdopen(fd, "wb") as file:
+            file.write(CONTENT)
+
+        app = flask.Flask(__name__)
+
+        @app.get("/file")
+        def send():
+            return send_file_range(self.filepath, "audio/mpeg")
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        os.remove(self.filepath)
+
+    def get(self, **headers):
+        return self.client.get("/file", headers=headers)
+
+    def test_no_range(self):
+        res = self.get()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, CONTENT)
+        self.assertEqual(res.headers["Content-Length"], str(SIZE))
+        self.assertEqual(res.headers["Accept-Ranges"], "bytes")
+        self.assertNotIn("Content-Range", res.headers)
+
+    def test_single_range(self):
+        res = self.get(Range="bytes=100-199")
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT[100:200])
+        self.assertEqual(res.headers["Content-Range"], f"bytes 100-199/{SIZE}")
+        self.assertEqual(res.headers["Content-Length"], "100")
+
+    def test_open_ended_range(self):
+        res = self.get(Range="bytes=10000-")
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT[10000:])
+        self.assertEqual(res.headers["Content-Range"], f"bytes 10000-{SIZE - 1}/{SIZE}")
+
+    def test_range_past_end_is_clamped(self):
+        res = self.get(Range=f"bytes=10200-{SIZE + 500}")
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT[10200:])
+        self.assertEqual(res.headers["Content-Range"], f"bytes 10200-{SIZE - 1}/{SIZE}")
+
+    def test_suffix_range(self):
+        res = self.get(Range="bytes=-500")
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT[-500:])
+        self.assertEqual(
+            res.headers["Content-Range"], f"bytes {SIZE - 500}-{SIZE - 1}/{SIZE}"
+        )
+
+    def test_suffix_range_longer_than_file(self):
+        res = self.get(Range=f"bytes=-{SIZE * 2}")
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT)
+        self.assertEqual(res.headers["Content-Range"], f"bytes 0-{SIZE - 1}/{SIZE}")
+
+    def test_adjacent_ranges_are_merged(self):
+        res = self.get(Range="bytes=0-99,100-149,150-199")
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT[:200])
+        self.assertEqual(res.headers["Content-Range"], f"bytes 0-199/{SIZE}")
+
+    def test_overlapping_ranges_send_whole_file(self):
+        # INFO: Werkzeug drops Range headers with overlapping ranges
+        res = self.get(Range="bytes=0-99,50-149")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, CONTENT)
+
+    def test_multiple_ranges(self):
+        res = self.get(Range="bytes=0-9,-10")
+        self.assertEqual(res.status_code, 206)
+
+        content_type = res.headers["Content-Type"]
+        self.assertTrue(content_type.startswith("multipart/byteranges; boundary="))
+        boundary = content_type.split("boundary=")[1]
+
+        self.assertEqual(res.headers["Content-Length"], str(len(res.data)))
+
+        parts = res.data.split(f"--{boundary}".encode())
+        # INFO: The body starts with a boundary and ends with the closing one
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(parts[-1], b"--\r\n")
+
+        expected = [
+            (f"bytes 0-9/{SIZE}", CONTENT[:10]),
+            (f"bytes {SIZE - 10}-{SIZE - 1}/{SIZE}", CONTENT[-10:]),
+        ]
+
+        for part, (content_range, data) in zip(parts[1:3], expected):
+            head, body = part.split(b"\r\n\r\n", 1)
+            self.assertIn(b"Content-Type: audio/mpeg", head)
+            self.assertIn(f"Content-Range: {content_range}".encode(), head)
+            self.assertEqual(body, data + b"\r\n")
+
+    def test_too_many_ranges_sends_whole_file(self):
+        ranges = ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(MAX_RANGES + 1))
+        res = self.get(Range=f"bytes={ranges}")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, CONTENT)
+
+    def test_unsatisfiable_range(self):
+        res = self.get(Range=f"bytes={SIZE}-")
+        self.assertEqual(res.status_code, 416)
+        self.assertEqual(res.headers["Content-Range"], f"bytes */{SIZE}")
+        self.assertEqual(res.data, b"")
+
+    def test_if_range_matching_etag(self):
+        etag = self.get().headers["ETag"]
+        res = self.get(Range="bytes=0-9", **{"If-Range": etag})
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res.data, CONTENT[:10])
+
+    def test_if_range_stale_etag_sends_whole_file(self):
+        res = self.get(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, CONTENT)
+
+    def test_if_range_stale_date_sends_whole_file(self):
+        mtime = os.path.getmtime(self.filepath)
+        res = self.get(Range="bytes=0-9", **{"If-Range": http_date(mtime - 3600)})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, CONTENT)
+
+    def test_if_none_match(self):
+        etag = self.get().headers["ETag"]
+        res = self.get(**{"If-None-Match": etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b"")
+
+    def test_if_modified_since(self):
+        mtime = os.path.getmtime(self.filepath)
+        res = self.get(**{"If-Modified-Since": http_date(mtime + 3600)})
+        self.assertEqual(res.status_code, 304)
+
+        res = self.get(**{"If-Modified-Since": http_date(mtime - 3600)})
+        self.assertEqual(res.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytest
+
+from app.utils.filesystem import normalize_dirpath, scan_changed_dirs
+
+
+class ScanTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = normalize_dirpath(tempfile.mkdtemp())
+        self.mtime = 1_700_000_000
+
+        for folder in ("a", "a/b", "c"):
+            os.makedirs(self.path(folder), exist_ok=True)
+
+        for file in ("a/1.mp3", "a/b/2.flac", "c/3.mp3", "c/notes.txt"):
+            with open(self.path(file), "wb"):
+                pass
+
+        # INFO: Pin the mtimes, so that a change is never missed
+        # because it happened within the filesystem's mtime resolution.
+        for folder in ("", "a", "a/b", "c"):
+            self.touch(folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def path(self, relpath: str):
+        return normalize_dirpath(os.path.join(self.root, relpath))
+
+    def touch(self, folder: str):
+        self.mtime += 10
+        os.utime(self.path(folder), (self.mtime, self.mtime))
+
+    def scan(self, manifest: dict[str, tuple[float, int]]):
+        return scan_changed_dirs([self.root], manifest)
+
+
+class TestScanChangedDirs(ScanTestCase):
+    def test_full_scan(self):
+        files, changed, seen = self.scan({})
+
+        self.assertEqual(
+            files, {self.path("a/1.mp3"), self.path("a/b/2.flac"), self.path("c/3.mp3")}
+        )
+        self.assertEqual(set(changed), seen)
+        self.assertEqual(seen, {self.path(d) for d in ("", "a", "a/b", "c")})
+        self.assertEqual(changed[self.path("c")][1], 2)
+
+    def test_unchanged_dirs_are_skipped(self):
+        _, manifest, _ = self.scan({})
+        files, changed, seen = self.scan(manifest)
+
+        self.assertEqual(files, set())
+        self.assertEqual(changed, {})
+        self.assertEqual(seen, set(manifest))
+
+    def test_mtime_change_is_picked_up(self):
+        _, manifest, _ = self.scan({})
+
+        with open(self.path("a/b/4.mp3"), "wb"):
+            pass
+        self.touch("a/b")
+
+        files, changed, _ = self.scan(manifest)
+
+        self.assertEqual(files, {self.path("a/b/2.flac"), self.path("a/b/4.mp3")})
+        self.assertEqual(list(changed), [self.path("a/b")])
+        self.assertEqual(changed[self.path("a/b")], (self.mtime, 2))
+
+    def test_new_dir_in_unchanged_parent_is_listed(self):
+        _, manifest, _ = self.scan({})
+
+        os.makedirs(self.path("c/d"))
+        with open(self.path("c/d/5.mp3"), "wb"):
+            pass
+        self.touch("c")
+
+        files, changed, _ = self.scan(manifest)
+
+        self.assertEqual(files, {self.path("c/3.mp3"), self.path("c/d/5.mp3")})
+        self.assertEqual(set(changed), {self.path("c"), self.path("c/d")})
+
+    def test_deleted_dir_is_not_seen(self):
+        _, manifest, _ = self.scan({})
+
+        shutil.rmtree(self.path("a/b"))
+        self.touch("a")
+
+        files, changed, seen = self.scan(manifest)
+
+        self.assertEqual(files, {self.path("a/1.mp3")})
+        self.assertEqual(set(changed), {self.path("a")})
+        self.assertEqual(set(manifest) - seen, {self.path("a/b")})
+
+
+class TestScanManifestTable(ScanTestCase):
+    def setUp(self):
+        sqlalchemy = pytest.importorskip("sqlalchemy")
+        super().setUp()
+
+        from app.db import create_all_tables
+        from app.db.engine import DbEngine
+        from app.db.libdata import ScanManifestTable
+
+        self.table = ScanManifestTable
+        self.engine = getattr(DbEngine, "engine", None)
+        # INFO: Outside the scanned root, so that db writes don't change its mtime
+        self.dbdir = tempfile.mkdtemp()
+
+        DbEngine.engine = sqlalchemy.create_engine(
+            f"sqlite:///{os.path.join(self.dbdir, 'swing.db')}"
+        )
+        create_all_tables()
+
+    def tearDown(self):
+        from app.db.engine import DbEngine
+
+        DbEngine.engine.dispose()
+        DbEngine.engine = self.engine
+        shutil.rmtree(self.dbdir, ignore_errors=True)
+        super().tearDown()
+
+    def rescan(self):
+        """
+        Scans using the saved manifest and saves the result,
+        the same way the tagger does.
+        """
+        manifest = self.table.get_all()
+        files, changed, seen = self.scan(manifest)
+        removed = set(manifest) - seen
+
+        self.table.update_dirs(changed, removed)
+        return files, changed, removed
+
+    def test_saved_manifest_skips_unchanged_dirs(self):
+        _, changed, _ = self.scan({})
+        self.table.update_dirs(changed, set(), replace=True)
+
+        self.assertEqual(self.table.get_all(), changed)
+        self.assertEqual(self.rescan(), (set(), {}, set()))
+
+    def test_changes_and_deletions_are_saved(self):
+        _, changed, _ = self.scan({})
+        self.table.update_dirs(changed, set(), replace=True)
+
+        shutil.rmtree(self.path("a/b"))
+        self.touch("a")
+
+        files, changed, removed = self.rescan()
+
+        self.assertEqual(files, {self.path("a/1.mp3")})
+        self.assertEqual(set(changed), {self.path("a")})
+        self.assertEqual(removed, {self.path("a/b")})
+
+        manifest = self.table.get_all()
+        self.assertNotIn(self.path("a/b"), manifest)
+        self.assertEqual(manifest[self.path("a")], (self.mtime, 1))
+        self.assertEqual(self.rescan(), (set(), {}, set()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import random
+import unittest
+
+import pytest
+
+pytest.importorskip("rapidfuzz")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("flask_openapi3")
+
+from app.api.search import SearchCache
+from app.lib.searchindex import (
+    PREFILTER_MIN_CORPUS,
+    Candidates,
+    SearchCorpus,
+    TokenIndex,
+    get_lookup_words,
+    normalize,
+)
+from app.store.albums import AlbumStore
+from app.store.artists import ArtistStore
+from app.store.tracks import TrackStore
+
+WORDS = [
+    "beat",
+    "beatles",
+    "beating",
+    "beach",
+    "be",
+    "queen",
+    "question",
+    "quest",
+    "rolling",
+    "roll",
+    "stones",
+    "stone",
+    "abba",
+    "abbey",
+    "road",
+    "roadhouse",
+    "love",
+    "lovely",
+    "lover",
+    "light",
+]
+
+
+def create_titles(count: int):
+    rand = random.Random(42)
+    return [" ".join(rand.choices(WORDS, k=rand.randint(1, 4))) for _ in range(count)]
+
+
+class TestCandidatesNarrow(unittest.TestCase):
+    def setUp(self):
+        self.choices = [normalize(t) for t in create_titles(PREFILTER_MIN_CORPUS)]
+        self.index = TokenIndex(self.choices)
+
+    def lookup(self, query: str):
+        words = get_lookup_words(normalize(query))
+        return Candidates(words, sorted(self.index.lookup(words)), self.choices)
+
+    def test_narrowed_positions_match_fresh_lookup(self):
+        pairs = [
+            ("be", "bea"),
+            ("bea", "beat"),
+            ("beat", "beatl"),
+            ("be qu", "bea que"),
+            ("ro st", "rolling stones"),
+            ("lo", "lovel"),
+        ]
+
+        for shorter, longer in pairs:
+            with self.subTest(shorter=shorter, longer=longer):
+                cached = self.lookup(shorter)
+                narrowed = cached.narrow(get_lookup_words(normalize(longer)))
+
+                self.assertIsNotNone(narrowed)
+                self.assertEqual(narrowed.positions, self.lookup(longer).positions)
+
+    def test_unrelated_words_are_not_narrowed(self):
+        cached = self.lookup("beat")
+
+        self.assertIsNone(cached.narrow(get_lookup_words("queen")))
+        self.assertIsNone(cached.narrow(get_lookup_words("beatles queen")))
+        # INFO: Shorter words match more strings than the cached ones
+        self.assertIsNone(cached.narrow(get_lookup_words("be")))
+
+
+class TestSearchCorpusReuse(unittest.TestCase):
+    def setUp(self):
+        self.generation = 0
+        self.titles = create_titles(PREFILTER_MIN_CORPUS * 2)
+        self.corpus = SearchCorpus(
+            lambda: self.generation, lambda: self.titles, lambda title: title
+        )
+
+    def find(self, query: str, reuse: Candidates | None = None):
+        return self.corpus.find(query, 60, 50, prefilter=True, reuse=reuse)
+
+    def test_typing_matches_fresh_searches(self):
+        query = "rolling stones"
+        candidates = None
+
+        for end in range(2, len(query) + 1):
+            typed = query[:end]
+
+            with self.subTest(query=typed):
+                results, reused = self.find(typed, reuse=candidates)
+                fresh, _ = self.find(typed)
+
+                self.assertEqual(results, fresh)
+
+                if reused is not None:
+                    candidates = reused
+
+    def test_candidates_are_not_reused_after_a_rebuild(self):
+        _, candidates = self.find("beat")
+        self.assertIsNotNone(candidates)
+
+        self.titles = self.titles + ["beatlemania"]
+        self.generation += 1
+
+        results, _ = self.find("beatlemania", reuse=candidates)
+
+        self.assertEqual(results[0], "beatlemania")
+        self.assertEqual(results, self.find("beatlemania")[0])
+
+
+class TestSearchCache(unittest.TestCase):
+    def setUp(self):
+        SearchCache.entries.clear()
+        SearchCache.generation = SearchCache.get_generation()
+
+    def tearDown(self):
+        SearchCache.entries.clear()
+
+    def test_hit(self):
+        generation = SearchCache.get_generation()
+        SearchCache.set("beatles", "tracks", generation, ["a"], None)
+
+        self.assertEqual(SearchCache.get("beatles", "tracks"), (["a"], None))
+        self.assertIsNone(SearchCache.get("beatles", "albums"))
+
+    def test_store_changes_drop_entries(self):
+        for store in (TrackStore, AlbumStore, ArtistStore):
+            with self.subTest(store=store.__name__):
+                generation = SearchCache.get_generation()
+                SearchCache.set("beatles", "tracks", generation, ["a"], None)
+                self.assertIsNotNone(SearchCache.get("beatles", "tracks"))
+
+                store.generation += 1
+
+                self.assertIsNone(SearchCache.get("beatles", "tracks"))
+                self.assertIsNone(SearchCache.get_reusable("beatles", "tracks"))
+
+    def test_results_from_a_stale_generation_are_not_saved(self):
+        generation = SearchCache.get_generation()
+        TrackStore.generation += 1
+
+        SearchCache.set("beatles", "tracks", generation, ["a"], None)
+
+        self.assertIsNone(SearchCache.get("beatles", "tracks"))
+
+    def test_reusable_candidates(self):
+        generation = SearchCache.get_generation()
+        candidates = Candidates(frozenset({"be"}), [1, 2], [])
+        SearchCache.set("be", "tracks", generation, [], candidates)
+        SearchCache.set("bea", "tracks", generation, [], None)
+
+        self.assertIs(SearchCache.get_reusable("beatles", "tracks"), candidates)
+        self.assertIsNone(SearchCache.get_reusable("beatles", "albums"))
+        self.assertIsNone(SearchCache.get_reusable("queen", "tracks"))
+
+
+if __name__ == "__main__":
+    unittest.main()
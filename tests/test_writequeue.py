@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, event, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import UserConfig
+from app.db.engine import DbEngine
+from app.db.writequeue import QueuedWrite, WriteQueue, group_writes
+from app.settings import Paths
+
+metadata = MetaData()
+items = Table(
+    "item",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, unique=True),
+)
+others = Table(
+    "other",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String),
+)
+
+
+class WriteQueueTestCase(unittest.TestCase):
+    durable = False
+
+    def setUp(self):
+        self.dbdir = tempfile.mkdtemp()
+        self.engine = getattr(DbEngine, "engine", None)
+        self.read_engine = DbEngine.read_engine
+
+        DbEngine.engine = sqlalchemy.create_engine(
+            f"sqlite:///{os.path.join(self.dbdir, 'swing.db')}"
+        )
+        DbEngine.read_engine = None
+        metadata.create_all(DbEngine.engine)
+
+        self.executes: list[tuple[str, bool]] = []
+        event.listen(DbEngine.engine, "before_cursor_execute", self.on_execute)
+
+        # INFO: Points the config at the empty temp dir, so the defaults are used
+        self.config_dir = Paths.XDG_CONFIG_DIR
+        Paths.set_config_dir(self.dbdir)
+
+        config = UserConfig(durableWrites=self.durable)
+        patcher = mock.patch("app.db.writequeue.get_config", return_value=config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        WriteQueue.flush()
+        DbEngine.engine.dispose()
+        DbEngine.engine = self.engine
+        DbEngine.read_engine = self.read_engine
+        Paths.set_config_dir(self.config_dir)
+        shutil.rmtree(self.dbdir, ignore_errors=True)
+
+    def on_execute(self, conn, cursor, statement, params, context, executemany):
+        if statement.startswith("INSERT"):
+            self.executes.append((statement, executemany))
+
+    def names(self, table=items):
+        with DbEngine.manager() as conn:
+            return [name for (name,) in conn.execute(select(table.c.name))]
+
+
+class TestGroupWrites(unittest.TestCase):
+    def test_consecutive_inserts_are_merged(self):
+        statement = update(items).values(name="x")
+        batch = [
+            QueuedWrite(table=items, row={"name": "a"}),
+            QueuedWrite(table=items, row={"name": "b"}),
+            QueuedWrite(table=others, row={"name": "c"}),
+            QueuedWrite(statement=statement),
+            QueuedWrite(table=items, row={"name": "d"}),
+        ]
+
+        self.assertEqual(
+            list(group_writes(batch)),
+            [
+                (items, [{"name": "a"}, {"name": "b"}], None),
+                (others, [{"name": "c"}], None),
+                (None, None, statement),
+                (items, [{"name": "d"}], None),
+            ],
+        )
+
+
+class TestCommit(WriteQueueTestCase):
+    def test_inserts_run_as_one_executemany(self):
+        batch = [QueuedWrite(table=items, row={"name": str(i)}) for i in range(5)]
+        WriteQueue.commit(batch)
+
+        self.assertEqual(len(self.executes), 1)
+        self.assertTrue(self.executes[0][1])
+        self.assertEqual(self.names(), ["0", "1", "2", "3", "4"])
+
+        for write in batch:
+            self.assertIsNone(write.future.result(timeout=0))
+
+    def test_writes_are_applied_in_order(self):
+        batch = [
+            QueuedWrite(table=items, row={"name": "a"}),
+            QueuedWrite(statement=update(items).values(name="b")),
+            QueuedWrite(table=items, row={"name": "c"}),
+        ]
+        WriteQueue.commit(batch)
+
+        self.assertEqual(self.names(), ["b", "c"])
+
+    def test_failing_group_is_retried_one_write_at_a_time(self):
+        failed = WriteQueue.failed
+        batch = [
+            QueuedWrite(table=items, row={"name": "a"}),
+            QueuedWrite(table=items, row={"name": "b"}),
+            QueuedWrite(table=items, row={"name": "a"}),
+            QueuedWrite(table=others, row={"name": "c"}),
+        ]
+        WriteQueue.commit(batch)
+
+        self.assertEqual(self.names(), ["a", "b"])
+        self.assertEqual(self.names(others), ["c"])
+        self.assertEqual(WriteQueue.failed, failed + 1)
+
+        for index in (0, 1, 3):
+            self.assertIsNone(batch[index].future.result(timeout=0))
+
+        self.assertIsInstance(batch[2].future.exception(timeout=0), IntegrityError)
+
+
+class TestQueue(WriteQueueTestCase):
+    def test_queued_writes_are_committed(self):
+        futures = [WriteQueue.insert(others, {"name": str(i)}) for i in range(10)]
+        futures.append(WriteQueue.execute(update(others).values(name="x")))
+        futures.append(WriteQueue.insert(items, {"name": "y"}))
+        WriteQueue.flush()
+
+        for future in futures:
+            self.assertIsNone(future.result(timeout=0))
+
+        self.assertEqual(self.names(others), ["x"] * 10)
+        self.assertEqual(self.names(), ["y"])
+
+    def test_failed_write_only_fails_its_future(self):
+        good = WriteQueue.insert(items, {"name": "a"})
+        bad = WriteQueue.insert(items, {"name": "a"})
+
+        self.assertIsNone(good.result(timeout=5))
+        self.assertIsInstance(bad.exception(timeout=5), IntegrityError)
+
+
+class TestDurableWrites(WriteQueueTestCase):
+    durable = True
+
+    def test_insert_returns_once_committed(self):
+        future = WriteQueue.insert(items, {"name": "a"})
+
+        self.assertTrue(future.done())
+        self.assertEqual(self.names(), ["a"])
+
+    def test_execute_returns_once_committed(self):
+        WriteQueue.insert(items, {"name": "a"})
+        future = WriteQueue.execute(update(items).values(name="b"))
+
+        self.assertTrue(future.done())
+        self.assertEqual(self.names(), ["b"])
+
+    def test_failed_write_raises(self):
+        WriteQueue.insert(items, {"name": "a"})
+
+        with self.assertRaises(IntegrityError):
+            WriteQueue.insert(items, {"name": "a"})
+
+        self.assertEqual(self.names(), ["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()